@@ -0,0 +1,68 @@
+import asyncio
+from libraries.message_bus import MessageBus
+from libraries.scheduler import EventQueue, Action
+
+
+class AsyncRuntime:
+    def __init__(self, s, bus=None, time_scale=0.0):
+        """
+        Runs the agents of a Simulation as asyncio coroutines, exchanging their ledgers and maps over a message bus.
+
+        Every agent follows its own schedule (the periods given to Simulation.add_agent) in a coroutine, while
+        another one applies the messages of its inbox as they arrive, in between its steps and plans. Agents never
+        touch each other: a broadcast sends a Message (see Agent.gossip) to every agent within communication range.
+
+        Parameters
+        ----------
+        s : Simulation
+            Simulation whose agents run. Simulation.update must not be called during a run; afterwards it carries on
+            from the time the run stopped at.
+        bus : MessageBus
+            Transport of the messages. If None, an ideal one: no latency, losses or bandwidth limit.
+        time_scale : float
+            Wall seconds per unit of simulated time. If 0, agents go as fast as they can, yielding between events.
+
+        """
+        self.s = s
+        self.bus = bus if bus is not None else MessageBus()
+        self.time_scale = time_scale
+
+    def run_until(self, time) -> None:
+        """ Process every event due at or before a simulated time, then deliver the messages still in flight """
+        asyncio.run(self.run(time))
+
+    async def run(self, time) -> None:
+        self.bus.open()
+        inboxes = [asyncio.create_task(self.serve(id, self.bus.register(id))) for id in self.s.agents]
+        # every agent goes through its own events, and they are put back together for the simulation to go on
+        schedules = self.s.events.split()
+        await asyncio.gather(*(self.run_agent(id, schedules[id], time) for id in self.s.agents))
+        await self.bus.drain()
+        for task in inboxes:
+            task.cancel()
+        self.s.time = time
+        self.s.events = EventQueue.join(schedules.values())
+
+    async def run_agent(self, id, events, until) -> None:
+        agent = self.s.agents[id]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for time, _, action in events.pop_due(until):
+            await asyncio.sleep(max(0.0, start + (time - self.s.time) * self.time_scale - loop.time()))
+            if action == Action.MOVE:
+                agent.step()
+                self.s.spatial_index.move(id, agent.agent.position)
+            elif action == Action.PLAN:
+                agent.plan()
+            else:
+                with agent.profiler.phase('broadcast', id):
+                    for peer in self.s.spatial_index.query(agent.agent.position, agent.communication_range):
+                        if peer != id:
+                            self.bus.send(agent.gossip(peer))
+
+    async def serve(self, id, inbox) -> None:
+        agent = self.s.agents[id]
+        while True:
+            message = await inbox.get()
+            agent.deliver(message)
+            inbox.task_done()
@@ -0,0 +1,176 @@
+import numpy as np
+from libraries.token_functions import TokenFunctions
+from libraries.planner import MOVES, best_first_moves
+from simulation import random_streams, ground_truth, spawn_position, INTEREST_THRESHOLD, POTENTIAL_INTEREST_THRESHOLD
+
+# offsets of the cells an agent observes around itself, in the order of Agent.observe
+OBSERVED_OFFSETS = np.array([(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+DETECTED, VERIFIED, REJECTED, POTENTIAL = range(4)  # order of POI_FIELDS
+
+
+class BatchSimulation:
+    def __init__(self, dimensions: tuple, weights, seeds, agents=4, search_depth=3, communication_range=5, loops=1,
+                 map_mode='field', interest_threshold=INTEREST_THRESHOLD,
+                 potential_interest_threshold=POTENTIAL_INTEREST_THRESHOLD):
+        """
+        K simulations advanced in lock step, their state held in arrays with a leading scenario dimension.
+
+        Every scenario behaves like a Simulation with the same seed, agents added with
+        add_agent(j + 1, search_depth=search_depth, planner='optimal') and updated as many times, and gives the same
+        positions and metrics. Agents are still updated one after the other, as in Simulation.update, but each step
+        of an agent (token map, planning, observation, broadcast) is computed for all scenarios at once.
+
+        Ledgers are summarized by what they imply for the point of interest counters: since a ledger holds a prefix
+        of the blocks of every origin, receiving a ledger amounts to a maximum over per-origin counters.
+
+        Parameters
+        ----------
+        dimensions : tuple
+            Maze dimensions, shared by all scenarios.
+        weights : list
+            Token function weights, one vector for all scenarios or one vector per scenario.
+        seeds : list
+            Seed of every scenario, as given to Simulation.
+        agents, search_depth, communication_range, loops, map_mode
+            As in Simulation and Simulation.add_agent.
+
+        """
+        self.dimensions = tuple(dimensions)
+        self.scenarios = len(seeds)
+        self.n_agents = agents
+        self.communication_range = communication_range
+        self.horizon = 5 * search_depth  # DynamicProgrammingPlanner(n=5, m=search_depth)
+        self.interest_threshold = interest_threshold
+        self.potential_interest_threshold = potential_interest_threshold
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim == 2:
+            weights = weights.T[:, :, np.newaxis, np.newaxis]  # (n_functions, K, 1, 1)
+            self.token_fcn = TokenFunctions(weights)
+        else:
+            self.token_fcn = TokenFunctions(weights.tolist())
+
+        shape = (self.scenarios,) + self.dimensions
+        self.walls = np.zeros(shape, dtype=np.uint8)  # ground truth
+        self.interest = np.zeros(shape)
+        self.positions = np.zeros((self.scenarios, agents, 2), dtype=np.int64)  # (col, row), like agent.position
+        self.noise = []  # sensor noise generator of every agent of every scenario
+        for k, seed in enumerate(seeds):
+            _, streams, rngs = random_streams(seed)
+            m, self.interest[k] = ground_truth(self.dimensions, map_mode, loops, rngs)
+            self.walls[k] = m.walls
+            generators = []
+            for a in range(agents):
+                self.positions[k, a] = spawn_position(rngs['spawn'], self.dimensions)
+                generators.append(np.random.default_rng(streams['noise'].spawn(1)[0]))
+            self.noise.append(generators)
+        self.observed_interest = self.interest.astype(np.float32).astype(float)  # AgentMap keeps float32 values
+
+        # maps of every agent
+        self.known_walls = np.zeros((self.scenarios, agents) + self.dimensions, dtype=np.uint8)
+        self.visits = np.zeros((self.scenarios, agents) + self.dimensions, dtype=np.int32)
+        # point of interest counters known by every agent, per observer: (K, holder, observer, 4, rows, cols)
+        self.poi = np.zeros((self.scenarios, agents, agents, 4) + self.dimensions, dtype=np.int32)
+        # first move of the path chosen at the end of the last update, -1 for none (Agent.chosen_path == '')
+        self.next_move = np.full((self.scenarios, agents), -1)
+        self.time = 0
+
+    # ==================================================================================================================
+    def points_of_interest(self, a) -> np.ndarray:
+        """ Counters agent a plans with, as Ledger.points_of_interest(observer_to_skip=a), of shape (K, 4, rows, cols) """
+        counts = self.poi[:, a].sum(axis=1)
+        counts[:, DETECTED] -= self.poi[:, a, a, DETECTED]
+        counts[:, POTENTIAL] -= self.poi[:, a, a, POTENTIAL]
+        return counts
+
+    def plan(self, a) -> np.ndarray:
+        """ First move of the path agent a chooses in every scenario """
+        poi = np.moveaxis(self.points_of_interest(a), 1, 0)
+        tokens = None
+        for f in self.token_fcn.get_functions():
+            tokens = f(tokens, self.visits[:, a], poi, self.positions[:, a])
+        starts = self.positions[:, a, ::-1]
+        return best_first_moves(self.known_walls[:, a], tokens, starts, self.horizon)
+
+    def move(self, a) -> None:
+        rows, cols = self.dimensions
+        position = self.positions[:, a]
+        for i, (direction, dr, dc) in enumerate(MOVES):
+            moving = self.next_move[:, a] == i
+            if direction == 'N':
+                moving &= position[:, 1] > 1
+            elif direction == 'S':
+                moving &= position[:, 1] < rows
+            elif direction == 'E':
+                moving &= position[:, 0] < cols
+            else:
+                moving &= position[:, 0] > 1
+            position[moving, 0] += dc
+            position[moving, 1] += dr
+
+    def observe(self, a) -> None:
+        """ Observe the cells around agent a in every scenario, as Agent.observe """
+        rows, cols = self.dimensions
+        cell_rows = self.positions[:, a, 1:2] + OBSERVED_OFFSETS[:, 0]
+        cell_cols = self.positions[:, a, 0:1] + OBSERVED_OFFSETS[:, 1]
+        valid = (cell_rows > 0) & (cell_rows <= rows) & (cell_cols > 0) & (cell_cols <= cols)
+        k, slot = np.nonzero(valid)  # scenario by scenario, in the order Agent.observe visits the cells
+        r, c = cell_rows[k, slot] - 1, cell_cols[k, slot] - 1
+        counts = valid.sum(axis=1)
+        noise = np.concatenate([self.noise[i][a].random(counts[i]) for i in range(self.scenarios)])
+
+        # whether someone else detected a point of interest there, before any of these observations
+        others = self.points_of_interest(a)
+        detected_by_others = others[k, DETECTED, r, c] + others[k, POTENTIAL, r, c] > 0
+
+        self.known_walls[k, a, r, c] = self.walls[k, r, c]
+        self.visits[k, a, r, c] += 1
+        observed = self.observed_interest[k, r, c] + (noise - 0.5) * 2
+        above = observed > self.interest_threshold
+        counter = np.where(detected_by_others, np.where(above, VERIFIED, REJECTED),
+                           np.where(above, DETECTED, np.where(observed > self.potential_interest_threshold,
+                                                              POTENTIAL, -1)))
+        keep = counter >= 0
+        self.poi[k[keep], a, a, counter[keep], r[keep], c[keep]] += 1
+
+    def broadcast(self, a) -> None:
+        """ Send the ledger and the map of agent a to the agents within communication range, in every scenario """
+        distance = np.abs(self.positions - self.positions[:, a:a + 1]).max(axis=2)
+        in_range = distance <= self.communication_range  # (K, agents), a itself is unchanged by the merge below
+        np.maximum(self.poi, self.poi[:, a:a + 1], out=self.poi, where=in_range[:, :, None, None, None, None])
+        newer = (self.visits[:, a:a + 1] > self.visits) & in_range[:, :, None, None]
+        self.known_walls[:] = np.where(newer, self.known_walls[:, a:a + 1], self.known_walls)
+        self.visits[:] = np.where(newer, self.visits[:, a:a + 1], self.visits)
+
+    def update(self) -> None:
+        """ Update every agent once in every scenario, like Simulation.update """
+        for a in range(self.n_agents):
+            unplanned = self.next_move[:, a] < 0
+            if unplanned.any():
+                self.next_move[unplanned, a] = self.plan(a)[unplanned]
+            self.move(a)
+            self.observe(a)
+            self.next_move[:, a] = self.plan(a)
+            self.broadcast(a)
+        self.time += 1
+
+    def run(self, steps) -> None:
+        for _ in range(steps):
+            self.update()
+
+    # ==================================================================================================================
+    def coverage_metric(self) -> np.ndarray:
+        """ benchmark.coverage_metric of every scenario """
+        explored = np.count_nonzero(self.visits, axis=(1, 2, 3))
+        return explored / (self.n_agents * self.visits[0, 0].size)
+
+    def poi_metric(self) -> np.ndarray:
+        """ benchmark.poi_metric of every scenario """
+        is_poi = self.interest > self.interest_threshold
+        score = np.zeros(self.scenarios)
+        for a in range(self.n_agents):
+            counts = self.points_of_interest(a)
+            cell_score = np.where(counts[:, VERIFIED] > counts[:, REJECTED], 1,
+                                  np.where(counts[:, DETECTED] > 0, -0.5, -1))
+            score += np.where(is_poi, cell_score, 0).sum(axis=(1, 2))
+        pois = self.n_agents * np.count_nonzero(is_poi, axis=(1, 2))  # poi_metric counts them once per agent
+        return score / (self.n_agents * pois + 1)
@@ -1,6 +1,11 @@
+import time
+from functools import partial
+import numpy as np
 from simulation import Simulation
+from batch_simulation import BatchSimulation
 from libraries.token_functions import TokenFunctions
 from optimization import genetic_algorithm
+from fitness_cache import FitnessCache
 
 
 def coverage_metric(s):
@@ -9,10 +14,10 @@ def coverage_metric(s):
     """
     score = 0
     for i in s.agents.keys():
-        known_map = s.agents[i].ledger.map.known_map
-        explored_cells = sum([1 for key in known_map.keys() if known_map[key] > 0])
+        visits = s.agents[i].ledger.map.visits
+        explored_cells = np.count_nonzero(visits)
         score += explored_cells
-    return score/(len(s.agents.keys())*len(known_map.keys()))
+    return score/(len(s.agents.keys())*visits.size)
 
 
 def poi_metric(s):
@@ -38,32 +43,95 @@ def poi_metric(s):
     return score/(len(s.agents.keys())*pois + 1)
 
 
-def benchmark(metric, weights, runs=1, runtime=12, grid_shape=(15, 15), agents=4, search_depth=3):
-    """ Benchmarks the system's behavior according to some specified metric """
-    scores = []
+def run_scenario(weights, metrics=(coverage_metric, poi_metric), runtime=12, grid_shape=(15, 15), agents=4,
+                 search_depth=3, communication_range=5, loops=1, map_mode='field', planner='equivalent', seed=None,
+                 profiler=None):
+    """
+    Runs one simulation and scores it.
+
+    Returns a dictionary with the value of every metric under its function name, and the wall time in seconds of
+    each phase: 'setup_time' (maze and agents), 'simulation_time' (all updates) and 'metric_time'. A
+    libraries.profiler.Profiler given as profiler measures the phases of the updates in detail.
+    """
+    start = time.perf_counter()
     token_fcn = TokenFunctions(weights)
+    s = Simulation(dimensions=grid_shape, token_fcn=token_fcn, loops=loops, enable_keys=False, map_mode=map_mode,
+                   communication_range=communication_range, seed=seed, profiler=profiler)
+    for j in range(agents):
+        s.add_agent(j+1, search_depth=search_depth, planner=planner)
+    setup_done = time.perf_counter()
+    for k in range(runtime):
+        s.update()
+    simulation_done = time.perf_counter()
+    result = {metric.__name__: metric(s) for metric in metrics}
+    result['setup_time'] = setup_done - start
+    result['simulation_time'] = simulation_done - setup_done
+    result['metric_time'] = time.perf_counter() - simulation_done
+    return result
+
+
+def scenario_seeds(seed, runs) -> list:
+    """ Seeds of the scenarios of a common random numbers benchmark """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(runs)]
+
+
+def benchmark(metric, weights, runs=1, runtime=12, grid_shape=(15, 15), agents=4, search_depth=3,
+              communication_range=5, loops=1, map_mode='field', common_random_numbers=False, seed=0,
+              planner='equivalent', profiler=None):
+    """
+    Benchmarks the system's behavior according to some specified metric
+
+    A libraries.profiler.Profiler given as profiler accumulates the phases of all runs.
+
+    With common_random_numbers, the runs use the scenarios given by seed: every weight vector is scored on the same
+    mazes, interest maps, spawn positions and sensor noise, so that differences between scores come from the weights
+    and far fewer runs are needed to rank candidates. Otherwise every run draws a new scenario.
+    """
+    scores = []
+    seeds = scenario_seeds(seed, runs) if common_random_numbers else [None] * runs
     for i in range(runs):
-        s = Simulation(dimensions=grid_shape, token_fcn=token_fcn, map_mode='field')
-        for j in range(agents):
-            s.add_agent(j+1, search_depth=search_depth)
-        for k in range(runtime):
-            s.update()
-        scores.append(metric(s))
+        result = run_scenario(weights, metrics=(metric,), runtime=runtime, grid_shape=grid_shape, agents=agents,
+                              search_depth=search_depth, communication_range=communication_range, loops=loops,
+                              map_mode=map_mode, seed=seeds[i], planner=planner, profiler=profiler)
+        scores.append(result[metric.__name__])
     return -sum(scores)/len(scores)
 
 
-metric = coverage_metric
-n_token_fcn = len(TokenFunctions().get_functions())
-bounds = []
-for n in range(n_token_fcn):
-    bounds.append([0, 1])
-n_bits = 8
-n_iter = 10
-n_pop = 10
-r_cross = 0.8
-r_mut = 1.0 / (float(n_bits) * n_token_fcn)
-k = 7
+def benchmark_population(metric, population, runs=1, runtime=12, grid_shape=(15, 15), agents=4, search_depth=3,
+                         communication_range=5, loops=1, map_mode='field', seed=0):
+    """
+    Benchmarks a list of weight vectors at once, on a BatchSimulation of len(population) * runs scenarios.
+
+    Every weight vector is scored on the same runs scenarios (common random numbers, see benchmark), with the
+    'optimal' planner, and gets the same score as
+    benchmark(metric, weights, runs, ..., common_random_numbers=True, planner='optimal'). Returns the scores in the order of population.
+    """
+    seeds = scenario_seeds(seed, runs)
+    weights = [w for w in population for _ in range(runs)]
+    s = BatchSimulation(grid_shape, weights, seeds * len(population), agents=agents, search_depth=search_depth,
+                        communication_range=communication_range, loops=loops, map_mode=map_mode)
+    s.run(runtime)
+    scores = getattr(s, metric.__name__)().reshape(len(population), runs)
+    return [-sum(row)/runs for row in scores.tolist()]
+
 
+if __name__ == '__main__':
+    metric = coverage_metric
+    n_token_fcn = len(TokenFunctions().get_functions())
+    bounds = []
+    for n in range(n_token_fcn):
+        bounds.append([0, 1])
+    n_bits = 8
+    n_iter = 10
+    n_pop = 10
+    r_cross = 0.8
+    r_mut = 1.0 / (float(n_bits) * n_token_fcn)
+    k = 7
+    cache = FitnessCache('fitness_cache.sqlite')
 
-[best, score] = genetic_algorithm(benchmark, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k)
+    # the whole population is scored on the same scenarios in one batched simulation
+    objective = partial(benchmark_population, runs=3)
 
+    [best, score] = genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k,
+                                      cache=cache, checkpoint='genetic_algorithm.checkpoint', batch=True)
+    cache.close()
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import functools
+import json
+import sqlite3
+
+
+def describe(f) -> str:
+    """
+    Description of a function and the configuration it is called with, stable across runs
+    :param f:  function, or functools.partial of a function
+    :return:   string naming the function, its default arguments and the arguments bound by partial
+    """
+    if f is None:
+        return 'None'
+    if isinstance(f, functools.partial):
+        return describe(f.func) + repr((f.args, sorted(f.keywords.items())))
+    name = getattr(f, '__module__', '') + '.' + getattr(f, '__qualname__', repr(f))
+    return name + repr((getattr(f, '__defaults__', None), sorted((getattr(f, '__kwdefaults__', None) or {}).items())))
+
+
+def cache_key(objective, metric, weights) -> str:
+    """
+    Key of an evaluation
+    :param objective:  objective function, with its configuration bound with functools.partial
+    :param metric:     metric for objective function
+    :param weights:    decoded candidate
+    :return:           key for FitnessCache
+    """
+    return json.dumps({'objective': describe(objective), 'metric': describe(metric),
+                       'weights': [repr(float(w)) for w in weights]}, sort_keys=True)
+
+
+class FitnessCache:
+    def __init__(self, path=None, max_entries=4096):
+        """
+        Cache of objective values, with an in-memory LRU in front of an optional SQLite store.
+
+        Parameters
+        ----------
+        path : str
+            SQLite database file, shared across runs. If None, the cache only lives in memory.
+        max_entries : int
+            Number of entries kept in memory.
+
+        """
+        self.memory = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, score REAL)")
+            self.connection.commit()
+
+    def get(self, key):
+        """ Cached value of key, or None """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.connection is not None:
+            row = self.connection.execute("SELECT score FROM fitness WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.remember(key, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key, score) -> None:
+        self.remember(key, score)
+        if self.connection is not None:
+            self.connection.execute("INSERT OR REPLACE INTO fitness VALUES (?, ?)", (key, float(score)))
+            self.connection.commit()
+
+    def remember(self, key, score) -> None:
+        self.memory[key] = score
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,9 +1,17 @@
 import pygame
 import sys
-from libraries.pygame_wrapper import calculate_GUI_scale, draw_known_map, draw_agent, draw_maze_map, draw_token_map, draw_GUI, draw_points_of_interest, draw_detected_points_of_interest
+from libraries.pygame_wrapper import Renderer
+from simulation_worker import SimulationWorker
 
 
-def start_interactive_visualization(s, settings: dict):
+def start_interactive_visualization(s, settings: dict, rate=None, autoplay=False):
+    """
+    Show a simulation in a pygame window. The simulation steps on a background thread (see SimulationWorker), one
+    tick when 'u' is pressed, or continuously while playing ('p' toggles), so that a slow tick doesn't freeze the
+    window.
+    :param rate:      target ticks per second while playing, as fast as possible if None
+    :param autoplay:  start playing right away
+    """
     pygame.init()
 
     fps = 60
@@ -12,42 +20,40 @@ def start_interactive_visualization(s, settings: dict):
     width, height = 1000, 650
     screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
 
-    drawn_maze = s.m.maze_map
+    renderer = Renderer(settings)
     selected_agent = 0
     show_tokens = False
+    worker = SimulationWorker(s, rate=rate)
+    worker.start()
+    if autoplay:
+        worker.play()
 
     while True:
-        screen.fill((0, 0, 0))
-
+        view = (selected_agent, show_tokens)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                worker.stop()
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
                 # select agent
                 if event.key == pygame.K_0:
                     selected_agent = 0
-                    drawn_maze = s.m.maze_map
                 if event.key == pygame.K_1:
                     if 1 in s.agents.keys():
                         selected_agent = 1
-                        drawn_maze = s.agents[1].ledger.map.maze_map
                 if event.key == pygame.K_2:
                     if 2 in s.agents.keys():
                         selected_agent = 2
-                        drawn_maze = s.agents[2].ledger.map.maze_map
                 if event.key == pygame.K_3:
                     if 3 in s.agents.keys():
                         selected_agent = 3
-                        drawn_maze = s.agents[3].ledger.map.maze_map
                 if event.key == pygame.K_4:
                     if 4 in s.agents.keys():
                         selected_agent = 4
-                        drawn_maze = s.agents[4].ledger.map.maze_map
                 if event.key == pygame.K_5:
                     if 5 in s.agents.keys():
                         selected_agent = 5
-                        drawn_maze = s.agents[5].ledger.map.maze_map
                 # movement of selected drone
                 """
                 if event.key == pygame.K_RIGHT:
@@ -73,37 +79,27 @@ def start_interactive_visualization(s, settings: dict):
                 """
                 # debugging tools
                 if event.key == pygame.K_b:
-                    if not (selected_agent == 0) and (selected_agent in s.agents.keys()):
-                        print(s.agents[selected_agent].ledger.ledger)
+                    # the ledger is only read while the worker leaves the simulation alone, holding it so
+                    with worker.condition:
+                        if not (selected_agent == 0) and (selected_agent in s.agents.keys()) and worker.idle():
+                            print(s.agents[selected_agent].ledger.ledger)
                 if event.key == pygame.K_n:
                     if not (selected_agent == 0) and (selected_agent in s.agents.keys()):
-                        print(s.agents[selected_agent].chosen_path)
+                        print(worker.snapshot.paths[selected_agent])
                 # visualizations
                 if event.key == pygame.K_t:
                     if not (selected_agent == 0) and (selected_agent in s.agents.keys()):
                         show_tokens = not(show_tokens)
                 # update
                 if event.key == pygame.K_u:
-                    s.update()
-
-        # calculate scale for the visualization, in case the window size changes
-        offset, g_size = calculate_GUI_scale(screen, settings)
-        settings['offset'] = offset
-        settings['g_size'] = g_size
-
-        if not (selected_agent == 0):
-            draw_known_map(screen, s.agents[selected_agent].ledger.map.known_map, settings)
-            if show_tokens:
-                draw_token_map(screen, s.agents[selected_agent].ledger.map.token_map(
-                    s.agents[selected_agent].ledger.points_of_interest(observer_to_skip = selected_agent), s.agents[selected_agent].agent.position), settings)
-        draw_maze_map(screen, drawn_maze, settings)
-        for agent in s.agents.keys():
-            draw_agent(screen, s.agents[agent], settings, active=(agent == selected_agent), path_on=True)
-        if selected_agent == 0:
-            draw_points_of_interest(screen, s.interest_map, settings, threshold=s.interest_threshold, potential_threshold=s.potential_interest_threshold)
-        else:
-            draw_detected_points_of_interest(screen, s.agents[selected_agent].ledger.points_of_interest(), settings)
-        draw_GUI(screen, s, selected_agent, show_tokens, settings)
+                    worker.step()
+                if event.key == pygame.K_p:
+                    worker.toggle()
+        if (selected_agent, show_tokens) != view:
+            worker.select(selected_agent, show_tokens and selected_agent != 0)
 
-        pygame.display.flip()
+        # only the parts of the frame that changed are redrawn and sent to the display
+        dirty = renderer.draw(screen, worker.snapshot, selected_agent, show_tokens, worker.playing)
+        if dirty:
+            pygame.display.update(dirty)
         fpsClock.tick(fps)
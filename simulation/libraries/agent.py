@@ -1,22 +1,59 @@
-from libraries.ledger import Ledger
+from libraries.ledger import Ledger, EventType
 from libraries.agent_map import AgentMap
+from libraries.message_bus import Message
+from libraries.planner import RecursivePlanner, DynamicProgrammingPlanner
+from libraries.profiler import NULL_PROFILER
+from libraries.sensor import Sensor
+import numpy as np
 import random
 
+PLANNERS = ('recursive', 'equivalent', 'optimal')
+
+
+def make_planner(planner, n, m):
+    """ Planner by name: 'recursive' (generate_n_moves), 'equivalent' or 'optimal' (DynamicProgrammingPlanner) """
+    if planner == 'recursive':
+        return RecursivePlanner(n=n, m=m)
+    if planner in PLANNERS:
+        return DynamicProgrammingPlanner(n=n, m=m, mode=planner)
+    raise ValueError(planner)
+
+
+def uniform_draws(rng, n) -> np.ndarray:
+    """ n successive draws of rng.random(), made at once for numpy generators and Python's Mersenne Twister """
+    if isinstance(rng, np.random.Generator):
+        return rng.random(n)
+    if rng is random or type(rng) is random.Random:
+        # random() makes a float of two 32-bit outputs a and b, as ((a >> 5) * 2**26 + (b >> 6)) / 2**53, and
+        # getrandbits returns the same outputs, the first one in the lowest bits
+        words = np.frombuffer(rng.getrandbits(64 * n).to_bytes(8 * n, 'little'), dtype='<u4')
+        return ((words[0::2] >> 5) * 67108864.0 + (words[1::2] >> 6)) / 9007199254740992.0
+    return np.array([rng.random() for _ in range(n)])
+
 
 class Agent:
-    def __init__(self, id, agent, ground_truth, interest_map, map_update_function, token_fcn, god_mode=False, search_depth=5, communication_range=1, point_of_interest_threshold=5, potential_point_of_interest_threshold=4):
+    def __init__(self, id, agent, ground_truth, interest_map, map_update_function, token_fcn, god_mode=False, search_depth=5, communication_range=1, point_of_interest_threshold=5, potential_point_of_interest_threshold=4, planner='equivalent', rng=None, ledger_max_blocks=None, profiler=NULL_PROFILER, sensor=None):
         self.id = id
         self.agent = agent
-        agent_map = AgentMap(id, ground_truth, interest_map, god_mode=god_mode, token_fcn=token_fcn)
-        self.ledger = Ledger(self.id, agent_map, map_update_function)
+        agent_map = AgentMap(id, ground_truth, interest_map, god_mode=god_mode, token_fcn=token_fcn, profiler=profiler)
+        # measures the phases of update and broadcast, see libraries.profiler
+        self.profiler = profiler
+        self.ledger = Ledger(self.id, agent_map, map_update_function, max_blocks=ledger_max_blocks)
+        # sensor noise generator, the global random module unless the simulation gives one
+        self.rng = rng if rng is not None else random
+        # cells observed at every step, the 3x3 block around the agent unless the simulation gives another sensor
+        self.sensor = sensor if sensor is not None else Sensor()
         self.ground_truth = ground_truth
         self.search_depth = search_depth
+        self.planner = make_planner(planner, n=5, m=search_depth)
         self.chosen_path = ''
         self.time_since_last_receiving = 0
         self.local_time = 0
         self.communication_range = communication_range
         self.point_of_interest_threshold = point_of_interest_threshold
         self.potential_point_of_interest_threshold = potential_point_of_interest_threshold
+        # what every peer said in its last message (see gossip): (its version vector, the version of its map)
+        self.peers = {}
 
     def observe_spot(self, location):
         agent_map = self.ledger.map
@@ -24,53 +61,62 @@ class Agent:
         self.ledger.update_map(lambda x: agent_map, time=self.local_time)
 
     def observe(self):
-        loc = self.agent.position
-        locs = []
-        for i in (-1, 0, 1):
-            for j in (-1, 0, 1):
-                n_loc = (loc[1] + i, loc[0] + j)
-                if 0 < n_loc[0] <= self.ground_truth.rows and 0 < n_loc[1] <= self.ground_truth.cols:
-                    locs.append(n_loc)
-        found_points_of_interest = [self.ledger.ledger[key][1]['point'] for key in self.ledger.ledger.keys() if ("Detected point of interest" in self.ledger.ledger[key][0] or "Detected potential point of interest" in self.ledger.ledger[key][0]) and self.ledger.ledger[key][1]['observer'] != self.id]
-        for l in locs:
-            self.observe_spot(l)
-            observed_value = self.ledger.map.interest_map[l] + (random.random()-0.5)*2
-            if l in found_points_of_interest:
-                if observed_value > self.point_of_interest_threshold:
-                    self.ledger.add_block(self.ledger.current_block, "Verified point of interest at (" + str(l[0]) + ", " +
-                                          str(l[1]) + ")", {'point': l, 'observer': self.id, 'time': self.local_time,
-                                                            'value': self.ledger.map.interest_map[l]})
-                else:
-                    self.ledger.add_block(self.ledger.current_block, "Didn't detect point of interest at (" + str(l[0]) + ", " +
-                                          str(l[1]) + ")", {'point': l, 'observer': self.id, 'time': self.local_time,
-                                                            'value': self.ledger.map.interest_map[l]})
-            else:
-                if observed_value > self.point_of_interest_threshold:
-                    self.ledger.add_block(self.ledger.current_block, "Detected point of interest at (" + str(l[0]) + ", " +
-                                          str(l[1]) + ")", {'point': l, 'observer': self.id, 'time': self.local_time,
-                                                            'value': self.ledger.map.interest_map[l]})
-                elif observed_value > self.potential_point_of_interest_threshold:
-                    self.ledger.add_block(self.ledger.current_block, "Detected potential point of interest at (" + str(l[0]) + ", " +
-                                          str(l[1]) + ")", {'point': l, 'observer': self.id, 'time': self.local_time,
-                                                            'value': self.ledger.map.interest_map[l]})
+        """
+        Observe every cell of the sensor footprint: update the map, draw the sensor noise, and record what was detected
+        or verified, all at once.
+        """
+        agent_map = self.ledger.map
+        rows, cols = self.sensor.cells(self.agent.position, agent_map.dimensions)
+        cells = agent_map.observe_cells(self.ground_truth, rows, cols)
+        self.ledger.update_map(lambda x: agent_map, time=self.local_time)
+        noise = uniform_draws(self.rng, len(cells))
+        values = agent_map.interest.take(cells).astype(float)
+        observed_values = values + (noise - 0.5) * 2
+        # only my own blocks get added below, so the index gives the same answer as a snapshot would
+        detected_by_others = self.ledger.detected_by_others(rows, cols, self.id)
+        # cells that give a block: verified or rejected if someone else detected something there, else detected or
+        # potential above the thresholds
+        keep = np.flatnonzero(detected_by_others | (observed_values > self.potential_point_of_interest_threshold))
+        if len(keep):
+            above = observed_values[keep] > self.point_of_interest_threshold
+            events = np.where(detected_by_others[keep], np.where(above, EventType.VERIFIED, EventType.REJECTED),
+                              np.where(above, EventType.DETECTED, EventType.POTENTIAL))
+            self.ledger.record_many(events, rows[keep], cols[keep], time=self.local_time, values=values[keep])
+
+    def plan(self):
+        """ Choose a path on the token map of the current position """
+        token_map = self.ledger.map.token_map(self.points_of_interest, self.agent.position,
+                                              poi_version=self.ledger.poi_version)
+        with self.profiler.phase('planner', self.id):
+            self.chosen_path = self.planner.plan(self, token_map)
+
+    def points_of_interest(self) -> dict:
+        """ Counters the agent plans with: those of its ledger, without its own unconfirmed detections """
+        with self.profiler.phase('poi_query', self.id):
+            return self.ledger.points_of_interest(observer_to_skip=self.id)
 
     def update(self):
-        self.local_time += 1
-        self.time_since_last_receiving += 1
-        if self.chosen_path == '':
-            token_map = self.ledger.map.token_map(self.ledger.points_of_interest(observer_to_skip = self.id), self.agent.position)
-            moves = self.generate_n_moves(token_map, n=5, m=self.search_depth)
-            best_move = ''
-            best_score = -100
-            for key in moves.keys():
-                if moves[key][0] > best_score:
-                    best_move = key
-                    best_score = moves[key][0]
-            self.chosen_path = best_move
+        """ One step then a new plan, what every agent does at each update with the default schedule """
+        self.step()
+        self.plan()
+
+    def step(self):
+        """ Take the next step of the chosen path, planning one first if there is none left, and observe """
+        with self.profiler.phase('update', self.id):
+            self.local_time += 1
+            self.time_since_last_receiving += 1
+            if self.chosen_path == '':
+                self.plan()
+            self.move()
+            with self.profiler.phase('observe', self.id):
+                self.observe()
 
+    def move(self):
+        """ Take the first step of the chosen path, which is removed from it """
         best_move = self.chosen_path
         if best_move != '':
             move = best_move[0]
+            self.chosen_path = best_move[1:]
 
             if move == 'N' and self.agent.position[1]>1:
                 self.agent.position = (self.agent.position[0], self.agent.position[1] - 1)
@@ -81,34 +127,72 @@ class Agent:
             if move == 'W'  and self.agent.position[0]>1:
                 self.agent.position = (self.agent.position[0] - 1, self.agent.position[1])
 
-        self.observe()
+    def broadcast(self, agents, spatial_index=None):
+        """
+        Send the ledger and the map to every agent within communication range.
 
-        token_map = self.ledger.map.token_map(self.ledger.points_of_interest(observer_to_skip = self.id), self.agent.position)
-        moves = self.generate_n_moves(token_map, n=5, m=self.search_depth)
-        best_move = ''
-        best_score = -100
-        for key in moves.keys():
-            if moves[key][0] > best_score:
-                best_move = key
-                best_score = moves[key][0]
-        self.chosen_path = best_move
+        Parameters
+        ----------
+        agents : dict
+            All agents of the simulation, by id.
+        spatial_index : SpatialIndex
+            Index of the agent positions. If given, only the agents it finds in range are considered, instead of
+            every agent of the simulation.
 
-    def broadcast(self, agents):
+        """
+        with self.profiler.phase('broadcast', self.id):
+            self.send(agents, spatial_index)
+
+    def send(self, agents, spatial_index=None):
+        """ broadcast, without measuring it as a whole """
         position = self.agent.position
-        for agent in agents.keys():
+        if spatial_index is None:
+            candidates = agents.keys()
+        else:
+            candidates = spatial_index.query(position, self.communication_range)
+        for agent in candidates:
             if not (agents[agent].id == self.id):
                 l = agents[agent].agent.position
                 if l[0] - self.communication_range <= position[0] <= l[0] + self.communication_range and l[1] - self.communication_range <= position[1] <= l[1] + self.communication_range:
-                    agents[agent].ledger.receive(self.ledger, time=self.local_time)
+                    with self.profiler.phase('receive', agent):
+                        agents[agent].ledger.receive(self.ledger, time=self.local_time)
                     agents[agent].time_since_last_receiving = 0
+                    with self.profiler.phase('map_merge', agent):
+                        self.ledger.map.share(agents[agent].ledger.map)
 
-                    my_map = self.ledger.map.known_map
-                    their_map = agents[agent].ledger.map.known_map
+    def gossip(self, peer) -> Message:
+        """
+        Message with the blocks and map changes a peer may lack, judging from its last message, for runtimes where
+        agents don't reach into each other (see async_runtime).
+        """
+        vector, map_ack = self.peers.get(peer, ({}, 0))
+        delta = self.ledger.delta(vector if self.ledger.sync_mode == 'delta' else {})
+        blocks = {origin: (start, records.copy(), checkpoint) for origin, (start, records, checkpoint) in delta.items()}
+        agent_map = self.ledger.map
+        since = agent_map.sync_watermarks.get(peer, 0)
+        cells, walls, visits = agent_map.export_changes(peer)
+        if cells is None:
+            walls, visits = walls.copy(), visits.copy()
+            since = 0
+        return Message(self.id, peer, self.local_time, blocks, self.ledger.version_vector(), self.ledger.current_block,
+                       (cells, walls, visits), since, agent_map.version, map_ack)
 
-                    for spot in my_map.keys():
-                        if my_map[spot] > their_map[spot]:
-                            agents[agent].ledger.map.maze_map[spot] = self.ledger.map.maze_map[spot]
-                            agents[agent].ledger.map.known_map[spot] = self.ledger.map.known_map[spot]
+    def deliver(self, message: Message) -> None:
+        """ Apply a Message gossiped by another agent """
+        with self.profiler.phase('receive', self.id):
+            self.ledger.receive_delta(message.blocks, message.sender, message.current_block, time=self.local_time)
+        self.time_since_last_receiving = 0
+        with self.profiler.phase('map_merge', self.id):
+            agent_map = self.ledger.map
+            agent_map.apply_changes(message.map_changes)
+            # changes sent since the version the sender acknowledged may have been lost, send them again next time
+            agent_map.sync_watermarks[message.sender] = message.map_ack
+        # the sender's map is only acknowledged up to its version if no earlier change is missing, that is if the
+        # message starts at or before the last version acknowledged, otherwise a message in between was lost
+        _, map_ack = self.peers.get(message.sender, ({}, 0))
+        if message.map_since <= map_ack:
+            map_ack = max(map_ack, message.map_version)
+        self.peers[message.sender] = (message.version_vector, map_ack)
 
     def generate_n_moves(self, token_map, n=1, m=1, prefix='', starting_position=None, value=0):
         if starting_position is None:
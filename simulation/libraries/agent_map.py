@@ -1,41 +1,69 @@
-from functools import reduce
+from bisect import bisect_right
+from collections import OrderedDict
+import numpy as np
+from libraries.grid import GridView, WallView, encode_walls, walls_from_maze_map, array_from_dict
+from libraries.token_functions import poi_counts
+from libraries.maze import GridMaze
+from libraries.profiler import NULL_PROFILER
 
 
 class AgentMap:
-    def __init__(self, id, ground_truth, interest_map, token_fcn, god_mode=False):
+    def __init__(self, id, ground_truth, interest_map, token_fcn, god_mode=False, profiler=NULL_PROFILER,
+                 token_cache_size=8):
         """
         Initialize Agent Map.
 
+        The map is backed by three arrays of the maze's shape: a uint8 wall bitmask (walls), an int32 visit count
+        (visits) and a float32 interest estimate (interest). maze_map, known_map and interest_map are
+        dictionary-compatible views of these arrays, keyed by the same (row, col) tuples as pyamaze.maze.grid.
+
         Parameters
         ----------
-        ground_truth : pyamaze.maze
-            pyamaze maze, with the .grid and .maze_map dictionaries as properties describing the maze layout
+        ground_truth : libraries.maze.GridMaze or pyamaze.maze
+            Maze, with the .grid and .maze_map dictionaries as properties describing the maze layout
         interest_map : dict
             Dictionary, with keys the same as maze_map or known_map (that is a tuple refering to a location in pyamaze
             maze
+        profiler : libraries.profiler.Profiler
+            Measures every token function under the phase 'token_map.<function name>'.
+        token_cache_size : int
+            Number of token maps memoized by token_map.
 
         """
         self.grid = ground_truth.grid
-        self.maze_map = {}
-        self.known_map = {}
-        self.interest_map = {}
         self.reference_interest_map = interest_map  # AgentMap saves an interest_map from ground truth for reference
         self.dimensions = (ground_truth.rows, ground_truth.cols)
         self.id = id
         self.token_functions = token_fcn
+        self.profiler = profiler
+        self.token_cache = OrderedDict()  # (version, poi version, position, weights) -> read-only token array
+        self.token_cache_size = token_cache_size
+        self.stage_cache = None  # (version, poi version, weights), poi counters, output of the positionless stages
 
-        if not god_mode:
-            for element in self.grid:
-                # if the drone isn't all knowing
-                self.maze_map[element] = {'E': 1, 'W': 1, 'N': 1, 'S': 1}
-                self.known_map[element] = 0
-                self.interest_map[element] = 0
-        else:
-            # if it is, set all readings at ground truth
-            self.maze_map = ground_truth.maze_map
-            self.interest_map = interest_map
-            for element in self.grid:
-                self.known_map[element] = 1
+        self.walls = np.zeros(self.dimensions, dtype=np.uint8)  # unexplored cells have no known walls
+        self.visits = np.zeros(self.dimensions, dtype=np.int32)
+        self.interest = np.zeros(self.dimensions, dtype=np.float32)
+        if god_mode:
+            # if the drone is all knowing, set all readings at ground truth
+            self.walls[:] = walls_from_maze_map(ground_truth.maze_map, self.dimensions)
+            self.interest[:] = array_from_dict(interest_map, self.dimensions, np.float32)
+            self.visits[:] = 1
+
+        # Change stamps of the walls and visits, to only exchange the cells that changed since the last contact with
+        # a peer. version counts the changes, changed holds the version of the last change of every cell, and
+        # sync_watermarks holds the version at the last exchange with each peer. The changes since log_base are
+        # also logged (the version and the cells of every change), so that finding them costs as much as there are,
+        # up to a quarter of the map (log_size cells); the stamps are only scanned for changes older than that.
+        self.version = self.log_base = 1 if god_mode else 0
+        self.changed = np.full(self.dimensions, self.version, dtype=np.int64)
+        self.log_versions = []
+        self.change_log = []
+        self.log_size = 0
+        self.sync_watermarks = {}
+
+        self.maze_map = WallView(self.walls, on_write=self.touch)
+        self.known_map = GridView(self.visits, on_write=self.touch)
+        self.interest_map = GridView(self.interest)
 
     def observe(self, ground_truth, location):
         """
@@ -43,18 +71,197 @@ class AgentMap:
 
         Parameters
         ----------
-        ground_truth : pyamaze.maze
-            pyamaze maze, with the .grid and .maze_map dictionaries as properties describing the maze layout
+        ground_truth : libraries.maze.GridMaze or pyamaze.maze
+            Maze, with the .grid and .maze_map dictionaries as properties describing the maze layout
         location : tuple
             Position in the maze, that is, an element of pyamaze.maze.grid, such as (1, 1)
 
         """
-        self.maze_map[location] = ground_truth.maze_map[location]
-        self.known_map[location] += 1
-        self.interest_map[location] = self.reference_interest_map[location]
+        index = (location[0] - 1, location[1] - 1)
+        if isinstance(ground_truth, GridMaze):
+            self.walls[index] = ground_truth.walls[index]
+        else:
+            self.walls[index] = encode_walls(ground_truth.maze_map[location])
+        self.visits[index] += 1
+        self.interest[index] = self.reference_interest_map[location]
+        self.touch(index[0] * self.dimensions[1] + index[1])
+
+    def observe_cells(self, ground_truth, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        observe, for many distinct locations at once.
+
+        Parameters
+        ----------
+        ground_truth : libraries.maze.GridMaze or pyamaze.maze
+            Maze, with the .grid and .maze_map dictionaries as properties describing the maze layout
+        rows, cols : np.ndarray
+            1-indexed coordinates of the locations, without duplicates.
+
+        Returns
+        -------
+        np.ndarray
+            Flat indices of the locations in the map arrays.
+
+        """
+        cells = (rows - 1) * self.dimensions[1] + (cols - 1)
+        if isinstance(ground_truth, GridMaze):
+            self.walls.put(cells, ground_truth.walls.take(cells))
+        else:
+            self.walls.put(cells, [encode_walls(ground_truth.maze_map[cell]) for cell in zip(rows.tolist(), cols.tolist())])
+        self.visits.put(cells, self.visits.take(cells) + 1)
+        if isinstance(self.reference_interest_map, GridView):
+            self.interest.put(cells, self.reference_interest_map.array.take(cells))
+        else:
+            self.interest.put(cells, [self.reference_interest_map[cell] for cell in zip(rows.tolist(), cols.tolist())])
+        self.touch(cells)
+        return cells
+
+    # ==================================================================================================================
+    def touch(self, cells) -> None:
+        """ Stamp a change of the walls or visits of cells, given as a flat index or an array of flat indices """
+        if isinstance(cells, np.ndarray) and not len(cells):
+            return
+        self.version += 1
+        self.changed.put(cells, self.version)
+        self.log_versions.append(self.version)
+        self.change_log.append(cells)
+        self.log_size += np.size(cells)
+        if self.log_size > self.visits.size // 4:
+            self.forget_changes(self.version)
+
+    def forget_changes(self, version) -> None:
+        """ Drop the changes up to a version from the log, they are found from the stamps from then on """
+        start = bisect_right(self.log_versions, version)
+        self.log_size -= sum(np.size(cells) for cells in self.change_log[:start])
+        del self.log_versions[:start]
+        del self.change_log[:start]
+        self.log_base = version
+
+    def changes_since(self, version) -> np.ndarray:
+        """ Flat indices of the cells changed since a version """
+        if version >= self.version:
+            return np.zeros(0, dtype=np.intp)
+        if version < self.log_base:
+            return np.flatnonzero(self.changed > version)
+        start = bisect_right(self.log_versions, version)
+        return np.unique(np.concatenate([np.atleast_1d(cells) for cells in self.change_log[start:]])).astype(np.intp)
+
+    def export_changes(self, peer, bulk_fraction=0.25):
+        """
+        Cells that changed since the last exchange with peer, as (flat indices, walls, visits).
+
+        If there are many of them, the whole map is sent instead, with None for the indices. Either way, the
+        watermark of peer is moved to the current version.
+        """
+        dirty = self.changes_since(self.sync_watermarks.get(peer, 0))
+        self.sync_watermarks[peer] = self.version
+        oldest = min(self.sync_watermarks.values())
+        if oldest > self.log_base:
+            self.forget_changes(oldest)  # every peer has had them
+        if len(dirty) > bulk_fraction * self.visits.size:
+            return None, self.walls, self.visits
+        return dirty, self.walls.ravel()[dirty], self.visits.ravel()[dirty]
+
+    def apply_changes(self, changes) -> None:
+        """ Merge changes made by export_changes, keeping every cell visited more often than here """
+        cells, walls, visits = changes
+        if cells is None:
+            self.merge_arrays(walls, visits)
+            return
+        newer = visits > self.visits.ravel()[cells]
+        cells = cells[newer]
+        self.walls.ravel()[cells] = walls[newer]
+        self.visits.ravel()[cells] = visits[newer]
+        self.touch(cells)
+
+    def merge_arrays(self, walls, visits) -> None:
+        newer = visits > self.visits
+        self.walls[newer] = walls[newer]
+        self.visits[newer] = visits[newer]
+        self.touch(np.flatnonzero(newer))
+
+    def share(self, other) -> None:
+        """ Send the cells that changed since the last exchange to another AgentMap """
+        other.apply_changes(self.export_changes(other.id))
+
+    def merge(self, other) -> None:
+        """
+        Copy the walls and visit counts of every cell that another AgentMap has visited more often than this one.
+
+        Parameters
+        ----------
+        other : AgentMap
+            Map of the broadcasting agent, of the same dimensions.
+
+        """
+        self.merge_arrays(other.walls, other.visits)
+
+    def token_map(self, interest_dictionary, position, poi_version=None):
+        """
+        Run the token function pipeline on this map.
+
+        Given a poi_version, token maps are memoized on (map version, poi_version, position, weights), keeping the
+        token_cache_size most recent ones. The stages before the first positional token function don't depend on the
+        position, and their result is kept apart, so that after a move only the position dependent stages run again.
+
+        Parameters
+        ----------
+        interest_dictionary : dict or np.ndarray or function
+            Output of Ledger.points_of_interest, or the same counters already scattered into an array by poi_counts.
+            It may also be a function returning either, only called if the counters are needed.
+        position : tuple
+            Position of the agent, as stored in agent.position.
+        poi_version
+            Version of the counters (see Ledger.poi_version), changing whenever they do. If None, nothing is cached.
+
+        Returns
+        -------
+        GridView
+            Dictionary-compatible view of the token array, which is available as .array. The array of a memoized
+            token map is read-only.
+
+        """
+        functions = self.token_functions.get_functions()
+        if poi_version is None:
+            return GridView(self.run_token_functions(functions, None, self.poi_array(interest_dictionary), position))
+        weights = self.token_functions.weights_key()
+        key = (self.version, poi_version, tuple(position), weights)
+        tokens = self.token_cache.get(key)
+        if tokens is not None:
+            self.token_cache.move_to_end(key)
+            return GridView(tokens)
+
+        split = next((i for i, f in enumerate(functions) if getattr(f, 'uses_position', False)), len(functions))
+        stage_key = (self.version, poi_version, weights)
+        if self.stage_cache is not None and self.stage_cache[0] == stage_key:
+            poi, tokens = self.stage_cache[1:]
+        else:
+            poi = self.poi_array(interest_dictionary)
+            tokens = self.run_token_functions(functions[:split], None, poi, position)
+            if tokens is not None:
+                tokens.flags.writeable = False  # shared by the token maps of every position
+            self.stage_cache = (stage_key, poi, tokens)
+        tokens = self.run_token_functions(functions[split:], tokens, poi, position)
+        tokens.flags.writeable = False
+        self.token_cache[key] = tokens
+        if len(self.token_cache) > self.token_cache_size:
+            self.token_cache.popitem(last=False)
+        return GridView(tokens)
+
+    def poi_array(self, interest_dictionary) -> np.ndarray:
+        if callable(interest_dictionary):
+            interest_dictionary = interest_dictionary()
+        if isinstance(interest_dictionary, np.ndarray):
+            return interest_dictionary
+        return poi_counts(interest_dictionary, self.dimensions)
 
-    def token_map(self, interest_dictionary, position):
-        fcn = self.token_functions.get_functions()
-        for f in fcn:
-            tokens = f(self.known_map, interest_dictionary, position)
+    def run_token_functions(self, functions, tokens, poi, position):
+        """ Run token functions on tokens, the output of the previous ones """
+        if not self.profiler.enabled:
+            for f in functions:
+                tokens = f(tokens, self.visits, poi, position)
+            return tokens
+        for f in functions:
+            with self.profiler.phase('token_map.' + f.__name__, self.id):
+                tokens = f(tokens, self.visits, poi, position)
         return tokens
@@ -0,0 +1,114 @@
+from collections.abc import Mapping
+import numpy as np
+
+# Walls are stored as a uint8 bitmask per cell, a set bit meaning the direction is blocked. An all-zero grid is
+# therefore a map without any known walls, which is exactly what an unexplored AgentMap looks like.
+DIRECTIONS = ('E', 'W', 'N', 'S')  # same order as the pyamaze maze_map dictionaries
+WALL_BITS = {'E': 1, 'W': 2, 'N': 4, 'S': 8}
+ALL_WALLS = 15
+
+_DECODED = [{d: 0 if mask & WALL_BITS[d] else 1 for d in DIRECTIONS} for mask in range(16)]
+
+
+def encode_walls(cell_walls: dict) -> int:
+    """ Convert a pyamaze style {'E': 1, 'W': 0, ...} dictionary (1 means open) to a wall bitmask """
+    mask = 0
+    for d in DIRECTIONS:
+        if not cell_walls[d]:
+            mask |= WALL_BITS[d]
+    return mask
+
+
+def decode_walls(mask) -> dict:
+    """ Convert a wall bitmask to a pyamaze style {'E': 1, 'W': 0, ...} dictionary (1 means open) """
+    return _DECODED[mask].copy()
+
+
+def walls_from_maze_map(maze_map, shape) -> np.ndarray:
+    """ Build a wall bitmask array out of a pyamaze maze_map dictionary """
+    if isinstance(maze_map, WallView):
+        return maze_map.array.copy()
+    walls = np.zeros(shape, dtype=np.uint8)
+    for (row, col), cell_walls in maze_map.items():
+        walls[row - 1, col - 1] = encode_walls(cell_walls)
+    return walls
+
+
+def array_from_dict(values, shape, dtype) -> np.ndarray:
+    """ Build an array out of a dictionary keyed by (row, col) tuples """
+    if isinstance(values, GridView):
+        return values.array.astype(dtype)
+    array = np.zeros(shape, dtype=dtype)
+    for (row, col), value in values.items():
+        array[row - 1, col - 1] = value
+    return array
+
+
+class GridView(Mapping):
+    """
+    Dictionary-compatible view of a 2D array.
+
+    Keys are 1-indexed (row, col) tuples, like the entries of pyamaze.maze.grid, so that code written against the
+    dictionary maps keeps working. Hot paths should use the underlying .array directly.
+
+    """
+    def __init__(self, array: np.ndarray, on_write=None):
+        self.array = array
+        self.on_write = on_write  # called with the flat index of every cell written through the view
+
+    def _index(self, key):
+        row, col = key
+        if 0 < row <= self.array.shape[0] and 0 < col <= self.array.shape[1]:
+            return row - 1, col - 1
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        row, col = key
+        if row > 0 and col > 0:
+            try:
+                return self.array.item(row - 1, col - 1)
+            except IndexError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value) -> None:
+        index = self._index(key)
+        self.array[index] = value
+        if self.on_write is not None:
+            self.on_write(index[0] * self.array.shape[1] + index[1])
+
+    def __contains__(self, key) -> bool:
+        try:
+            self._index(key)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def __iter__(self):
+        rows, cols = self.array.shape
+        for row in range(1, rows + 1):
+            for col in range(1, cols + 1):
+                yield row, col
+
+    def __len__(self) -> int:
+        return self.array.size
+
+    def values(self) -> list:
+        return self.array.ravel().tolist()
+
+    def items(self):
+        return zip(iter(self), self.values())
+
+
+class WallView(GridView):
+    """ Dictionary-compatible view of a wall bitmask array, returning pyamaze style {'E': 1, ...} dictionaries """
+    def __getitem__(self, key) -> dict:
+        return decode_walls(GridView.__getitem__(self, key))
+
+    def __setitem__(self, key, value) -> None:
+        if isinstance(value, Mapping):
+            value = encode_walls(value)
+        GridView.__setitem__(self, key, value)
+
+    def values(self) -> list:
+        return [decode_walls(mask) for mask in self.array.ravel().tolist()]
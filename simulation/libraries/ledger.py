@@ -1,63 +1,579 @@
-import random
-import string
-from typing import Any
+from collections.abc import Mapping
+from enum import IntEnum
+from zlib import crc32
+import hashlib
+import os
+import numpy as np
 
 
-def random_key() -> str:
-    return ''.join(random.choice(string.ascii_uppercase + string.ascii_lowercase + string.digits) for _ in range(8))
+class EventType(IntEnum):
+    MISSION_START = 0
+    BROADCAST_RECEIVED = 1
+    MAP_UPDATED = 2
+    DETECTED = 3             # point of interest detected
+    POTENTIAL = 4            # potential point of interest detected
+    VERIFIED = 5             # point of interest detected by someone else confirmed
+    REJECTED = 6             # point of interest detected by someone else not found
+
+
+# Descriptions of the events, as written in the blocks of earlier versions of the ledger. Point of interest events
+# are formatted with the point.
+DESCRIPTIONS = {EventType.MISSION_START: "Mission start",
+                EventType.BROADCAST_RECEIVED: "Broadcast received",
+                EventType.MAP_UPDATED: "Map updated",
+                EventType.DETECTED: "Detected point of interest at ({}, {})",
+                EventType.POTENTIAL: "Detected potential point of interest at ({}, {})",
+                EventType.VERIFIED: "Verified point of interest at ({}, {})",
+                EventType.REJECTED: "Didn't detect point of interest at ({}, {})"}
+POI_COUNTERS = ('detected', 'verified', 'rejected', 'potential')
+# position in POI_COUNTERS of the counter increased by each point of interest event
+POI_EVENTS = {EventType.DETECTED: 0, EventType.VERIFIED: 1, EventType.REJECTED: 2, EventType.POTENTIAL: 3}
+# counters of the detections, potential or not, that others verify or reject
+DETECTION_COUNTERS = (0, 3)
+SYNC_MODES = ('delta', 'full')
+
+# One row per block. agent is the observer of point of interest events and the broadcaster of received broadcasts,
+# as an agent code. parent and parent2 are the ids of the preceding blocks, -1 if there are none.
+BLOCK_DTYPE = np.dtype([('id', np.int64), ('type', np.uint8), ('row', np.int32), ('col', np.int32),
+                        ('agent', np.int64), ('time', np.int64), ('value', np.float64),
+                        ('parent', np.int64), ('parent2', np.int64)])
+NO_BLOCK = -1
+
+
+def agent_code(id) -> int:
+    """ 31-bit integer standing for an agent id: the id itself if it is a small integer, its crc32 otherwise """
+    if isinstance(id, (int, np.integer)) and not isinstance(id, bool) and 0 <= id < 2**31:
+        return int(id)
+    return crc32(str(id).encode()) & 0x7fffffff
+
+
+def block_id(origin_code, sequence) -> int:
+    """ Id of the block number sequence of an origin, unique across the agents of a mission """
+    return (origin_code << 32) | sequence
+
+
+def split_block_id(id) -> tuple:
+    """ (origin code, sequence number) of a block id """
+    return id >> 32, id & 0xffffffff
+
+
+def chain_digest(digest: bytes, records: np.ndarray) -> bytes:
+    """ Hash of a block history, extended block by block so that it doesn't depend on how the history is split """
+    data = records.tobytes()
+    for i in range(0, len(data), BLOCK_DTYPE.itemsize):
+        digest = hashlib.sha256(digest + data[i:i + BLOCK_DTYPE.itemsize]).digest()
+    return digest
+
+
+class Checkpoint:
+    """
+    Summary of the first count blocks of an origin, standing in for them once they are dropped: the hash of their
+    history, and the point of interest counters they add up to, as {(observer code, row, col): [4 counters]}.
+    """
+    __slots__ = ('count', 'digest', 'counters')
+
+    def __init__(self, count=0, digest=b'', counters=None):
+        self.count = count
+        self.digest = digest
+        self.counters = {} if counters is None else counters
+
+    def fold(self, records: np.ndarray) -> 'Checkpoint':
+        """ Checkpoint of the blocks summarized here followed by records """
+        counters = {key: list(value) for key, value in self.counters.items()}
+        for event_type, observer, row, col in poi_events(records):
+            counters.setdefault((observer, row, col), [0, 0, 0, 0])[POI_EVENTS[event_type]] += 1
+        return Checkpoint(self.count + len(records), chain_digest(self.digest, records), counters)
+
+    @property
+    def nbytes(self) -> int:
+        """ Size when sent to another agent: count, digest, and the key and counters of every entry """
+        return 8 + len(self.digest) + len(self.counters) * (8 + 4 + 4 + 4 * 4)
+
+
+def poi_events(records: np.ndarray):
+    """ (event type, observer code, row, col) of the point of interest events among records """
+    types = records['type']
+    poi = records[(types >= EventType.DETECTED) & (types <= EventType.REJECTED)]
+    return zip(poi['type'].tolist(), poi['agent'].tolist(), poi['row'].tolist(), poi['col'].tolist())
+
+
+class BlockStore:
+    """
+    Blocks of one origin in creation order, in a structured array grown by doubling. Blocks folded into the
+    checkpoint by compaction are no longer held, the first record held is block number checkpoint.count.
+    """
+    def __init__(self, capacity=16):
+        self.data = np.zeros(capacity, dtype=BLOCK_DTYPE)
+        self.size = 0
+        self.checkpoint = Checkpoint()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def reserve(self, n) -> None:
+        if self.size + n > len(self.data):
+            data = np.zeros(max(2 * len(self.data), self.size + n), dtype=BLOCK_DTYPE)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, record: tuple) -> None:
+        self.reserve(1)
+        self.data[self.size] = record
+        self.size += 1
+
+    def extend(self, records: np.ndarray) -> None:
+        self.reserve(len(records))
+        self.data[self.size:self.size + len(records)] = records
+        self.size += len(records)
+
+    @property
+    def records(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    @property
+    def version(self) -> int:
+        """ Number of blocks of the origin received, held or folded """
+        return self.checkpoint.count + self.size
+
+    def fold(self, n=None) -> np.ndarray:
+        """ Fold the n oldest blocks held (all if None) into the checkpoint and return them """
+        n = self.size if n is None else n
+        records = self.data[:n].copy()
+        self.checkpoint = self.checkpoint.fold(records)
+        kept = self.data[n:self.size]
+        self.data = np.zeros(max(16, 2 * len(kept)), dtype=BLOCK_DTYPE)
+        self.data[:len(kept)] = kept
+        self.size = len(kept)
+        return records
 
 
 class Ledger:
-    def __init__(self, id, default_map, map_update_function):
-        self.id: str = id
-        self.ledger: dict = {}
+    def __init__(self, id, default_map, map_update_function, sync_mode='delta', max_blocks=None,
+                 spill_directory=None):
+        """
+        Initialize a Ledger.
+
+        Every block is created by one agent, its origin, and blocks of an origin are numbered in the order they were
+        created. Since ledgers only ever exchange the blocks following the ones the receiver already has, each ledger
+        holds a prefix of every origin's blocks, and its version vector (number of blocks held per origin) describes
+        its contents completely.
+
+        Blocks are typed events (see EventType) stored as rows of a structured array per origin (see BLOCK_DTYPE),
+        with integer ids made of the origin's agent code and the sequence number. The ledger attribute gives the
+        blocks as (description, metadata, preceding block ids) tuples, as earlier versions stored them.
+
+        Compaction folds the oldest blocks held into a checkpoint per origin (see Checkpoint), which keeps their point
+        of interest counters, so points_of_interest gives the same results with a bounded number of blocks held. A
+        ledger that lacks blocks another one has folded receives the checkpoint instead of them. The current block
+        stays readable once folded.
+
+        Parameters
+        ----------
+        id
+            Identifier of the agent owning the ledger.
+        default_map
+            Initial map, updated with update_map and map_update_function.
+        map_update_function : function
+            Function merging the map of a received ledger into this one, f(own_map, received_map) -> new map.
+        sync_mode : str
+            'delta' sends only the blocks the receiver lacks, 'full' sends the whole ledger at every contact.
+        max_blocks : int
+            Number of blocks held above which the ledger is compacted. If None, blocks are never folded.
+        spill_directory : str
+            Directory the folded blocks are appended to, one file per origin (see spilled_blocks). If None, they
+            are dropped.
+
+        """
+        if sync_mode not in SYNC_MODES:
+            raise ValueError(sync_mode)
+        self.id = id
+        self.code = agent_code(id)
         self.map = default_map
         self.map_update_function = map_update_function
-        self.current_block = self.add_block([], "Mission start")
+        self.sync_mode = sync_mode
+        self.max_blocks = max_blocks
+        self.spill_directory = spill_directory
+        # blocks held per origin code, and the agent id of every origin
+        self.stores: dict = {}
+        self.origins: dict = {}
+        self.ledger = LegacyView(self)
+        # blocks and bytes received in the last contact, and in total
+        self.last_exchange = {'blocks': 0, 'bytes': 0}
+        self.sync_stats = {'contacts': 0, 'blocks': 0, 'bytes': 0}
+        # aggregated point of interest counters, kept up to date as blocks come in: point -> [detected, verified,
+        # rejected, potential], in total and per observer code
+        self.poi_index: dict = {}
+        self.poi_by_observer: dict = {}
+        # changes whenever the counters do, so that results computed from them can be reused until then
+        self.poi_version = 0
+        # detections and potential detections made by other agents, by [row, col], grown as points come in
+        rows, cols = getattr(default_map, 'dimensions', (0, 0))
+        self.detections_by_others = np.zeros((rows + 1, cols + 1), dtype=np.int32)
+        # block the next blocks of this agent link to, and a copy of it kept once it is folded
+        self.current_block = None
+        self.current_record = None
+        self.record(EventType.MISSION_START, parents=(), current=True)
+
+    def record(self, event_type: EventType, point=(0, 0), agent=None, time=0, value=np.nan, parents=None,
+               current=False) -> int:
+        """
+        Add a block created by this ledger's agent.
+
+        Parameters
+        ----------
+        event_type : EventType
+            What happened.
+        point : tuple
+            (row, col) cell of point of interest events.
+        agent
+            Observer of point of interest events (this ledger's agent by default), broadcaster of received
+            broadcasts.
+        time : int
+            Local time of the agent.
+        value : float
+            Interest value of point of interest events.
+        parents : tuple
+            Ids of the preceding blocks, the current block by default.
+        current : bool
+            Make the new block the current block.
 
-    def add_block(self, last_keys, content: Any, metadata: dict = {}):
-        """ Add a block to the ledger """
-        key = random_key()
-        self.ledger[key] = (content, metadata, last_keys)
-        return key
+        Returns
+        -------
+        int
+            Id of the new block.
+
+        """
+        if parents is None:
+            parents = (self.current_block,)
+        parents = tuple(parents) + (NO_BLOCK, NO_BLOCK)
+        store = self.stores.get(self.code)
+        if store is None:
+            store = self.stores[self.code] = BlockStore()
+            self.origins[self.code] = self.id
+        id = block_id(self.code, store.version)
+        record = (id, event_type, point[0], point[1], self.code if agent is None else agent_code(agent), time, value,
+                  parents[0], parents[1])
+        store.append(record)
+        if current:
+            self.current_block = id
+            self.current_record = store.data[store.size - 1].copy()
+        if event_type in POI_EVENTS:
+            self.count(POI_EVENTS[event_type], record[4], (point[0], point[1]))
+        if self.max_blocks is not None and len(self) > self.max_blocks:
+            self.compact()
+        return id
+
+    def record_many(self, event_types, rows, cols, time=0, values=None) -> np.ndarray:
+        """
+        Add point of interest blocks observed by this ledger's agent at once, as successive calls of record would.
+
+        Parameters
+        ----------
+        event_types : np.ndarray
+            EventType of every block, all point of interest events.
+        rows, cols : np.ndarray
+            Cell of every block.
+        time : int
+            Local time of the agent.
+        values : np.ndarray
+            Interest value of every block, NaN if None.
+
+        Returns
+        -------
+        np.ndarray
+            Ids of the new blocks.
+
+        """
+        if len(event_types) == 0:
+            return np.zeros(0, dtype=np.int64)
+        store = self.stores.get(self.code)
+        if store is None:
+            store = self.stores[self.code] = BlockStore()
+            self.origins[self.code] = self.id
+        records = np.zeros(len(event_types), dtype=BLOCK_DTYPE)
+        records['id'] = block_id(self.code, store.version) + np.arange(len(records))
+        records['type'] = event_types
+        records['row'] = rows
+        records['col'] = cols
+        records['agent'] = self.code
+        records['time'] = time
+        records['value'] = np.nan if values is None else values
+        records['parent'] = self.current_block
+        records['parent2'] = NO_BLOCK
+        store.extend(records)
+        for event_type, point in zip(records['type'].tolist(), zip(records['row'].tolist(), records['col'].tolist())):
+            self.count(POI_EVENTS[event_type], self.code, point)
+        if self.max_blocks is not None and len(self) > self.max_blocks:
+            self.compact()
+        return records['id']
+
+    def add_block(self, last_keys, content, metadata: dict = {}):
+        """ Add a block given as a description and metadata, as in earlier versions of the ledger """
+        for event_type, description in DESCRIPTIONS.items():
+            if content.startswith(description.split(' ({')[0]):
+                break
+        else:
+            raise ValueError("Unknown block description: " + str(content))
+        parents = last_keys if isinstance(last_keys, (list, tuple)) else (last_keys,)
+        agent = metadata.get('observer', metadata.get('broadcaster'))
+        return self.record(event_type, metadata.get('point', (0, 0)), agent, metadata.get('time', 0),
+                           metadata.get('value', np.nan), parents)
+
+    def count(self, counter, observer, point, n=1) -> None:
+        self.poi_version += 1
+        self.poi_index.setdefault(point, [0, 0, 0, 0])[counter] += n
+        self.poi_by_observer.setdefault(observer, {}).setdefault(point, [0, 0, 0, 0])[counter] += n
+        if counter in DETECTION_COUNTERS and observer != self.code:
+            row, col = point
+            if row >= self.detections_by_others.shape[0] or col >= self.detections_by_others.shape[1]:
+                grown = np.zeros((max(row + 1, 2 * self.detections_by_others.shape[0]),
+                                  max(col + 1, 2 * self.detections_by_others.shape[1])), dtype=np.int32)
+                grown[:self.detections_by_others.shape[0], :self.detections_by_others.shape[1]] = \
+                    self.detections_by_others
+                self.detections_by_others = grown
+            self.detections_by_others[row, col] += n
+
+    def index_records(self, records: np.ndarray, sign=1) -> None:
+        """ Count the point of interest events among records in the point of interest index, or uncount them """
+        for event_type, observer, row, col in poi_events(records):
+            self.count(POI_EVENTS[event_type], observer, (row, col), sign)
+
+    def index_checkpoint(self, checkpoint: Checkpoint, sign=1) -> None:
+        for (observer, row, col), counters in checkpoint.counters.items():
+            for counter, n in enumerate(counters):
+                if n:
+                    self.count(counter, observer, (row, col), sign * n)
+
+    # ==================================================================================================================
+    def blocks(self, event_type=None) -> np.ndarray:
+        """ All blocks held, origin by origin, optionally only those of one event type """
+        records = [store.records for store in self.stores.values()]
+        records = np.concatenate(records) if records else np.zeros(0, dtype=BLOCK_DTYPE)
+        if event_type is not None:
+            records = records[records['type'] == event_type]
+        return records
+
+    def block(self, id) -> np.void:
+        """ Block with the given id, held or the current block """
+        origin, sequence = split_block_id(int(id))
+        store = self.stores.get(origin)
+        if store is None or not store.checkpoint.count <= sequence < store.version:
+            if id == self.current_block:
+                return self.current_record
+            raise KeyError(id)  # unknown, or folded into a checkpoint
+        return store.data[sequence - store.checkpoint.count]
+
+    def block_ids(self, origin) -> list:
+        """ Ids of the blocks of an origin agent held, in creation order """
+        store = self.stores.get(agent_code(origin))
+        return [] if store is None else store.records['id'].tolist()
+
+    def __len__(self) -> int:
+        """ Number of blocks held """
+        return sum(len(store) for store in self.stores.values())
+
+    # ==================================================================================================================
+    def compact(self) -> None:
+        """
+        Fold old blocks into the checkpoints of their origins, spilling them to disk if configured.
+
+        The newest blocks are kept, max_blocks // 2 in all shared between the origins, so that compaction only runs
+        again once as many blocks came in. The current block, which the next blocks link to, stays available through
+        block and ledger once folded (see current_record).
+        """
+        keep = (self.max_blocks or 0) // 2 // max(1, sum(1 for store in self.stores.values() if len(store)))
+        for code, store in self.stores.items():
+            n = len(store) - keep
+            if n > 0:
+                records = store.fold(n)
+                if self.spill_directory is not None:
+                    with open(self.spill_path(code), 'ab') as f:
+                        records.tofile(f)
+
+    def spill_path(self, code) -> str:
+        return os.path.join(self.spill_directory, '%d-%d.blocks' % (self.code, code))
+
+    def spilled_blocks(self, origin) -> np.ndarray:
+        """ Blocks of an origin folded by this ledger and spilled to disk, in creation order """
+        path = self.spill_path(agent_code(origin))
+        if self.spill_directory is None or not os.path.exists(path):
+            return np.zeros(0, dtype=BLOCK_DTYPE)
+        return np.fromfile(path, dtype=BLOCK_DTYPE)
+
+    # ==================================================================================================================
+    def version_vector(self) -> dict:
+        """ Number of blocks held per origin """
+        return {self.origins[code]: store.version for code, store in self.stores.items()}
+
+    def delta(self, version_vector: dict) -> dict:
+        """
+        Blocks missing from a ledger with the given version vector.
+
+        Returns
+        -------
+        dict
+            origin -> (sequence number of the first block, structured array of the blocks, checkpoint). The
+            checkpoint is sent, and the blocks start after it, if the receiver lacks blocks folded into it;
+            otherwise it is None.
+
+        """
+        delta = {}
+        for code, store in self.stores.items():
+            origin = self.origins[code]
+            start = version_vector.get(origin, 0)
+            if start < store.checkpoint.count:
+                delta[origin] = (store.checkpoint.count, store.records, store.checkpoint)
+            elif start < store.version:
+                delta[origin] = (start, store.records[start - store.checkpoint.count:], None)
+        return delta
+
+    def apply_delta(self, delta: dict) -> dict:
+        """
+        Store the blocks of a delta that this ledger doesn't hold yet.
+
+        Returns
+        -------
+        dict
+            Number of blocks and bytes transferred by the delta.
+
+        """
+        exchange = {'blocks': 0, 'bytes': 0}
+        for origin, (start, records, checkpoint) in delta.items():
+            code = agent_code(origin)
+            store = self.stores.get(code)
+            if store is None:
+                store = self.stores[code] = BlockStore(max(16, len(records)))
+                self.origins[code] = origin
+            if checkpoint is not None:
+                exchange['blocks'] += 1
+                exchange['bytes'] += checkpoint.nbytes
+                if checkpoint.count == store.checkpoint.count and checkpoint.digest != store.checkpoint.digest:
+                    raise ValueError("Checkpoint of " + str(origin) + " doesn't match the history held")
+                if checkpoint.count > store.version:
+                    # replace everything held of this origin by the checkpoint, which covers it
+                    self.index_checkpoint(store.checkpoint, -1)
+                    self.index_records(store.records, -1)
+                    self.index_checkpoint(checkpoint)
+                    store.data[:] = 0
+                    store.size = 0
+                    store.checkpoint = checkpoint
+            held = store.version
+            if held < start:
+                raise ValueError("Delta of " + str(origin) + " starts at block " + str(start) + ", but only " +
+                                 str(held) + " are held")
+            new = records[held - start:]
+            if len(new):
+                store.extend(new)
+                self.index_records(new)
+            exchange['blocks'] += len(records)
+            exchange['bytes'] += records.nbytes
+        if self.max_blocks is not None and len(self) > self.max_blocks:
+            self.compact()
+        return exchange
 
     def receive(self, r_ledger, time) -> None:
         """ Update the ledger with another ledger """
-        self.ledger.update(r_ledger.ledger)
-        self.current_block = self.add_block([self.current_block, r_ledger.current_block], "Broadcast received",
-                                            {'broadcaster': r_ledger.id, 'time': time})
+        if self.sync_mode == 'delta':
+            delta = r_ledger.delta(self.version_vector())
+        else:
+            delta = r_ledger.delta({})
+        self.receive_delta(delta, r_ledger.id, r_ledger.current_block, time)
         self.map = self.map_update_function(self.map, r_ledger.map)
 
+    def receive_delta(self, delta: dict, sender, sender_block, time) -> None:
+        """ receive, given the delta made by the sender and the id of its current block instead of its ledger """
+        self.last_exchange = self.apply_delta(delta)
+        self.sync_stats['contacts'] += 1
+        self.sync_stats['blocks'] += self.last_exchange['blocks']
+        self.sync_stats['bytes'] += self.last_exchange['bytes']
+        self.record(EventType.BROADCAST_RECEIVED, agent=sender, time=time, parents=(self.current_block, sender_block),
+                    current=True)
+
     def update_map(self, observation, time) -> None:
         """ Update the map with an observation """
-        # self.current_block = self.add_block([self.current_block], "Map updated", {'agent': self.name, 'time': time})
+        # self.current_block = self.record(EventType.MAP_UPDATED, time=time)
         self.map = observation(self.map)
 
-    def points_of_interest(self, observer_to_skip = False):
+    # ==================================================================================================================
+    def point_of_interest(self, point, observer_to_skip=False):
+        """
+        Counters of a single point of interest, in the format of points_of_interest, or None if nothing is known
+        about it. Detections and potential detections made by observer_to_skip are not counted.
+        """
+        counts = self.poi_index.get(point)
+        if counts is None:
+            return None
+        detected, verified, rejected, potential = counts
+        if observer_to_skip != False:  # don't count my own detections, since I can't verify them anyway
+            own = self.poi_by_observer.get(agent_code(observer_to_skip), {}).get(point)
+            if own is not None:
+                detected -= own[0]
+                potential -= own[3]
+        if detected == verified == rejected == potential == 0:
+            return None
+        return {'detected': detected, 'verified': verified, 'rejected': rejected, 'potential': potential}
+
+    def points_of_interest(self, observer_to_skip=False):
         points_of_interest = {}
-        for key in self.ledger.keys():
-            if "Detected point of interest" in self.ledger[key][0]:
-                if observer_to_skip == False or self.ledger[key][1]['observer'] != observer_to_skip:  # don't count my own detections, since I can't verify them anyway
-                    if self.ledger[key][1]['point'] in points_of_interest.keys():
-                        points_of_interest[self.ledger[key][1]['point']]['detected'] += 1
-                    else:
-                        points_of_interest[self.ledger[key][1]['point']] = {'detected': 1, 'verified': 0, 'rejected': 0, 'potential': 0}
-            elif "Detected potential point of interest" in self.ledger[key][0]:
-                if observer_to_skip == False or self.ledger[key][1]['observer'] != observer_to_skip:  # don't count my own detections, since I can't verify them anyway
-                    if self.ledger[key][1]['point'] in points_of_interest.keys():
-                        points_of_interest[self.ledger[key][1]['point']]['potential'] += 1
-                    else:
-                        points_of_interest[self.ledger[key][1]['point']] = {'detected': 0, 'verified': 0, 'rejected': 0,
-                                                                            'potential': 1}
-            elif "Verified point of interest" in self.ledger[key][0]:
-                if self.ledger[key][1]['point'] in points_of_interest.keys():
-                    points_of_interest[self.ledger[key][1]['point']]['verified'] += 1
-                else:
-                    points_of_interest[self.ledger[key][1]['point']] = {'detected': 0, 'verified': 1, 'rejected': 0, 'potential': 0}
-            elif "Didn't detect point of interest" in self.ledger[key][0]:
-                if self.ledger[key][1]['point'] in points_of_interest.keys():
-                    points_of_interest[self.ledger[key][1]['point']]['rejected'] += 1
-                else:
-                    points_of_interest[self.ledger[key][1]['point']] = {'detected': 0, 'verified': 0, 'rejected': 1, 'potential': 0}
+        for point in self.poi_index.keys():
+            counts = self.point_of_interest(point, observer_to_skip)
+            if counts is not None:
+                points_of_interest[point] = counts
         return points_of_interest
 
+    def is_detected_by_others(self, point, observer) -> bool:
+        """ Whether someone other than observer detected a point of interest or a potential one at point """
+        counts = self.poi_index.get(point)
+        if counts is None:
+            return False
+        own = self.poi_by_observer.get(agent_code(observer), {}).get(point, (0, 0, 0, 0))
+        return counts[0] - own[0] + counts[3] - own[3] > 0
+
+    def detected_by_others(self, rows, cols, observer) -> np.ndarray:
+        """ is_detected_by_others for many (row, col) cells, as a boolean array """
+        if agent_code(observer) != self.code:
+            points = zip(rows.tolist(), cols.tolist())
+            return np.array([self.is_detected_by_others(point, observer) for point in points], dtype=bool)
+        counts = self.detections_by_others
+        inside = np.flatnonzero((rows < counts.shape[0]) & (cols < counts.shape[1]))
+        detected = np.zeros(len(rows), dtype=bool)
+        detected[inside] = counts[rows[inside], cols[inside]] > 0
+        return detected
+
+
+class LegacyView(Mapping):
+    """ Blocks of a Ledger as {id: (description, metadata, [preceding block ids])}, built on access """
+    def __init__(self, ledger: Ledger):
+        self.ledger = ledger
+
+    def __getitem__(self, id) -> tuple:
+        block = self.ledger.block(id)
+        event_type = EventType(int(block['type']))
+        point = (int(block['row']), int(block['col']))
+        agent = self.ledger.origins.get(int(block['agent']), int(block['agent']))
+        if event_type in POI_EVENTS:
+            metadata = {'point': point, 'observer': agent, 'time': int(block['time']),
+                        'value': float(block['value'])}
+        elif event_type == EventType.BROADCAST_RECEIVED:
+            metadata = {'broadcaster': agent, 'time': int(block['time'])}
+        else:
+            metadata = {}
+        parents = [int(p) for p in (block['parent'], block['parent2']) if p != NO_BLOCK]
+        return DESCRIPTIONS[event_type].format(*point), metadata, parents
+
+    def __contains__(self, id) -> bool:
+        try:
+            self.ledger.block(id)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def __iter__(self):
+        for store in self.ledger.stores.values():
+            yield from store.records['id'].tolist()
+
+    def __len__(self) -> int:
+        return len(self.ledger)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
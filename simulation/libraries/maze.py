@@ -0,0 +1,167 @@
+from collections.abc import Sequence
+import numpy as np
+from libraries.grid import ALL_WALLS, WALL_BITS, WallView
+
+# (wall of the cell, wall of the neighbour, row step, column step) of the moves between cells
+_NEIGHBOURS = ((WALL_BITS['E'], WALL_BITS['W'], 0, 1), (WALL_BITS['W'], WALL_BITS['E'], 0, -1),
+               (WALL_BITS['N'], WALL_BITS['S'], -1, 0), (WALL_BITS['S'], WALL_BITS['N'], 1, 0))
+
+
+class Cells(Sequence):
+    """ The (row, col) cells of a maze, in the order of pyamaze.maze.grid (column by column), without storing them """
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return index % self.rows + 1, index // self.rows + 1
+
+    def __iter__(self):
+        for col in range(1, self.cols + 1):
+            for row in range(1, self.rows + 1):
+                yield row, col
+
+    def __contains__(self, cell) -> bool:
+        try:
+            row, col = cell
+        except (TypeError, ValueError):
+            return False
+        return 0 < row <= self.rows and 0 < col <= self.cols
+
+
+class GridMaze:
+    def __init__(self, walls: np.ndarray):
+        """
+        Maze stored as a wall bitmask array (see libraries.grid), with the rows, cols, grid and maze_map interface of
+        pyamaze.maze that AgentMap and Agent use.
+
+        Parameters
+        ----------
+        walls : np.ndarray
+            uint8 array of shape (rows, cols), a set bit meaning the cell is closed in that direction.
+
+        """
+        self.walls = walls
+        self.rows, self.cols = walls.shape
+        self.grid = Cells(self.rows, self.cols)
+        self.maze_map = WallView(walls)
+
+
+class MazeAgent:
+    """ Position holder standing in for pyamaze.agent, position being a (col, row) pair """
+    __slots__ = ('position',)
+
+    def __init__(self, position=None):
+        self.position = position
+
+
+def field(rows, cols) -> GridMaze:
+    """ Open field, with walls only along the border """
+    walls = np.zeros((rows, cols), dtype=np.uint8)
+    walls[0, :] |= WALL_BITS['N']
+    walls[-1, :] |= WALL_BITS['S']
+    walls[:, 0] |= WALL_BITS['W']
+    walls[:, -1] |= WALL_BITS['E']
+    return GridMaze(walls)
+
+
+def generate_maze(rows, cols, rng: np.random.Generator, loop_percent=0) -> GridMaze:
+    """
+    Random maze, carved with a depth-first search like pyamaze's CreateMaze.
+
+    With loop_percent above 0, walls are then removed to create loops: about (rows * cols) / 3 * loop_percent / 100
+    of them, as in CreateMaze, and never where this would open a 2x2 square of cells.
+
+    Parameters
+    ----------
+    rows, cols : int
+        Shape of the maze.
+    rng : np.random.Generator
+        Generator of all random choices, so that a seed gives the same maze.
+    loop_percent : float
+        0 gives a perfect maze (a single path between any two cells), 100 the most loops.
+
+    """
+    walls = bytearray([ALL_WALLS]) * (rows * cols)
+    visited = bytearray(rows * cols)
+    draws = iter(rng.random(rows * cols).tolist())  # one per step forward, every cell but the first is entered once
+    stack = [0]
+    visited[0] = 1
+    while stack:
+        cell = stack[-1]
+        row, col = divmod(cell, cols)
+        options = []
+        for wall, opposite, dr, dc in _NEIGHBOURS:
+            r, c = row + dr, col + dc
+            if 0 <= r < rows and 0 <= c < cols and not visited[r * cols + c]:
+                options.append((wall, opposite, r * cols + c))
+        if not options:
+            stack.pop()
+            continue
+        wall, opposite, neighbour = options[int(next(draws) * len(options))]
+        walls[cell] &= ALL_WALLS ^ wall
+        walls[neighbour] &= ALL_WALLS ^ opposite
+        visited[neighbour] = 1
+        stack.append(neighbour)
+    walls = np.frombuffer(walls, dtype=np.uint8).reshape(rows, cols).copy()
+    if loop_percent:
+        add_loops(walls, rng, int(np.ceil(rows * cols / 3 * loop_percent / 100)))
+    return GridMaze(walls)
+
+
+def add_loops(walls: np.ndarray, rng: np.random.Generator, count) -> int:
+    """ Remove up to count inner walls at random, skipping those that would open a 2x2 square; returns the number """
+    rows, cols = walls.shape
+    removed = 0
+    for cell in rng.permutation(rows * cols).tolist():
+        if removed >= count:
+            break
+        row, col = divmod(cell, cols)
+        options = [(wall, opposite, row + dr, col + dc) for wall, opposite, dr, dc in _NEIGHBOURS
+                   if walls[row, col] & wall and 0 <= row + dr < rows and 0 <= col + dc < cols]
+        if not options:
+            continue
+        wall, opposite, r, c = options[int(rng.integers(len(options)))]
+        if opens_square(walls, (row, col), (r, c)):
+            continue
+        walls[row, col] &= ALL_WALLS ^ wall
+        walls[r, c] &= ALL_WALLS ^ opposite
+        removed += 1
+    return removed
+
+
+def opens_square(walls: np.ndarray, cell1, cell2) -> bool:
+    """ Whether removing the wall between two adjacent cells would leave a 2x2 square of cells without inner walls """
+    rows, cols = walls.shape
+    (r1, c1), (r2, c2) = sorted((cell1, cell2))
+    if r1 == r2:  # side by side, look at the pairs of cells above and below
+        for side, dr in (('S', 1), ('N', -1)):
+            r = r1 + dr
+            if 0 <= r < rows and not (walls[r1, c1] & WALL_BITS[side]) and not (walls[r2, c2] & WALL_BITS[side]) \
+                    and not (walls[r, c1] & WALL_BITS['E']):
+                return True
+    else:  # one above the other, look at the pairs of cells to the right and left
+        for side, dc in (('E', 1), ('W', -1)):
+            c = c1 + dc
+            if 0 <= c < cols and not (walls[r1, c1] & WALL_BITS[side]) and not (walls[r2, c2] & WALL_BITS[side]) \
+                    and not (walls[r1, c] & WALL_BITS['S']):
+                return True
+    return False
+
+
+def to_pyamaze_csv(maze: GridMaze, path) -> None:
+    """ Save a maze in the CSV format of pyamaze's CreateMaze(saveMaze=True), to load it with loadMaze=path """
+    with open(path, 'w', newline='') as f:
+        f.write('  cell  ,E,W,N,S\n')
+        for row, col in maze.grid:
+            cell = maze.maze_map[(row, col)]
+            f.write('"(%d, %d)",%d,%d,%d,%d\n' % (row, col, cell['E'], cell['W'], cell['N'], cell['S']))
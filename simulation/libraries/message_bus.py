@@ -0,0 +1,123 @@
+import asyncio
+import numpy as np
+
+
+class Message:
+    """
+    Ledger and map updates an agent gossips to a peer (see Agent.gossip and Agent.deliver). It only holds plain data
+    and copies, so that it can be delayed, dropped or serialized without touching either agent.
+
+    blocks is a Ledger.delta against the last version_vector heard from the recipient, and map_changes the output
+    of AgentMap.export_changes, the changes since map_since (0 for the whole map). version_vector and map_version
+    describe the sender's ledger and map when it was sent, and map_ack the version of the recipient's map up to which
+    the sender received every change.
+    """
+    __slots__ = ('sender', 'recipient', 'time', 'blocks', 'version_vector', 'current_block', 'map_changes',
+                 'map_since', 'map_version', 'map_ack')
+
+    def __init__(self, sender, recipient, time, blocks, version_vector, current_block, map_changes, map_since,
+                 map_version, map_ack):
+        self.sender = sender
+        self.recipient = recipient
+        self.time = time
+        self.blocks = blocks
+        self.version_vector = version_vector
+        self.current_block = current_block
+        self.map_changes = map_changes
+        self.map_since = map_since
+        self.map_version = map_version
+        self.map_ack = map_ack
+
+    @property
+    def nbytes(self) -> int:
+        """ Size of the payload: blocks, checkpoints and map cells """
+        size = 0
+        for _, records, checkpoint in self.blocks.values():
+            size += records.nbytes + (0 if checkpoint is None else checkpoint.nbytes)
+        cells, walls, visits = self.map_changes
+        return size + (0 if cells is None else cells.nbytes) + walls.nbytes + visits.nbytes
+
+
+class MessageBus:
+    def __init__(self, latency=0.0, drop_rate=0.0, bandwidth=None, rng=None):
+        """
+        In-process transport of Messages between the agents of an asyncio runtime, with an inbox queue per agent.
+
+        A message is lost with probability drop_rate. Otherwise it is transmitted once the link of its sender is
+        done with the messages sent before, in nbytes / bandwidth seconds, and arrives latency seconds later.
+        Delivery is at most once; senders make up for losses by resending what wasn't acknowledged.
+
+        Parameters
+        ----------
+        latency : float
+            Seconds between the end of the transmission of a message and its arrival.
+        drop_rate : float
+            Probability that a message is lost.
+        bandwidth : float
+            Bytes per second of the link of every sender. If None, transmission takes no time.
+        rng : np.random.Generator
+            Generator of the losses, a new unseeded one if None.
+
+        """
+        if not 0 <= drop_rate <= 1:
+            raise ValueError("Drop rate must be between 0 and 1, got " + str(drop_rate))
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.bandwidth = bandwidth
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.inboxes: dict = {}
+        self.link_free: dict = {}  # sender -> loop time its link is done with the messages sent so far
+        self.in_flight = 0
+        self.settled = None  # set whenever no message is in flight, made by open for the loop of each run
+        self.stats = {'sent': 0, 'dropped': 0, 'delivered': 0, 'bytes': 0}
+
+    def open(self) -> None:
+        """ Get ready for a run on the running loop, every run having its own (see AsyncRuntime.run); stats go on """
+        self.inboxes = {}
+        self.link_free = {}
+        self.in_flight = 0
+        self.settled = asyncio.Event()
+        self.settled.set()
+
+    def register(self, id) -> asyncio.Queue:
+        """ New inbox of an agent, replacing the one it had """
+        self.inboxes[id] = asyncio.Queue()
+        return self.inboxes[id]
+
+    def send(self, message: Message) -> None:
+        """ Put a message on its way, from a coroutine of the running loop """
+        self.stats['sent'] += 1
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            self.stats['dropped'] += 1
+            return
+        loop = asyncio.get_running_loop()
+        delay = self.latency
+        if self.bandwidth is not None:
+            now = loop.time()
+            done = max(now, self.link_free.get(message.sender, now)) + message.nbytes / self.bandwidth
+            self.link_free[message.sender] = done
+            delay += done - now
+        self.stats['bytes'] += message.nbytes
+        self.in_flight += 1
+        self.settled.clear()
+        if delay > 0:
+            loop.call_later(delay, self.arrive, message)
+        else:
+            loop.call_soon(self.arrive, message)
+
+    def arrive(self, message: Message) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self.settled.set()
+        inbox = self.inboxes.get(message.recipient)
+        if inbox is None:
+            self.stats['dropped'] += 1
+            return
+        self.stats['delivered'] += 1
+        inbox.put_nowait(message)
+
+    async def drain(self) -> None:
+        """ Wait until every message sent has arrived and been processed by its recipient """
+        await self.settled.wait()
+        for inbox in self.inboxes.values():
+            await inbox.join()
@@ -0,0 +1,257 @@
+import numpy as np
+from libraries.grid import DIRECTIONS, WALL_BITS
+
+# Moves in the order generate_n_moves enumerates them, as (direction, row step, column step)
+MOVES = (('E', 0, 1), ('W', 0, -1), ('N', -1, 0), ('S', 1, 0))
+# Order in which generate_n_moves lists the best move sequence of each first direction
+GROUP_ORDER = ('N', 'E', 'W', 'S')
+
+
+def step(walls: np.ndarray, cell: tuple, direction: str):
+    """
+    Position after moving from cell in a direction, following the rules of generate_n_moves.
+
+    Returns None if a known wall blocks the move. Moving against the border of the maze keeps the agent in place.
+    """
+    row, col = cell
+    if walls.item(row - 1, col - 1) & WALL_BITS[direction]:
+        return None
+    if direction == 'N':
+        return (row - 1, col) if row > 1 else cell
+    if direction == 'S':
+        return (row + 1, col) if row < walls.shape[0] else cell
+    if direction == 'E':
+        return (row, col + 1) if col < walls.shape[1] else cell
+    return (row, col - 1) if col > 1 else cell
+
+
+def score_path(walls: np.ndarray, tokens: np.ndarray, start: tuple, path: str):
+    """ Sum of tokens along a move sequence from start (a (row, col) tuple), or None if a wall blocks it """
+    value = 0
+    cell = start
+    for direction in path:
+        cell = step(walls, cell, direction)
+        if cell is None:
+            return None
+        value = value + tokens.item(cell[0] - 1, cell[1] - 1)
+    return value
+
+
+class RecursivePlanner:
+    """ Exhaustive search of Agent.generate_n_moves: n moves deep, repeated m times for the best move of each kind """
+    def __init__(self, n=5, m=1):
+        self.n = n
+        self.m = m
+
+    def plan(self, agent, token_map) -> str:
+        moves = agent.generate_n_moves(token_map, n=self.n, m=self.m)
+        best_move = ''
+        best_score = -100
+        for key in moves.keys():
+            if moves[key][0] > best_score:
+                best_move = key
+                best_score = moves[key][0]
+        return best_move
+
+
+class DynamicProgrammingPlanner:
+    """
+    Planner over (cell, depth) states of the agent's known maze_map.
+
+    Paths are scored like in generate_n_moves, by the sum of the token values of the cells entered at every move,
+    with known walls blocking moves and the border of the maze keeping the agent in place.
+
+    mode='optimal' returns the best path of n * m moves, found with a forward dynamic program over the window of
+    cells reachable from the agent. Its cost grows with the cube of the horizon rather than exponentially.
+
+    mode='equivalent' makes the same choices as RecursivePlanner: it looks for the best n moves starting with each
+    direction, then extends each of them m - 1 times with the best n moves from where they end, and ties are broken
+    in the order generate_n_moves lists the sequences. Each block of n moves is solved with dynamic programming, so
+    for a fixed seed it gives the same path as the recursion, up to ties created by floating point rounding.
+
+    """
+    def __init__(self, n=5, m=1, mode='optimal'):
+        if mode not in ('optimal', 'equivalent'):
+            raise ValueError(mode)
+        self.n = n
+        self.m = m
+        self.mode = mode
+
+    def plan(self, agent, token_map) -> str:
+        walls = agent.ledger.map.walls
+        tokens = token_map.array if hasattr(token_map, 'array') else token_map
+        start = (agent.agent.position[1], agent.agent.position[0])
+        if self.mode == 'optimal':
+            return self.optimal_path(walls, tokens, start, self.n * self.m)
+        return self.equivalent_path(walls, tokens, start)
+
+    # ==================================================================================================================
+    def best_block(self, walls, tokens, start, value, first_moves):
+        """
+        Best sequence of n moves from start whose first move is in first_moves, as (value, path, end cell), or None.
+
+        Sums are accumulated in the same order as in generate_n_moves, and among equal values the sequence listed
+        first by generate_n_moves (the lexicographically smallest in DIRECTIONS order) is kept.
+        """
+        frontier = {}
+        for direction in first_moves:
+            cell = step(walls, start, direction)
+            if cell is not None:
+                self.keep(frontier, cell, value + tokens.item(cell[0] - 1, cell[1] - 1),
+                          str(DIRECTIONS.index(direction)))
+        for _ in range(self.n - 1):
+            next_frontier = {}
+            for cell, (v, path) in frontier.items():
+                for i, direction in enumerate(DIRECTIONS):
+                    next_cell = step(walls, cell, direction)
+                    if next_cell is not None:
+                        self.keep(next_frontier, next_cell, v + tokens.item(next_cell[0] - 1, next_cell[1] - 1),
+                                  path + str(i))
+            frontier = next_frontier
+        best = None
+        for cell, (v, path) in frontier.items():
+            if best is None or v > best[0] or (v == best[0] and path < best[1]):
+                best = (v, path, cell)
+        if best is None:
+            return None
+        return best[0], ''.join(DIRECTIONS[int(i)] for i in best[1]), best[2]
+
+    @staticmethod
+    def keep(frontier, cell, value, path):
+        current = frontier.get(cell)
+        if current is None or value > current[0] or (value == current[0] and path < current[1]):
+            frontier[cell] = (value, path)
+
+    def equivalent_path(self, walls, tokens, start) -> str:
+        if self.m == 1:
+            candidates = [self.best_block(walls, tokens, start, 0, DIRECTIONS)]
+        else:
+            candidates = []
+            for direction in GROUP_ORDER:
+                block = self.best_block(walls, tokens, start, 0, (direction,))
+                if block is None:
+                    continue
+                for _ in range(self.m - 1):
+                    next_block = self.best_block(walls, tokens, block[2], block[0], DIRECTIONS)
+                    if next_block is None:  # walled in, generate_n_moves finds no sequence either
+                        break
+                    block = (next_block[0], block[1] + next_block[1], next_block[2])
+                else:
+                    candidates.append(block)
+        best_move = ''
+        best_score = -100
+        for candidate in candidates:
+            if candidate is not None and candidate[0] > best_score:
+                best_score, best_move = candidate[0], candidate[1]
+        return best_move
+
+    # ==================================================================================================================
+    @staticmethod
+    def optimal_path(walls, tokens, start, horizon) -> str:
+        """ Best path of horizon moves from start, found with a forward dynamic program over (cell, depth) states """
+        rows, cols = walls.shape
+        # only cells within horizon moves of the start can be reached
+        r0, r1 = max(start[0] - 1 - horizon, 0), min(start[0] + horizon, rows)
+        c0, c1 = max(start[1] - 1 - horizon, 0), min(start[1] + horizon, cols)
+        w = walls[r0:r1, c0:c1]
+        t = tokens[r0:r1, c0:c1]
+        shape = w.shape
+        value = np.full(shape, -np.inf)
+        value[start[0] - 1 - r0, start[1] - 1 - c0] = 0
+        # code of the move leading to every state: the index in MOVES, plus len(MOVES) if it was made against the
+        # border of the maze and kept the agent in place
+        came_from = np.zeros((horizon,) + shape, dtype=np.int8)
+        for depth in range(horizon):
+            best = np.full(shape, -np.inf)
+            code = np.zeros(shape, dtype=np.int8)
+            for i, (direction, dr, dc) in enumerate(MOVES):
+                source = np.where(w & WALL_BITS[direction], -np.inf, value)
+                moved = np.full(shape, -np.inf)
+                moved[max(dr, 0):shape[0] + min(dr, 0), max(dc, 0):shape[1] + min(dc, 0)] = \
+                    source[max(-dr, 0):shape[0] + min(-dr, 0), max(-dc, 0):shape[1] + min(-dc, 0)]
+                stayed = np.full(shape, -np.inf)
+                # the window edges are only reached at the horizon, so only the border of the maze needs this
+                if direction == 'E' and c1 == cols:
+                    stayed[:, -1] = source[:, -1]
+                elif direction == 'W' and c0 == 0:
+                    stayed[:, 0] = source[:, 0]
+                elif direction == 'N' and r0 == 0:
+                    stayed[0, :] = source[0, :]
+                elif direction == 'S' and r1 == rows:
+                    stayed[-1, :] = source[-1, :]
+                for candidate, move_code in ((moved + t, i), (stayed + t, i + len(MOVES))):
+                    better = candidate > best
+                    best[better] = candidate[better]
+                    code[better] = move_code
+            value = best
+            came_from[depth] = code
+        if not np.isfinite(value).any():
+            return ''
+        cell = np.unravel_index(np.argmax(value), shape)
+        path = []
+        for depth in range(horizon - 1, -1, -1):
+            move_code = int(came_from[depth][cell])
+            direction, dr, dc = MOVES[move_code % len(MOVES)]
+            path.append(direction)
+            if move_code < len(MOVES):
+                cell = (cell[0] - dr, cell[1] - dc)
+        return ''.join(reversed(path))
+
+
+def best_first_moves(walls: np.ndarray, tokens: np.ndarray, starts: np.ndarray, horizon) -> np.ndarray:
+    """
+    First move of the best path of horizon moves, for a batch of K maps at once.
+
+    Makes the same choices as DynamicProgrammingPlanner.optimal_path on every map: instead of recording the move
+    leading to every state and walking back from the best one, the first move of the best path to every state is
+    carried forward.
+
+    Parameters
+    ----------
+    walls, tokens : np.ndarray
+        Known wall bitmasks and token values, of shape (K, rows, cols).
+    starts : np.ndarray
+        (row, col) start of every map, 1-indexed, of shape (K, 2).
+    horizon : int
+        Length of the paths.
+
+    Returns
+    -------
+    np.ndarray
+        Index in MOVES of the first move on every map, or -1 where no path exists.
+
+    """
+    batch, rows, cols = walls.shape
+    blocked = [(walls & WALL_BITS[direction]) != 0 for direction, _, _ in MOVES]
+    # moving against the border of the maze keeps the agent in place
+    borders = {'E': (slice(None), slice(None), -1), 'W': (slice(None), slice(None), 0),
+               'N': (slice(None), 0, slice(None)), 'S': (slice(None), -1, slice(None))}
+    value = np.full(walls.shape, -np.inf)
+    value[np.arange(batch), starts[:, 0] - 1, starts[:, 1] - 1] = 0
+    first = np.zeros(walls.shape, dtype=np.int8)
+    candidate = np.empty(walls.shape)
+    better = np.empty(walls.shape, dtype=bool)
+    for depth in range(horizon):
+        best = np.full(walls.shape, -np.inf)
+        best_first = np.zeros(walls.shape, dtype=np.int8)
+        for i, (direction, dr, dc) in enumerate(MOVES):
+            source = np.where(blocked[i], -np.inf, value)
+            source_first = first if depth else np.full(walls.shape, i, dtype=np.int8)
+            target = (slice(None), slice(max(dr, 0), rows + min(dr, 0)), slice(max(dc, 0), cols + min(dc, 0)))
+            origin = (slice(None), slice(max(-dr, 0), rows + min(-dr, 0)), slice(max(-dc, 0), cols + min(-dc, 0)))
+            candidate.fill(-np.inf)
+            np.add(source[origin], tokens[target], out=candidate[target])
+            np.greater(candidate, best, out=better)
+            np.copyto(best, candidate, where=better)
+            np.copyto(best_first[target], source_first[origin], where=better[target])
+            border = borders[direction]
+            stayed = source[border] + tokens[border]
+            stay = stayed > best[border]
+            best[border] = np.where(stay, stayed, best[border])
+            best_first[border] = np.where(stay, source_first[border], best_first[border])
+        value, first = best, best_first
+    flat = value.reshape(batch, -1)
+    cell = np.argmax(flat, axis=1)
+    moves = first.reshape(batch, -1)[np.arange(batch), cell].astype(int)
+    moves[~np.isfinite(flat[np.arange(batch), cell])] = -1
+    return moves
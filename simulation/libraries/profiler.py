@@ -0,0 +1,144 @@
+import json
+from time import perf_counter
+
+
+class _Phase:
+    """ Context manager timing one call of a phase """
+    __slots__ = ('profiler', 'key', 'start')
+
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.key, perf_counter() - self.start)
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        """
+        Wall time and call count of the phases of a simulation, per tick and per agent.
+
+        Code under measurement runs in `with profiler.phase(name, agent):` blocks. Phases may be nested, e.g.
+        'update' contains 'observe', so the times of different phases don't add up to the total. The simulation
+        calls new_tick at the start of every update; phases outside of any update are counted in tick -1.
+
+        """
+        self.tick = -1
+        # (tick, agent, phase) -> [calls, seconds]
+        self.records = {}
+
+    def new_tick(self) -> None:
+        self.tick += 1
+
+    def phase(self, name, agent=None) -> _Phase:
+        """ Context manager counting a call of a phase and its wall time, for an agent or the whole simulation """
+        return _Phase(self, (self.tick, agent, name))
+
+    def add(self, key, seconds) -> None:
+        record = self.records.get(key)
+        if record is None:
+            self.records[key] = [1, seconds]
+        else:
+            record[0] += 1
+            record[1] += seconds
+
+    def stats(self) -> 'ProfileStats':
+        """ Snapshot of the measurements so far """
+        return ProfileStats({key: tuple(value) for key, value in self.records.items()})
+
+
+class NullProfiler:
+    """ Profiler that measures nothing, the default of the simulation so that instrumentation costs close to nothing """
+    enabled = False
+    tick = -1
+
+    def new_tick(self) -> None:
+        pass
+
+    def phase(self, name, agent=None) -> _NullPhase:
+        return _NULL_PHASE
+
+    def stats(self) -> 'ProfileStats':
+        return ProfileStats({})
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class ProfileStats:
+    def __init__(self, records: dict):
+        """
+        Measurements of a Profiler.
+
+        Parameters
+        ----------
+        records : dict
+            (tick, agent, phase) -> (calls, seconds). agent is None for phases of the whole simulation.
+
+        """
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @staticmethod
+    def _entry(calls, seconds) -> dict:
+        return {'calls': calls, 'seconds': seconds}
+
+    def _group(self, key_index) -> dict:
+        groups = {}
+        for key, (calls, seconds) in self.records.items():
+            group = groups.setdefault(key[key_index], {})
+            totals = group.setdefault(key[2], [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        return {name: {phase: self._entry(*totals) for phase, totals in group.items()}
+                for name, group in groups.items()}
+
+    def by_phase(self) -> dict:
+        """ phase -> {'calls', 'seconds'}, summed over ticks and agents """
+        phases = {}
+        for (_, _, phase), (calls, seconds) in self.records.items():
+            totals = phases.setdefault(phase, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        return {phase: self._entry(*totals) for phase, totals in phases.items()}
+
+    def by_agent(self) -> dict:
+        """ agent -> phase -> {'calls', 'seconds'}, summed over ticks. Simulation-wide phases are under None. """
+        return self._group(1)
+
+    def by_tick(self) -> dict:
+        """ tick -> phase -> {'calls', 'seconds'}, summed over agents """
+        return self._group(0)
+
+    def as_dict(self) -> dict:
+        """ Totals per phase, per agent and per tick, with string keys as in JSON """
+        return {'phases': self.by_phase(),
+                'agents': {str(agent): phases for agent, phases in self.by_agent().items()},
+                'ticks': {str(tick): phases for tick, phases in self.by_tick().items()}}
+
+    def to_json(self, path) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
@@ -1,4 +1,7 @@
+from functools import lru_cache
+import numpy as np
 import pygame
+from libraries.grid import WALL_BITS, array_from_dict, walls_from_maze_map
 
 
 def calculate_GUI_scale(screen: pygame.Surface, settings: dict):
@@ -31,15 +34,26 @@ def calculate_GUI_scale(screen: pygame.Surface, settings: dict):
     return (offset_x, offset_y), g_size
 
 
-def draw_GUI(screen: pygame.Surface, s, selected_agent, show_tokens, settings: dict) -> None:
+@lru_cache(maxsize=None)
+def get_font(size) -> pygame.font.Font:
+    """ Courier New of a size, created once: SysFont looks the font up on disk """
+    return pygame.font.SysFont("Courier New", size)
+
+
+@lru_cache(maxsize=4096)
+def render_text(content, size, color) -> pygame.Surface:
+    """ Rendered text, cached by content, font size and color (as a tuple) """
+    return get_font(size).render(content, False, color)
+
+
+def draw_GUI(screen: pygame.Surface, s, selected_agent, show_tokens, settings: dict, playing=None) -> None:
     margin = 8
     res = screen.get_size()
     GUI_box = (margin, margin), (res[0]-2*margin, settings['GUI_bar']-2*margin)
     # draw the outline around the GUI
     pygame.draw.rect(screen, settings['color'], GUI_box, width=1)
     # write text
-    GUI_font = pygame.font.SysFont("Courier New", 20)
-    GUI_subfont = pygame.font.SysFont("Courier New", 15)
+    color = tuple(settings['color'])
     if selected_agent == 0:
         mode_text_content = 'View: System overview'
         desc_text_content = "Press '1' through '5' to select agent"
@@ -48,9 +62,15 @@ def draw_GUI(screen: pygame.Surface, s, selected_agent, show_tokens, settings: d
         desc_text_content = "Press '0' for system overview, 't' for toggle token heatmap"
         if show_tokens:
             mode_text_content += '(token heatmap)'
-    mode_text = GUI_font.render(mode_text_content, False, settings['color'])
-    desc_text = GUI_subfont.render(desc_text_content, False, settings['color'])
-    u_text = GUI_font.render("Press 'u' to update", False, settings['color'])
+    mode_text = render_text(mode_text_content, 20, color)
+    desc_text = render_text(desc_text_content, 15, color)
+    if playing is None:  # the simulation only advances with 'u'
+        u_text_content = "Press 'u' to update"
+    elif playing:
+        u_text_content = "Press 'p' to pause"
+    else:
+        u_text_content = "'u' step, 'p' play"
+    u_text = render_text(u_text_content, 20, color)
     screen.blit(mode_text, (4 * margin, margin + (settings['GUI_bar'] - 2 * margin) // 4 - 10))
     screen.blit(desc_text, (4 * margin, margin + 2.5 * (settings['GUI_bar'] - 2 * margin) // 4 - 7.5))
     screen.blit(u_text, (res[0]-2*margin-250, margin + 2*(settings['GUI_bar'] - 2 * margin) // 4 - 10))
@@ -83,6 +103,84 @@ def draw_cell_walls(screen: pygame.Surface, cell: tuple, cell_walls: dict, setti
                           settings['offset'][1] + settings['g_size'] * (cell[0] - 1)))
 
 
+def mask_surface(mask: np.ndarray, color) -> pygame.Surface:
+    """ Surface of the shape of a (rows, cols) boolean array, of a color where it is set and transparent elsewhere """
+    surface = pygame.Surface((mask.shape[1], mask.shape[0]), pygame.SRCALPHA)
+    surface.fill(color)
+    alpha = pygame.surfarray.pixels_alpha(surface)
+    alpha[:] = np.where(mask.T, 255, 0)
+    del alpha  # unlocks the surface
+    return surface
+
+
+def scale_cells(surface: pygame.Surface, settings: dict) -> pygame.Surface:
+    """ Scale a surface of one pixel per cell to the maze on screen """
+    return pygame.transform.scale(surface, (surface.get_width() * settings['g_size'],
+                                            surface.get_height() * settings['g_size']))
+
+
+def unknown_cells_surface(visits: np.ndarray, settings: dict) -> pygame.Surface:
+    """ Unexplored cells (no visits) in the unknown color, the rest transparent, at maze scale """
+    return scale_cells(mask_surface(visits == 0, settings['unknown_color']), settings)
+
+
+def heatmap_colors(values: np.ndarray) -> np.ndarray:
+    """ (rows, cols, 3) uint8 colors of values, from blue for the lowest to red for the highest """
+    low = values.min()
+    v = (values - low) / (values.max() - low + 0.01)  # it's not bulletproof, but adding 0.01 avoids division by zero
+    colors = np.zeros(values.shape + (3,), dtype=np.uint8)
+    colors[..., 0] = (255 * v).astype(int)
+    colors[..., 2] = (255 * (1 - v)).astype(int)
+    return colors
+
+
+def heatmap_surface(values: np.ndarray, settings: dict) -> pygame.Surface:
+    """ Token heatmap of a (rows, cols) array, at maze scale """
+    return scale_cells(pygame.surfarray.make_surface(heatmap_colors(values).transpose(1, 0, 2)), settings)
+
+
+def wall_pixels(walls: np.ndarray, g_size) -> np.ndarray:
+    """
+    Boolean (rows * g_size + 1, cols * g_size + 1) array of the pixels of the wall lines of a bitmask array, the same
+    pixels as draw_cell_walls draws: every wall is a line from corner to corner, both included.
+    """
+    rows, cols = walls.shape
+    g = g_size
+    pixels = np.zeros((rows * g + 1, cols * g + 1), dtype=bool)
+    north, south = (walls & WALL_BITS['N']) != 0, (walls & WALL_BITS['S']) != 0
+    west, east = (walls & WALL_BITS['W']) != 0, (walls & WALL_BITS['E']) != 0
+    for wall, top in ((north, 0), (south, g)):
+        lines = pixels[top::g][:rows]  # the line of pixels along the top or bottom of every row of cells
+        lines[:, :cols * g] |= np.repeat(wall, g, axis=1)
+        lines[:, g::g] |= wall  # right end of every line
+    for wall, left in ((west, 0), (east, g)):
+        lines = pixels[:, left::g][:, :cols]
+        lines[:rows * g] |= np.repeat(wall, g, axis=0)
+        lines[g::g] |= wall
+    return pixels
+
+
+def maze_surface(walls: np.ndarray, settings: dict) -> pygame.Surface:
+    """ Walls of a bitmask array and the outline around the maze, transparent elsewhere """
+    surface = mask_surface(wall_pixels(walls, settings['g_size']), settings['color'])
+    rows, cols = walls.shape
+    pygame.draw.rect(surface, settings['color'], ((0, 0), (cols * settings['g_size'], rows * settings['g_size'])),
+                     width=3)
+    return surface
+
+
+def points_of_interest_surface(interest: np.ndarray, settings: dict, threshold=5, potential_threshold=4):
+    """ Markers of draw_points_of_interest for an interest array, at maze scale, transparent elsewhere """
+    rows, cols = interest.shape
+    g = settings['g_size']
+    surface = pygame.Surface((cols * g, rows * g), pygame.SRCALPHA)
+    for color, cells in (((200, 20, 20), interest > threshold),
+                         ((100, 100, 20), (interest > potential_threshold) & (interest <= threshold))):
+        for row, col in zip(*np.nonzero(cells)):
+            pygame.draw.circle(surface, color, (g * (col + 0.5), g * (row + 0.5)), 0.1 * g)
+    return surface
+
+
 def draw_known_map(screen: pygame.Surface, known_map: dict, settings: dict) -> None:
     """
     Draw a known_map of an AgentMap (consult AgentMap Class for more information) onto the pygame surface
@@ -98,12 +196,8 @@ def draw_known_map(screen: pygame.Surface, known_map: dict, settings: dict) -> N
         Dictionary with video settings.
 
     """
-    for key in known_map.keys():
-        if known_map[key] == 0:  # if the cell is unexplored
-            pygame.draw.rect(screen, settings['unknown_color'],
-                             ((settings['offset'][0] + settings['g_size'] * (key[1] - 1),
-                               settings['offset'][1] + settings['g_size'] * (key[0] - 1)),
-                              (settings['g_size'], settings['g_size'])), width=0)
+    visits = array_from_dict(known_map, settings['grid_shape'], np.int32)
+    screen.blit(unknown_cells_surface(visits, settings), settings['offset'])
 
 
 def draw_token_map(screen: pygame.Surface, token_map: dict, settings: dict) -> None:
@@ -120,15 +214,8 @@ def draw_token_map(screen: pygame.Surface, token_map: dict, settings: dict) -> N
         Dictionary with video settings.
 
     """
-    for key in token_map.keys():
-        v = (token_map[key]-min(token_map.values()))/(max(token_map.values())-min(token_map.values())+0.01)
-        # it's not bulletproof, but adding 0.01 avoids division by zero errors
-        c = (int(255*v), 0, int(255*(1-v)))
-
-        pygame.draw.rect(screen, c,
-                         ((settings['offset'][0] + settings['g_size'] * (key[1] - 1),
-                           settings['offset'][1] + settings['g_size'] * (key[0] - 1)),
-                          (settings['g_size'], settings['g_size'])), width=0)
+    tokens = array_from_dict(token_map, settings['grid_shape'], float)
+    screen.blit(heatmap_surface(tokens, settings), settings['offset'])
 
 
 def draw_maze_map(screen: pygame.Surface, maze_map: dict, settings: dict) -> None:
@@ -146,15 +233,8 @@ def draw_maze_map(screen: pygame.Surface, maze_map: dict, settings: dict) -> Non
         Dictionary with video settings.
 
     """
-
-    # draw the outline around the maze
-    pygame.draw.rect(screen, settings['color'], (settings['offset'], (settings['grid_shape'][1] * settings['g_size'],
-                                                                      settings['grid_shape'][0] * settings['g_size'])),
-                     width=3)
-
-    # draw the walls
-    for key in maze_map.keys():
-        draw_cell_walls(screen, key, maze_map[key], settings)
+    walls = walls_from_maze_map(maze_map, settings['grid_shape'])
+    screen.blit(maze_surface(walls, settings), settings['offset'])
 
 
 def draw_agent(screen: pygame.Surface, agent, settings: dict, active=False, path_on=True):
@@ -175,14 +255,18 @@ def draw_agent(screen: pygame.Surface, agent, settings: dict, active=False, path
         Whether the planned path of the agents is drawn
 
     """
+    draw_agent_at(screen, agent.agent.position, agent.chosen_path, settings, active, path_on)
+
+
+def draw_agent_at(screen: pygame.Surface, position, path, settings: dict, active=False, path_on=True):
+    """ draw_agent, for an agent at a (col, row) position having chosen a path """
     if active:
         c = settings['color_active']
     else:
         c = settings['color']
-    l = agent.agent.position
+    l = position
 
     if path_on:
-        path = agent.chosen_path
         point1 = l
         for move in path:
             if move == 'N':
@@ -202,38 +286,144 @@ def draw_agent(screen: pygame.Surface, agent, settings: dict, active=False, path
     pygame.draw.circle(screen, c, (settings['offset'][0] + settings['g_size'] * (l[0] - 0.5),
                                    settings['offset'][1] + settings['g_size'] * (l[1] - 0.5)), 0.2 * settings['g_size'])
 
+
 def draw_points_of_interest(screen: pygame.Surface, interest_map: dict, settings:dict, threshold=5, potential_threshold=4):
-    for key in interest_map.keys():
-        if interest_map[key] > threshold:
-            pygame.draw.circle(screen, (200, 20, 20), (settings['offset'][0] + settings['g_size'] * (key[1] - 0.5),
-                                           settings['offset'][1] + settings['g_size'] * (key[0] - 0.5)),
-                               0.1 * settings['g_size'])
-        elif interest_map[key] > potential_threshold:
-            pygame.draw.circle(screen, (100, 100, 20), (settings['offset'][0] + settings['g_size'] * (key[1] - 0.5),
-                                           settings['offset'][1] + settings['g_size'] * (key[0] - 0.5)),
-                               0.1 * settings['g_size'])
+    interest = array_from_dict(interest_map, settings['grid_shape'], float)
+    screen.blit(points_of_interest_surface(interest, settings, threshold, potential_threshold), settings['offset'])
 
 
 def draw_detected_points_of_interest(screen: pygame.Surface, interest_dictionary: dict, settings: dict):
-    PoI_font = pygame.font.SysFont("Courier New", 12)
     for key in interest_dictionary.keys():
         PoI_text_content = str(interest_dictionary[key]['detected'])
         if PoI_text_content != '0':
-            PoI_text = PoI_font.render(PoI_text_content, False, (110, 130, 130))
+            PoI_text = render_text(PoI_text_content, 12, (110, 130, 130))
             screen.blit(PoI_text, (settings['offset'][0] + settings['g_size'] * (key[1] - 0.8),
                                                settings['offset'][1] + settings['g_size'] * (key[0] - 0.8)))
         PoI_text_content = str(interest_dictionary[key]['verified'])
         if PoI_text_content != '0':
-            PoI_text = PoI_font.render(PoI_text_content, False, (20, 200, 20))
+            PoI_text = render_text(PoI_text_content, 12, (20, 200, 20))
             screen.blit(PoI_text, (settings['offset'][0] + settings['g_size'] * (key[1] - 0.4),
                                    settings['offset'][1] + settings['g_size'] * (key[0] - 0.8)))
         PoI_text_content = str(interest_dictionary[key]['potential'])
         if PoI_text_content != '0':
-            PoI_text = PoI_font.render(PoI_text_content, False, (90, 120, 100))
+            PoI_text = render_text(PoI_text_content, 12, (90, 120, 100))
             screen.blit(PoI_text, (settings['offset'][0] + settings['g_size'] * (key[1] - 0.8),
                                    settings['offset'][1] + settings['g_size'] * (key[0] - 0.4)))
         PoI_text_content = str(interest_dictionary[key]['rejected'])
         if PoI_text_content != '0':
-            PoI_text = PoI_font.render(PoI_text_content, False, (200, 20, 20))
+            PoI_text = render_text(PoI_text_content, 12, (200, 20, 20))
             screen.blit(PoI_text, (settings['offset'][0] + settings['g_size'] * (key[1] - 0.4),
                                    settings['offset'][1] + settings['g_size'] * (key[0] - 0.4)))
+
+
+class Renderer:
+    def __init__(self, settings: dict):
+        """
+        Draws the interactive visualization of a Simulation from its snapshots, redrawing only what changed.
+
+        The maze walls, the unexplored cells, the token heatmap and the points of interest are pre-rendered layers,
+        rebuilt only when the array they show or the scale changes. A frame is drawn only if there is a new snapshot or
+        the GUI bar changed, and draw returns the rectangles that were redrawn, to be passed to
+        pygame.display.update.
+
+        Parameters
+        ----------
+        settings : dict
+            Dictionary with video settings, updated with the offset and g_size of the current window size.
+
+        """
+        self.settings = settings
+        self.layers = {}  # name -> (key, copy of the array drawn, surface)
+        self.layout = None
+        self.snapshot = None  # snapshot of the maze area on screen
+        self.gui_state = None
+
+    def layer(self, name, key, array: np.ndarray, build) -> pygame.Surface:
+        """ Cached surface of an array, built by build(array) if the key or the content of the array changed """
+        cached = self.layers.get(name)
+        if cached is not None and cached[0] == key and np.array_equal(cached[1], array):
+            return cached[2]
+        surface = build(array)
+        self.layers[name] = (key, array.copy(), surface)
+        return surface
+
+    def maze_rect(self) -> pygame.Rect:
+        """ Screen area of the maze, with the outline and the wall lines along the bottom and right edges """
+        rows, cols = self.settings['grid_shape']
+        g = self.settings['g_size']
+        return pygame.Rect(self.settings['offset'], (cols * g + 1, rows * g + 1))
+
+    def gui_rect(self, screen: pygame.Surface) -> pygame.Rect:
+        return pygame.Rect((0, 0), (screen.get_width(), self.settings['GUI_bar']))
+
+    def draw(self, screen: pygame.Surface, snapshot, selected_agent, show_tokens, playing=None) -> list:
+        """
+        Draw the parts of the frame that changed.
+
+        Parameters
+        ----------
+        screen : pygame.Surface
+            Display surface.
+        snapshot : simulation_worker.Snapshot
+            State of the simulation shown, with the maps of the agent whose view is drawn.
+        selected_agent, show_tokens, playing
+            State of the user interface shown in the GUI bar: the selected agent (0 for the system overview), whether
+            the token heatmap is on, and whether the simulation is playing (None if it has no play mode).
+
+        Returns
+        -------
+        list
+            Rectangles of the screen that were redrawn, empty if the frame didn't change.
+
+        """
+        settings = self.settings
+        # calculate scale for the visualization, in case the window size changes
+        offset, g_size = calculate_GUI_scale(screen, settings)
+        settings['offset'] = offset
+        settings['g_size'] = g_size
+        background = settings.get('background_color', (0, 0, 0))
+        layout = (screen.get_size(), offset, g_size)
+        dirty = []
+        redraw = layout != self.layout
+        if redraw:
+            screen.fill(background)
+            self.layout, self.snapshot, self.gui_state = layout, None, None
+
+        if snapshot is not self.snapshot:  # snapshots are immutable, a new one is a new frame
+            self.snapshot = snapshot
+            rect = self.maze_rect()
+            screen.fill(background, rect)
+            self.draw_maze(screen, snapshot)
+            dirty.append(rect)
+
+        gui_state = (selected_agent, show_tokens, playing)
+        if gui_state != self.gui_state:
+            self.gui_state = gui_state
+            rect = self.gui_rect(screen)
+            screen.fill(background, rect)
+            draw_GUI(screen, snapshot, selected_agent, show_tokens, settings, playing)
+            dirty.append(rect)
+        return [screen.get_rect()] if redraw else dirty
+
+    def draw_maze(self, screen: pygame.Surface, snapshot) -> None:
+        settings = self.settings
+        g_size = settings['g_size']
+        if snapshot.agent is None:
+            walls = snapshot.walls
+        else:
+            walls = snapshot.agent_walls
+            screen.blit(self.layer('unknown', g_size, snapshot.agent_visits,
+                                   lambda visits: unknown_cells_surface(visits, settings)), settings['offset'])
+            if snapshot.tokens is not None:
+                screen.blit(self.layer('tokens', g_size, snapshot.tokens, lambda t: heatmap_surface(t, settings)),
+                            settings['offset'])
+        screen.blit(self.layer('walls', g_size, walls, lambda w: maze_surface(w, settings)), settings['offset'])
+        for id, position in snapshot.positions.items():
+            draw_agent_at(screen, position, snapshot.paths[id], settings, active=id == snapshot.agent, path_on=True)
+        if snapshot.agent is None:
+            thresholds = (snapshot.interest_threshold, snapshot.potential_interest_threshold)
+            screen.blit(self.layer('points_of_interest', (g_size,) + thresholds, snapshot.interest,
+                                   lambda interest: points_of_interest_surface(interest, settings, *thresholds)),
+                        settings['offset'])
+        else:
+            draw_detected_points_of_interest(screen, snapshot.points_of_interest, settings)
@@ -0,0 +1,112 @@
+import heapq
+from enum import IntEnum
+
+
+class Action(IntEnum):
+    """ What an agent does at an event. Events due at the same time run agent by agent, and in this order. """
+    MOVE = 0       # take the next step of the chosen path, planning first if there is none, and observe
+    PLAN = 1       # choose a new path
+    BROADCAST = 2  # send the ledger and the map to the agents within communication range
+
+
+class EventQueue:
+    def __init__(self):
+        """
+        Heap of timestamped agent events.
+
+        Every agent repeats each Action with a period of its own: the k-th event of an action is due at
+        start + k * period. Times are computed from k rather than accumulated, so that periods such as 0.5 and 1
+        meet exactly. Events due at the same time are popped in the order the agents were added, then by Action,
+        which with periods of 1 is the order in which Simulation.update always stepped the agents.
+
+        """
+        self.heap = []      # (time, rank, action, id)
+        self.periods = {}   # id -> period of every Action, None for never
+        self.starts = {}    # id -> time the agent was scheduled at
+        self.counts = {}    # id -> number of events of every Action pushed so far
+        self.ranks = {}     # id -> insertion order
+        self.next_rank = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def add(self, id, periods, start=0) -> None:
+        """
+        Schedule the events of a new agent.
+
+        Parameters
+        ----------
+        id
+            Agent id.
+        periods : tuple
+            Simulated time between two events of every Action, None for an action the agent never does.
+        start : float
+            Current time, the first events are due one period later.
+
+        """
+        if id in self.ranks:
+            raise ValueError("Agent already scheduled: " + str(id))
+        periods = tuple(periods)
+        if len(periods) != len(Action):
+            raise ValueError("Expected a period for every action, got " + str(periods))
+        for period in periods:
+            if period is not None and not period > 0:
+                raise ValueError("Periods must be positive, got " + str(period))
+        self.periods[id] = periods
+        self.starts[id] = start
+        self.counts[id] = [0] * len(Action)
+        self.ranks[id] = self.next_rank
+        self.next_rank += 1
+        for action in Action:
+            self.push(id, action)
+
+    def split(self) -> dict:
+        """ One queue per agent, holding its pending events, so that agents can go on separately (see join) """
+        queues = {}
+        for id, rank in self.ranks.items():
+            events = queues[id] = EventQueue()
+            events.periods[id] = self.periods[id]
+            events.starts[id] = self.starts[id]
+            events.counts[id] = list(self.counts[id])
+            events.ranks[id] = rank
+            events.next_rank = self.next_rank
+        for entry in self.heap:
+            heapq.heappush(queues[entry[3]].heap, entry)
+        return queues
+
+    @staticmethod
+    def join(queues) -> 'EventQueue':
+        """ Queue of the agents and pending events of several queues, such as those made by split """
+        events = EventQueue()
+        for queue in queues:
+            events.heap.extend(queue.heap)
+            events.periods.update(queue.periods)
+            events.starts.update(queue.starts)
+            events.counts.update(queue.counts)
+            events.ranks.update(queue.ranks)
+            events.next_rank = max(events.next_rank, queue.next_rank)
+        heapq.heapify(events.heap)
+        return events
+
+    def push(self, id, action) -> None:
+        """ Schedule the next event of an action of an agent """
+        period = self.periods[id][action]
+        if period is None:
+            return
+        self.counts[id][action] += 1
+        heapq.heappush(self.heap, (self.starts[id] + self.counts[id][action] * period, self.ranks[id], action, id))
+
+    def next_time(self):
+        """ Time of the next event, None if there is none """
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self) -> tuple:
+        """ Remove the next event and schedule the one after it, returns (time, id, action) """
+        time, _, action, id = heapq.heappop(self.heap)
+        self.push(id, action)
+        return time, id, action
+
+    def pop_due(self, time):
+        """ Generator popping every event due at or before time, in order, including those scheduled meanwhile """
+        while self.heap and self.heap[0][0] <= time:
+            yield self.pop()
@@ -0,0 +1,84 @@
+from functools import lru_cache
+import numpy as np
+
+FOOTPRINTS = ('square', 'diamond', 'disc')
+
+
+@lru_cache(maxsize=None)
+def stencil(footprint='square', radius=1) -> np.ndarray:
+    """
+    (row, col) offsets of the cells a sensor covers around its position, row by row.
+
+    Parameters
+    ----------
+    footprint : str
+        'square' covers the cells within a Chebyshev distance of radius, 'diamond' within a Manhattan distance and
+        'disc' within a Euclidean distance.
+    radius : int
+        Range of the sensor, in cells. 0 covers only the position itself.
+
+    Returns
+    -------
+    np.ndarray
+        Read-only int array of shape (cells, 2).
+
+    """
+    if footprint not in FOOTPRINTS:
+        raise ValueError("Unknown footprint: " + str(footprint))
+    if radius < 0:
+        raise ValueError("Negative radius: " + str(radius))
+    rows, cols = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    if footprint == 'square':
+        inside = np.ones(rows.shape, dtype=bool)
+    elif footprint == 'diamond':
+        inside = np.abs(rows) + np.abs(cols) <= radius
+    else:
+        inside = rows**2 + cols**2 <= radius**2
+    offsets = np.stack([rows[inside], cols[inside]], axis=1)
+    offsets.flags.writeable = False
+    return offsets
+
+
+class Sensor:
+    def __init__(self, footprint='square', radius=1):
+        """
+        Sensor of an agent, observing every cell of a footprint around its position at each step.
+
+        The default, a square of radius 1, is the 3x3 block of cells the agents always observed.
+
+        Parameters
+        ----------
+        footprint, radius
+            Shape and range of the footprint, see stencil.
+
+        """
+        self.footprint = footprint
+        self.radius = radius
+        self.offsets = stencil(footprint, radius)
+        self.row_offsets = np.ascontiguousarray(self.offsets[:, 0])
+        self.col_offsets = np.ascontiguousarray(self.offsets[:, 1])
+
+    def cells(self, position, dimensions) -> tuple:
+        """
+        Cells of the footprint inside the maze.
+
+        Parameters
+        ----------
+        position : tuple
+            Position of the agent, as stored in agent.position (col, row).
+        dimensions : tuple
+            (rows, cols) of the maze.
+
+        Returns
+        -------
+        (rows, cols) : tuple
+            int arrays of the 1-indexed cells covered, in the order of the stencil.
+
+        """
+        col, row = position
+        rows = row + self.row_offsets
+        cols = col + self.col_offsets
+        if self.radius < row <= dimensions[0] - self.radius and self.radius < col <= dimensions[1] - self.radius:
+            return rows, cols  # the whole footprint is inside
+        inside = (rows > 0) & (rows <= dimensions[0]) & (cols > 0) & (cols <= dimensions[1])
+        return rows[inside], cols[inside]
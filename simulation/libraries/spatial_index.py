@@ -0,0 +1,82 @@
+class SpatialIndex:
+    def __init__(self, cell_size):
+        """
+        Uniform grid index of agent positions, for proximity queries in Chebyshev distance.
+
+        Parameters
+        ----------
+        cell_size : int
+            Side of the square buckets in maze cells. Queries are cheapest when it matches the distance they ask for,
+            such as the communication range.
+
+        """
+        self.cell_size = max(int(cell_size), 1)
+        self.buckets: dict = {}    # bucket -> set of ids
+        self.positions: dict = {}  # id -> position
+        self.ranks: dict = {}      # id -> insertion order, so that queries list agents in the order they were added
+        self.next_rank = 0
+
+    def bucket(self, position) -> tuple:
+        return position[0] // self.cell_size, position[1] // self.cell_size
+
+    def insert(self, id, position) -> None:
+        if id in self.positions:
+            self.move(id, position)
+            return
+        self.ranks[id] = self.next_rank
+        self.next_rank += 1
+        self.positions[id] = tuple(position)
+        self.buckets.setdefault(self.bucket(position), set()).add(id)
+
+    def move(self, id, position) -> None:
+        """ Update the position of an agent already in the index """
+        old = self.bucket(self.positions[id])
+        new = self.bucket(position)
+        self.positions[id] = tuple(position)
+        if old != new:
+            self.buckets[old].discard(id)
+            if not self.buckets[old]:
+                del self.buckets[old]
+            self.buckets.setdefault(new, set()).add(id)
+
+    def remove(self, id) -> None:
+        bucket = self.bucket(self.positions.pop(id))
+        self.buckets[bucket].discard(id)
+        if not self.buckets[bucket]:
+            del self.buckets[bucket]
+
+    def query(self, position, distance) -> list:
+        """ Ids of the agents within a Chebyshev distance of position, in insertion order """
+        x0, y0 = self.bucket((position[0] - distance, position[1] - distance))
+        x1, y1 = self.bucket((position[0] + distance, position[1] + distance))
+        found = []
+        for bx in range(x0, x1 + 1):
+            for by in range(y0, y1 + 1):
+                for id in self.buckets.get((bx, by), ()):
+                    p = self.positions[id]
+                    if abs(p[0] - position[0]) <= distance and abs(p[1] - position[1]) <= distance:
+                        found.append(id)
+        return sorted(found, key=self.ranks.__getitem__)
+
+    def pairs_in_range(self, distance) -> list:
+        """ All pairs (id1, id2) of agents within a Chebyshev distance of each other, id1 added before id2 """
+        reach = -(-distance // self.cell_size)  # buckets to look at in every direction
+        pairs = []
+        for (bx, by), ids in self.buckets.items():
+            for dx in range(-reach, reach + 1):
+                for dy in range(-reach, reach + 1):
+                    if (dx, dy) < (0, 0):
+                        continue  # every pair of buckets is visited once
+                    others = self.buckets.get((bx + dx, by + dy))
+                    if not others:
+                        continue
+                    for id1 in ids:
+                        p1 = self.positions[id1]
+                        for id2 in others:
+                            if (dx, dy) == (0, 0) and self.ranks[id2] <= self.ranks[id1]:
+                                continue
+                            p2 = self.positions[id2]
+                            if abs(p1[0] - p2[0]) <= distance and abs(p1[1] - p2[1]) <= distance:
+                                pair = (id1, id2) if self.ranks[id1] < self.ranks[id2] else (id2, id1)
+                                pairs.append(pair)
+        return sorted(pairs, key=lambda pair: (self.ranks[pair[0]], self.ranks[pair[1]]))
@@ -1,7 +1,8 @@
-from collections import Counter
 import numpy as np
 from scipy import ndimage
 
+POI_FIELDS = ('detected', 'verified', 'rejected', 'potential')
+
 
 def assignOrder(order):
     def do_assignment(to_func):
@@ -10,6 +11,49 @@ def assignOrder(order):
     return do_assignment
 
 
+def positional(to_func):
+    """ Mark a token function whose result depends on the agent position, see AgentMap.token_map """
+    to_func.uses_position = True
+    return to_func
+
+
+def gaussian_kernel(l=5, sig=1):
+    """ Normalized l x l Gaussian kernel with standard deviation sig """
+    ax = np.linspace(-(l - 1) / 2., (l - 1) / 2., l)
+    gauss = np.exp(-0.5 * np.square(ax) / np.square(sig))
+    kernel = np.outer(gauss, gauss)
+    return kernel / np.sum(kernel)
+
+
+DENSITY_KERNEL = gaussian_kernel()
+
+
+def poi_counts(interest_dictionary: dict, shape) -> np.ndarray:
+    """
+    Scatter the output of Ledger.points_of_interest into an array.
+
+    Parameters
+    ----------
+    interest_dictionary : dict
+        Dictionary keyed by (row, col) tuples, with {'detected': .., 'verified': .., 'rejected': .., 'potential': ..}
+        counters as values.
+    shape : tuple
+        Dimensions of the maze.
+
+    Returns
+    -------
+    counts : np.ndarray
+        Array of shape (4, rows, cols), with counters in the order of POI_FIELDS.
+
+    """
+    counts = np.zeros((len(POI_FIELDS),) + tuple(shape), dtype=np.int32)
+    if interest_dictionary:
+        points = np.array(list(interest_dictionary.keys())) - 1
+        values = np.array([[entry[field] for field in POI_FIELDS] for entry in interest_dictionary.values()])
+        counts[:, points[:, 0], points[:, 1]] = values.T
+    return counts
+
+
 class TokenFunctions:
     """
         Explanation of token functions
@@ -21,122 +65,111 @@ class TokenFunctions:
         3) Verifying POI -> Certainty level = phi -> amount of tokens equal to phi*n. Where n is the parameter to optimise
         4)
 
+        Every function takes the token array produced by the previous one, the known map (visit counts), the POI
+        counters (see poi_counts) and the agent position, and returns a new token array of the maze's shape.
+
+        Functions marked with positional depend on the position, the others only on the maps, which lets
+        AgentMap.token_map reuse their results while the agent moves.
+
+        The same pipeline runs on a batch of K maps: known maps of shape (K, rows, cols), POI counters of shape
+        (4, K, rows, cols) and positions of shape (K, 2). The weights can then be an array of shape
+        (n_functions, K, 1, 1), to give every map of the batch its own weights.
+
     """
     def __init__(self, weights=None):
+        self.functions = None
         self.function_count = len(self.get_functions())
         if weights is None:
             weights = [1/self.function_count] * self.function_count
         self.weights = weights
-        self.tokens = {}
+        self.decay_fields = {}
 
     # ==================================================================================================================
     @assignOrder(0)
-    def exploring_area(self, known_map: dict, interest_dictionary: dict, position=None) -> dict:
+    def exploring_area(self, tokens, known_map: np.ndarray, poi: np.ndarray, position=None) -> np.ndarray:
         w = self.weights[getattr(self.exploring_area, "order")]
-        self.tokens = {key: w * (1 / (known_map[key] + 1) - 0.1) for key in known_map.keys()}
-        return self.tokens
+        return w * (1 / (known_map + 1) - 0.1)
 
     @assignOrder(1)
-    def verifying_poi(self, known_map: dict, interest_dictionary: dict, position=None) -> dict:
+    def verifying_poi(self, tokens, known_map: np.ndarray, poi: np.ndarray, position=None) -> np.ndarray:
         w = self.weights[getattr(self.verifying_poi, "order")]
-        tokens = {}
-        for key in known_map.keys():
-            if key in interest_dictionary.keys():
-                number_of_measurements = (interest_dictionary[key]['detected'] + interest_dictionary[key]['verified'] +
-                                          interest_dictionary[key]['rejected'] + interest_dictionary[key]['potential'])
-                if interest_dictionary[key]['detected'] > 0 and \
-                   interest_dictionary[key]['rejected'] == 0 and \
-                   interest_dictionary[key]['verified'] == 0:
-                    tokens[key] = w * 1 / number_of_measurements
-            else:
-                tokens[key] = 0
-        c = Counter(self.tokens)
-        c.update(Counter(tokens))
-        self.tokens = dict(c)
-        return self.tokens
+        detected, verified, rejected, potential = poi
+        number_of_measurements = detected + verified + rejected + potential
+        unresolved = (detected > 0) & (rejected == 0) & (verified == 0)
+        return tokens + np.where(unresolved, w * 1 / np.maximum(number_of_measurements, 1), 0)
 
     @assignOrder(2)
-    def checking_potential_poi(self, known_map: dict, interest_dictionary: dict, position=None) -> dict:
+    def checking_potential_poi(self, tokens, known_map: np.ndarray, poi: np.ndarray, position=None) -> np.ndarray:
         w = self.weights[getattr(self.checking_potential_poi, "order")]
-        tokens = {}
-        for key in known_map.keys():
-            if key in interest_dictionary.keys():
-                number_of_measurements = (interest_dictionary[key]['detected'] + interest_dictionary[key]['verified'] +
-                                          interest_dictionary[key]['rejected'] + interest_dictionary[key]['potential'])
-                if interest_dictionary[key]['potential'] > 0 and \
-                   interest_dictionary[key]['rejected'] == 0 and \
-                   interest_dictionary[key]['verified'] == 0:
-                    tokens[key] = w * 1 / number_of_measurements
-            else:
-                tokens[key] = 0
-        c = Counter(self.tokens)
-        c.update(Counter(tokens))
-        self.tokens = dict(c)
-        return self.tokens
+        detected, verified, rejected, potential = poi
+        number_of_measurements = detected + verified + rejected + potential
+        unresolved = (potential > 0) & (rejected == 0) & (verified == 0)
+        return tokens + np.where(unresolved, w * 1 / np.maximum(number_of_measurements, 1), 0)
 
     @assignOrder(3)
-    def resolve_poi(self, known_map: dict, interest_dictionary: dict, position=None) -> dict:
+    def resolve_poi(self, tokens, known_map: np.ndarray, poi: np.ndarray, position=None) -> np.ndarray:
         w = self.weights[getattr(self.resolve_poi, "order")]
-        tokens = {}
-        for key in known_map.keys():
-            if key in interest_dictionary.keys():
-                number_of_measurements = (interest_dictionary[key]['detected'] + interest_dictionary[key]['verified'] +
-                                          interest_dictionary[key]['rejected'] + interest_dictionary[key]['potential'])
-                ratio_confirming = (interest_dictionary[key]['detected'] +
-                                    interest_dictionary[key]['verified']) / number_of_measurements
-                tokens[key] = w * 4 * ratio_confirming * (1 - ratio_confirming) / number_of_measurements
-            else:
-                tokens[key] = 0
-        c = Counter(self.tokens)
-        c.update(Counter(tokens))
-        self.tokens = dict(c)
-        return self.tokens
+        detected, verified, rejected, potential = poi
+        number_of_measurements = np.maximum(detected + verified + rejected + potential, 1)
+        ratio_confirming = (detected + verified) / number_of_measurements
+        return tokens + w * 4 * ratio_confirming * (1 - ratio_confirming) / number_of_measurements
 
     @assignOrder(4)
-    def density(self, known_map: dict, interest_dictionary: dict, position=None) -> dict:
+    def density(self, tokens, known_map: np.ndarray, poi: np.ndarray, position=None) -> np.ndarray:
         w = self.weights[getattr(self.density, "order")]
-        size = (max([key[0] for key in self.tokens.keys()]), max([key[1] for key in self.tokens.keys()]))
-        arr = np.zeros(size)
-        for key in self.tokens.keys():
-            i = key[0]
-            j = key[1]
-            arr[i-1,j-1] = self.tokens[i, j]
-
-        l = 5  # size of the kernel
-        sig = 1  # the size of the blur
-
-        ax = np.linspace(-(l - 1) / 2., (l - 1) / 2., l)
-        gauss = np.exp(-0.5 * np.square(ax) / np.square(sig))
-        kernel = np.outer(gauss, gauss)
-        kernel /= np.sum(kernel)  # normalized
-
-        arr = w*ndimage.convolve(arr, kernel)
-
-        tokens = {}
-        for i in range(len(arr)):
-            for j in range(len(arr[i])):
-                tokens[(i+1, j+1)] = arr[i, j]
-
-        c = Counter(self.tokens)
-        c.update(Counter(tokens))
-        self.tokens = dict(c)
-        return self.tokens
+        kernel = DENSITY_KERNEL.reshape((1,) * (tokens.ndim - 2) + DENSITY_KERNEL.shape)  # maps of a batch apart
+        return tokens + w * ndimage.convolve(tokens, kernel)
 
     @assignOrder(5)
-    def distance(self, known_map: dict, interest_dictionary: dict, position) -> dict:
+    @positional
+    def distance(self, tokens, known_map: np.ndarray, poi: np.ndarray, position) -> np.ndarray:
         w = self.weights[getattr(self.distance, "order")]
-        tokens = {}
-        for key in self.tokens.keys():
-            distance = ((key[0] - position[0])**2 + (key[1] - position[1])**2)**0.5
-            tokens[key] = self.tokens[key] * w**distance
-        self.tokens = tokens
-        return self.tokens
+        return tokens * self.decay_field(tokens.shape[-2:], position, w)
 
     # ==================================================================================================================
+    def decay_field(self, shape, position, w) -> np.ndarray:
+        """
+        Returns w**distance from position for every cell of a maze of the given shape.
+
+        The powers are computed once per maze size and weight, on a field twice the size of the maze centered on a
+        distance of zero, and every position then reads a shifted window of it. For a batch, position has shape
+        (K, 2), w is a scalar or an array of K weights, and the result has shape (K,) + shape.
+        """
+        k = max(shape)
+        key = (k, w) if np.ndim(w) == 0 else (k, tuple(np.ravel(w).tolist()))
+        fields = self.decay_fields.get(key)
+        if fields is None:
+            fields = np.stack([self.power_field(k, v) for v in np.ravel(w).tolist()])
+            fields.flags.writeable = False
+            self.decay_fields = {key: fields}  # weights rarely change, only keep the latest fields
+        if np.ndim(position) == 1 and len(fields) == 1:
+            row, col = k - position[0], k - position[1]
+            return fields[0][row:row + shape[0], col:col + shape[1]]
+        position = np.asarray(position)
+        rows = (k - position[:, 0])[:, np.newaxis] + np.arange(shape[0])
+        cols = (k - position[:, 1])[:, np.newaxis] + np.arange(shape[1])
+        batch = np.arange(len(position)) if len(fields) > 1 else np.zeros(len(position), dtype=int)
+        return fields[batch[:, np.newaxis, np.newaxis], rows[:, :, np.newaxis], cols[:, np.newaxis, :]]
+
+    @staticmethod
+    def power_field(k, w) -> np.ndarray:
+        """ w**distance from the center of a (2k - 1) x (2k - 1) field """
+        offsets = np.arange(-(k - 1), k)
+        squared_distance = offsets[:, np.newaxis]**2 + offsets[np.newaxis, :]**2
+        # only a few distinct distances occur, and scalar powers match the per-cell results bit for bit
+        unique_distances, inverse = np.unique(squared_distance, return_inverse=True)
+        decay = np.array([float(w) ** (int(d) ** 0.5) for d in unique_distances])
+        return decay[inverse].reshape(squared_distance.shape)
+
     def set_weights(self, weights) -> None:
         self.weights = weights
 
     def get_functions(self) -> list:
-        return sorted([getattr(self, field) for field in dir(self) if hasattr(getattr(self, field), "order")],
-                       key=(lambda field: field.order))
-
+        if self.functions is None:  # the pipeline is fixed, look it up once
+            self.functions = sorted([getattr(self, field) for field in dir(self) if hasattr(getattr(self, field), "order")],
+                                    key=(lambda field: field.order))
+        return self.functions
+
+    def weights_key(self) -> tuple:
+        """ Hashable copy of the weights, to tell token maps computed with other weights apart """
+        return tuple(np.ravel(self.weights).tolist())
@@ -0,0 +1,86 @@
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from libraries.maze import GridMaze
+
+WORLD_FORMAT = 1
+HEADER_FILE = 'world.json'
+WALLS_FILE = 'walls.npy'
+INTEREST_FILE = 'interest.npy'
+
+
+class World:
+    def __init__(self, path, mode='r'):
+        """
+        Ground truth stored on disk, in a directory: the wall bitmask (see libraries.grid) and the interest field as
+        .npy files, mapped in memory rather than read, and a small JSON header.
+
+        Only the pages of the arrays that are actually accessed are read from disk, so opening a world costs the
+        same whatever its size. This only covers the ground truth: the agents of a simulation on a world hold maps
+        of its whole area.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the world, as made by create_world.
+        mode : str
+            np.memmap mode of the arrays, 'r' for read-only or 'r+' to modify them.
+
+        """
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            self.header = json.load(f)
+        if self.header.get('format') != WORLD_FORMAT:
+            raise ValueError("Unsupported world format: " + str(self.header.get('format')))
+        self.walls = np.load(os.path.join(path, WALLS_FILE), mmap_mode=mode)
+        self.interest = np.load(os.path.join(path, INTEREST_FILE), mmap_mode=mode)
+        if self.walls.shape != self.dimensions or self.interest.shape != self.dimensions:
+            raise ValueError("Arrays of " + path + " don't have the dimensions of its header")
+
+    @property
+    def dimensions(self) -> tuple:
+        return self.header['rows'], self.header['cols']
+
+    def maze(self) -> GridMaze:
+        return GridMaze(self.walls)
+
+    def flush(self) -> None:
+        self.walls.flush()
+        self.interest.flush()
+
+
+def create_world(path, dimensions, interest_dtype=np.float64, **metadata) -> World:
+    """
+    Make an empty world, with walls and interest values all 0, opened for writing.
+
+    Parameters
+    ----------
+    path : str
+        Directory to write the world to, created if needed.
+    dimensions : tuple
+        (rows, cols) of the maze.
+    interest_dtype
+        Type of the interest values. float64 is what simulations generate, float32 halves the size.
+    metadata
+        Stored in the header as they are, e.g. how the world was made. Must be JSON serializable.
+
+    Returns
+    -------
+    World
+        The new world, with arrays in 'r+' mode.
+
+    """
+    os.makedirs(path, exist_ok=True)
+    rows, cols = int(dimensions[0]), int(dimensions[1])
+    open_memmap(os.path.join(path, WALLS_FILE), mode='w+', dtype=np.uint8, shape=(rows, cols)).flush()
+    open_memmap(os.path.join(path, INTEREST_FILE), mode='w+', dtype=interest_dtype, shape=(rows, cols)).flush()
+    header = dict(metadata, format=WORLD_FORMAT, rows=rows, cols=cols, interest_dtype=np.dtype(interest_dtype).name)
+    with open(os.path.join(path, HEADER_FILE), 'w') as f:
+        json.dump(header, f, indent=2)
+    return World(path, mode='r+')
+
+
+def open_world(world, mode='r') -> World:
+    """ World given as itself or as the path of its directory """
+    return world if isinstance(world, World) else World(world, mode=mode)
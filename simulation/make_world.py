@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+import numpy as np
+from libraries.maze import generate_maze, field
+from libraries.world import create_world, World
+from simulation import random_streams
+
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+
+def make_world(path, dimensions, map_mode='maze', loops=1, seed=None, interest_dtype=np.float64,
+               chunk_rows=1024) -> World:
+    """
+    Write the ground truth a Simulation would generate to a world directory (see libraries.world)
+    :param dimensions, map_mode, loops, seed: as in Simulation. With the same seed and a float64 interest field,
+                                              a Simulation opening the world has the very ground truth it would
+                                              have generated.
+    :param chunk_rows: rows of interest values drawn at a time, bounding the memory used besides the maze
+    :return:           the world, opened for writing
+    """
+    seed, _, rngs = random_streams(seed)
+    world = create_world(path, dimensions, interest_dtype=interest_dtype, map_mode=map_mode, loops=loops, seed=seed)
+    rows, cols = world.dimensions
+    if map_mode == 'maze':
+        world.walls[:] = generate_maze(rows, cols, rngs['maze'], loop_percent=loops).walls
+    elif map_mode == 'field':
+        world.walls[:] = field(rows, cols).walls
+    else:
+        raise ValueError
+    for start in range(0, rows, chunk_rows):
+        stop = min(start + chunk_rows, rows)
+        # successive draws of rows give the same values as the single draw of ground_truth
+        world.interest[start:stop] = rngs['interest'].random((stop - start, cols)) * 10
+    world.flush()
+    return world
+
+
+def convert(source, path, interest_dtype=None) -> World:
+    """
+    Write the ground truth of an existing Simulation, or of anything with a GridMaze m and an interest array, to a
+    world directory
+    """
+    interest = np.asarray(source.interest)
+    world = create_world(path, interest.shape, interest_dtype=interest_dtype or interest.dtype,
+                         seed=getattr(source, 'seed', None))
+    world.walls[:] = source.m.walls
+    world.interest[:] = interest
+    world.flush()
+    return world
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a ground truth world and store it on disk")
+    parser.add_argument('path', help='directory of the world')
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--cols', type=int, required=True)
+    parser.add_argument('--map-mode', choices=['maze', 'field'], default='maze')
+    parser.add_argument('--loops', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--float32', action='store_true', help='store the interest values as float32')
+    args = parser.parse_args()
+    w = make_world(args.path, (args.rows, args.cols), map_mode=args.map_mode, loops=args.loops, seed=args.seed,
+                   interest_dtype=np.float32 if args.float32 else np.float64)
+    logging.info(" > wrote a %dx%d world with seed %s to %s" % (w.dimensions + (w.header['seed'], args.path)))
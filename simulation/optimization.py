@@ -1,7 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from numpy.random import randint
 from numpy.random import rand
+import numpy as np
+import pickle
+import random
 import logging
 import os
+from fitness_cache import cache_key, describe
 
 logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
 
@@ -82,7 +88,145 @@ def mutation(bitstring, r_mut):
             bitstring[i] = 1 - bitstring[i]
 
 
-def genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k):
+def task_seed(seed, generation, index):
+    """ Deterministic seed of the evaluation of candidate index in a generation """
+    return int(np.random.SeedSequence(seed, spawn_key=(generation, index)).generate_state(1)[0])
+
+
+def evaluate(task):
+    """
+    Evaluate a candidate, with the random generators seeded for this task only
+    :param task:  (objective, metric, decoded candidate, seed)
+    :return:      objective value, or infinity if the evaluation failed
+    """
+    objective, metric, decoded, seed = task
+    states = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        return objective(metric, decoded)
+    except Exception:
+        logging.exception(" > evaluation of f(%s) failed" % decoded)
+        return float('inf')
+    finally:
+        random.setstate(states[0])
+        np.random.set_state(states[1])
+
+
+def evaluate_population(tasks, pool):
+    """
+    Evaluate tasks on a process pool, or in this process if pool is None
+    :param tasks:  list of (objective, metric, decoded candidate, seed)
+    :param pool:   dictionary holding the ProcessPoolExecutor under 'executor', replaced if a worker dies
+    :return:       objective values, in the order of tasks
+    """
+    if pool is None:
+        return [evaluate(task) for task in tasks]
+    futures = [pool['executor'].submit(evaluate, task) for task in tasks]
+    scores = []
+    lost = []
+    for i, future in enumerate(futures):
+        try:
+            scores.append(future.result())
+        except BrokenProcessPool:
+            scores.append(float('inf'))
+            lost.append(i)
+    if lost:
+        # a worker died, which breaks the whole pool and loses the tasks of the other workers with it: retry each lost
+        # task alone on its own worker, so that only a task crashing twice is scored as failed
+        logging.warning(" > worker crashed, %d evaluation(s) lost" % len(lost))
+        pool['executor'].shutdown(cancel_futures=True)
+        for i in lost:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                try:
+                    scores[i] = executor.submit(evaluate, tasks[i]).result()
+                except BrokenProcessPool:
+                    logging.warning(" > evaluation of f(%s) crashed its worker" % tasks[i][2])
+        pool['executor'] = ProcessPoolExecutor(max_workers=pool['workers'])
+    return scores
+
+
+def evaluate_cached(tasks, pool, cache):
+    """
+    Evaluate tasks, looking candidates up in a FitnessCache first and evaluating identical ones only once
+    :param tasks:  list of (objective, metric, decoded candidate, seed)
+    :param pool:   process pool, see evaluate_population
+    :param cache:  FitnessCache, or None
+    :return:       objective values, in the order of tasks
+    """
+    if cache is None:
+        return evaluate_population(tasks, pool)
+    keys = [cache_key(objective, metric, d) for objective, metric, d, _ in tasks]
+    scores = [cache.get(key) for key in keys]
+    missing = {}
+    for i, key in enumerate(keys):
+        if scores[i] is None:
+            missing.setdefault(key, i)
+    evaluated = evaluate_population([tasks[i] for i in missing.values()], pool)
+    for key, score in zip(missing.keys(), evaluated):
+        if score != float('inf'):  # failures may be transient, don't remember them
+            cache.put(key, score)
+    results = dict(zip(missing.keys(), evaluated))
+    return [results[key] if score is None else score for key, score in zip(keys, scores)]
+
+
+def evaluate_batch(objective, metric, decoded, cache):
+    """
+    Evaluate a population with a single call of a batch objective, looking candidates up in a FitnessCache first
+    :param objective:  function scoring a list of candidates at once, objective(metric, candidates) -> scores
+    :param metric:     metric for objective function
+    :param decoded:    decoded candidates
+    :param cache:      FitnessCache, or None
+    :return:           objective values, in the order of decoded
+    """
+    keys = [cache_key(objective, metric, d) for d in decoded]
+    scores = [None if cache is None else cache.get(key) for key in keys]
+    missing = {}
+    for i, key in enumerate(keys):
+        if scores[i] is None:
+            missing.setdefault(key, i)
+    if missing:
+        candidates = [decoded[i] for i in missing.values()]
+        try:
+            evaluated = list(objective(metric, candidates))
+        except Exception:
+            logging.exception(" > evaluation of %d candidates failed" % len(candidates))
+            evaluated = [float('inf')] * len(candidates)
+        results = dict(zip(missing.keys(), evaluated))
+        if cache is not None:
+            for key, score in results.items():
+                if score != float('inf'):
+                    cache.put(key, score)
+        scores = [results[key] if score is None else score for key, score in zip(keys, scores)]
+    return scores
+
+
+def save_checkpoint(path, state) -> None:
+    """ Atomically write the state of the genetic algorithm """
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(path, config):
+    """
+    State of the genetic algorithm saved at path, if it was saved by a run of the same configuration
+    :param config:  configuration of the run, see genetic_algorithm. A seed of None matches any seed.
+    :return:        the state, or None if there is no checkpoint or it belongs to another configuration
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    saved = state.get('config')
+    if saved is None or saved != dict(config, seed=saved['seed'] if config['seed'] is None else config['seed']):
+        logging.warning(" > ignoring checkpoint %s, saved by a run of another configuration" % path)
+        return None
+    return state
+
+
+def genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k, n_workers=1, seed=None,
+                      cache=None, checkpoint=None, batch=False):
     """
     Stochastic genetic optimization algorithm
     :param objective:  objective function to minimize
@@ -94,18 +238,58 @@ def genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross,
     :param r_cross:    crossover rate
     :param r_mut:      mutation rate
     :param k:          number of selections per population
+    :param n_workers:  number of worker processes evaluating the population, 1 evaluates in this process
+    :param seed:       base seed of the evaluations, drawn from numpy's generator if None
+    :param cache:      FitnessCache of objective values, reused for candidates seen before
+    :param checkpoint: file the state is saved to after every generation; an interrupted run of the same
+                       configuration resumes from it. It is removed once the run completes.
+    :param batch:      objective scores the whole population in one call, objective(metric, candidates) -> scores;
+                       it then runs in this process and n_workers is ignored
     :return:
     """
-    # initial population of random bitstring
-    pop = [randint(0, 2, n_bits*len(bounds)).tolist() for _ in range(n_pop)]
+    config = {'objective': describe(objective), 'metric': describe(metric), 'bounds': [list(b) for b in bounds],
+              'n_bits': n_bits, 'n_iter': n_iter, 'n_pop': n_pop, 'r_cross': r_cross, 'r_mut': r_mut, 'k': k,
+              'seed': seed, 'batch': batch}
+    state = load_checkpoint(checkpoint, config)
+    if state is not None:
+        np.random.set_state(state['rng'])
+        logging.info(" > resuming from generation %d" % state['generation'])
+    else:
+        if seed is None:
+            seed = int(randint(2**31))
+        # initial population of random bitstring
+        pop = [randint(0, 2, n_bits*len(bounds)).tolist() for _ in range(n_pop)]
+        state = {'generation': 0, 'pop': pop, 'best': pop[0], 'best_eval': float('inf'), 'seed': seed,
+                 'config': dict(config, seed=seed)}
+    pool = None
+    if n_workers > 1 and not batch:
+        pool = {'workers': n_workers, 'executor': ProcessPoolExecutor(max_workers=n_workers)}
+    try:
+        result = run_genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k, state,
+                                       pool, cache, checkpoint, batch)
+        if checkpoint is not None and os.path.exists(checkpoint):
+            os.remove(checkpoint)  # done, the next run starts afresh
+        return result
+    finally:
+        if pool is not None:
+            pool['executor'].shutdown()
+
+
+def run_genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross, r_mut, k, state, pool, cache,
+                          checkpoint, batch=False):
+    pop, seed = state['pop'], state['seed']
     # keep track of best solution
-    best, best_eval = 0, objective(metric, decode(bounds, n_bits, pop[0]))
+    best, best_eval = state['best'], state['best_eval']
     # enumerate generations
-    for gen in range(n_iter):
+    for gen in range(state['generation'], n_iter):
         # decode population
         decoded = [decode(bounds, n_bits, p) for p in pop]
-        # evaluate all candidates in the population
-        scores = [objective(metric, d) for d in decoded]
+        if batch:
+            scores = evaluate_batch(objective, metric, decoded, cache)
+        else:
+            # evaluate all candidates in the population, each with its own seed
+            tasks = [(objective, metric, d, task_seed(seed, gen, i)) for i, d in enumerate(decoded)]
+            scores = evaluate_cached(tasks, pool, cache)
         # check for new best solution
         for i in range(n_pop):
             if scores[i] < best_eval:
@@ -126,6 +310,9 @@ def genetic_algorithm(objective, metric, bounds, n_bits, n_iter, n_pop, r_cross,
                 children.append(c)
         # replace population
         pop = children
+        if checkpoint is not None:
+            save_checkpoint(checkpoint, {'generation': gen + 1, 'pop': pop, 'best': best, 'best_eval': best_eval,
+                                         'seed': seed, 'rng': np.random.get_state(), 'config': state['config']})
     logging.info("======= DONE =======")
     decoded = decode(bounds, n_bits, best)
     logging.info('f(%s) = %f' % (decoded, best_eval))
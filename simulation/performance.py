@@ -0,0 +1,226 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+from make_world import make_world
+from simulation import Simulation
+from libraries.ledger import Ledger, EventType
+from libraries.token_functions import TokenFunctions
+
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+WEIGHTS = [0.5, 0.8, 0.2, 0.2, 0.4, 1]
+DEFAULT_TOLERANCE = 0.25
+
+
+def field_simulation(grid_shape, agents, seed=0, search_depth=3) -> Simulation:
+    s = Simulation(dimensions=grid_shape, token_fcn=TokenFunctions(WEIGHTS), enable_keys=False, map_mode='field',
+                   seed=seed)
+    for j in range(agents):
+        s.add_agent(j + 1, search_depth=search_depth)
+    return s
+
+
+def poi_ledger(blocks, points=(50, 50), observers=4, seed=0) -> Ledger:
+    """ Ledger holding about blocks point of interest events, made by several observers and received by 'ledger' """
+    rng = np.random.default_rng(seed)
+    ledger = Ledger('ledger', None, lambda x, y: x)
+    for observer in range(observers):
+        other = Ledger(observer, None, lambda x, y: x)
+        events = rng.integers(EventType.DETECTED, EventType.REJECTED + 1, blocks // observers)
+        rows = rng.integers(1, points[0] + 1, blocks // observers)
+        cols = rng.integers(1, points[1] + 1, blocks // observers)
+        for event, row, col in zip(events.tolist(), rows.tolist(), cols.tolist()):
+            other.record(EventType(event), (row, col))
+        ledger.receive(other, time=0)
+    return ledger
+
+
+# ======================================================================================================================
+# Every case builds the state for one parameter value and returns a setup function, which gives the callable timed.
+# Setups are called outside of the measurement, before every call: cases whose callable changes the state (updates,
+# broadcasts) give one working on a new copy of it every time, so that every call is timed from the same state.
+
+def generate_n_moves_case(search_depth):
+    s = field_simulation((15, 15), 1)
+    agent = s.agents[1]
+    token_map = agent.ledger.map.token_map(agent.ledger.points_of_interest(observer_to_skip=1), agent.agent.position)
+    return lambda: lambda: agent.generate_n_moves(token_map, n=5, m=search_depth)
+
+
+def token_map_case(size):
+    s = field_simulation((size, size), 1)
+    agent = s.agents[1]
+    poi = agent.ledger.points_of_interest(observer_to_skip=1)
+    return lambda: lambda: agent.ledger.map.token_map(poi, agent.agent.position)
+
+
+def points_of_interest_case(blocks):
+    ledger = poi_ledger(blocks)
+    return lambda: lambda: ledger.points_of_interest(observer_to_skip='ledger')
+
+
+def receive_case(blocks):
+    sender = poi_ledger(blocks)
+
+    def setup():
+        receiver = Ledger('receiver', None, lambda x, y: x)
+        return lambda: receiver.receive(sender, time=0)
+    return setup
+
+
+def warm_simulation(grid_shape, agents) -> Simulation:
+    """ field_simulation after an update, the state the update and broadcast cases are copied from """
+    s = field_simulation(grid_shape, agents)
+    s.update()
+    return s
+
+
+def broadcast_case(agents):
+    prepared = warm_simulation((50, 50), agents)
+
+    def setup():
+        s = copy.deepcopy(prepared)
+        return lambda: [agent.broadcast(s.agents, s.spatial_index) for agent in s.agents.values()]
+    return setup
+
+
+def update_grid_case(size):
+    prepared = warm_simulation((size, size), 4)
+    return lambda: copy.deepcopy(prepared).update
+
+
+def update_agents_case(agents):
+    prepared = warm_simulation((100, 100), agents)
+    return lambda: copy.deepcopy(prepared).update
+
+
+def world_start_case(size):
+    """ Opening a world, adding an agent and its first update: the agent's maps and planning span the whole world """
+    directory = tempfile.TemporaryDirectory()  # removed along with the callable, which refers to it
+    make_world(directory.name, (size, size), map_mode='field', seed=0).flush()
+
+    def start():
+        s = Simulation(None, TokenFunctions(WEIGHTS), enable_keys=False, seed=0, world=directory.name)
+        s.add_agent(1, search_depth=3)
+        s.update()
+    return lambda: start
+
+
+# name -> (function, parameter, full values, quick values)
+CASES = {
+    'generate_n_moves': (generate_n_moves_case, 'search_depth', [1, 2, 3, 4], [1, 2]),
+    'token_map': (token_map_case, 'grid_size', [15, 50, 100, 250, 500], [15, 50]),
+    'points_of_interest': (points_of_interest_case, 'ledger_blocks', [100, 1000, 10000, 100000], [100, 1000]),
+    'receive': (receive_case, 'ledger_blocks', [100, 1000, 10000, 100000], [100, 1000]),
+    'broadcast': (broadcast_case, 'agents', [4, 16, 64, 250, 500], [4, 16]),
+    'update_grid': (update_grid_case, 'grid_size', [15, 50, 100, 250, 500], [15, 50]),
+    'update_agents': (update_agents_case, 'agents', [4, 16, 64, 250, 500], [4, 16]),
+    'world_start': (world_start_case, 'grid_size', [100, 500, 1000, 2000], [50, 100]),
+}
+
+
+def time_call(setup, min_time=0.2, min_runs=3, max_runs=1000) -> dict:
+    """
+    Time repeated calls of a function, after one call to warm up
+    :param setup:     function giving the function to call, called untimed before every call (see CASES)
+    :param min_time:  calls are repeated until they took this many seconds in total, within min_runs and max_runs
+    :return:          {'seconds': fastest call, 'median': median call, 'runs': number of calls timed}
+    """
+    setup()()
+    times = []
+    while len(times) < min_runs or (sum(times) < min_time and len(times) < max_runs):
+        function = setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'median': statistics.median(times), 'runs': len(times)}
+
+
+def measure(name, values=None, quick=False, min_time=0.2) -> dict:
+    """
+    Time a case for every value of its parameter
+    :param values:  parameter values, by default those of CASES for a full or quick run
+    :return:        str(value) -> result of time_call
+    """
+    case, parameter, full, fast = CASES[name]
+    if values is None:
+        values = fast if quick else full
+    results = {}
+    for value in values:
+        results[str(value)] = time_call(case(value), min_time=min_time)
+        logging.info(" > %s %s=%s: %.6f s" % (name, parameter, value, results[str(value)]['seconds']))
+    return results
+
+
+def run_suite(names=None, quick=False, min_time=0.2) -> dict:
+    """
+    Run benchmark cases
+    :param names:  cases to run, all of CASES if None
+    :param quick:  use the small parameter values only
+    :return:       baseline dictionary: {'environment': ..., 'results': {case: {value: timing}}}
+    """
+    names = list(CASES) if names is None else names
+    return {'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'machine': platform.machine(), 'processor': platform.processor()},
+            'results': {name: measure(name, quick=quick, min_time=min_time) for name in names}}
+
+
+def compare(current: dict, baseline: dict, tolerance=DEFAULT_TOLERANCE) -> list:
+    """
+    Compare two runs of the suite, case by case and value by value
+    :param tolerance:  relative slowdown accepted before a timing counts as a regression, e.g. 0.25 for 25%
+    :return:           list of (case, value, baseline seconds, current seconds, ratio, status) for the timings in
+                       both runs, status being 'regression', 'improvement' or 'ok'
+    """
+    rows = []
+    for name, results in current['results'].items():
+        for value, timing in results.items():
+            reference = baseline['results'].get(name, {}).get(value)
+            if reference is None:
+                continue
+            ratio = timing['seconds'] / reference['seconds']
+            if ratio > 1 + tolerance:
+                status = 'regression'
+            elif ratio < 1 / (1 + tolerance):
+                status = 'improvement'
+            else:
+                status = 'ok'
+            rows.append((name, value, reference['seconds'], timing['seconds'], ratio, status))
+    return rows
+
+
+def report(rows) -> str:
+    lines = ['%-20s %8s %12s %12s %7s  %s' % ('case', 'value', 'baseline', 'current', 'ratio', 'status')]
+    for name, value, reference, current, ratio, status in rows:
+        lines.append('%-20s %8s %12.6f %12.6f %7.2f  %s' % (name, value, reference, current, ratio, status))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the hot paths of the simulation against problem size")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent timing every value')
+    parser.add_argument('--save', help='write the results to this baseline file')
+    parser.add_argument('--compare', help='baseline file to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+    results = run_suite(args.cases, quick=args.quick, min_time=args.min_time)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        print(report(rows))
+        if any(row[-1] == 'regression' for row in rows):
+            sys.exit(1)
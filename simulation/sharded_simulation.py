@@ -0,0 +1,271 @@
+import multiprocessing
+import os
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from libraries.grid import GridView
+from libraries.maze import GridMaze
+from libraries.scheduler import EventQueue, Action
+from libraries.spatial_index import SpatialIndex
+from libraries.token_functions import TokenFunctions
+from libraries.world import open_world
+from simulation import (random_streams, ground_truth, spawn_position, build_agent, INTEREST_THRESHOLD,
+                        POTENTIAL_INTEREST_THRESHOLD)
+
+# What collect can fetch from the agents of the shards, by name
+COLLECTORS = {
+    'position': lambda agent: tuple(agent.agent.position),
+    'chosen_path': lambda agent: agent.chosen_path,
+    'local_time': lambda agent: agent.local_time,
+    'points_of_interest': lambda agent: agent.ledger.points_of_interest(),
+    'version_vector': lambda agent: agent.ledger.version_vector(),
+    'sync_stats': lambda agent: dict(agent.ledger.sync_stats),
+    'walls': lambda agent: agent.ledger.map.walls,
+    'visits': lambda agent: agent.ledger.map.visits,
+}
+
+
+def publish(array: np.ndarray) -> SharedMemory:
+    """ Copy an array into a new block of shared memory """
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[:] = array
+    return memory
+
+
+def attach(name, shape, dtype) -> tuple:
+    """ Read-only array over a block of shared memory published by another process, and the block """
+    memory = SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    array.flags.writeable = False
+    return array, memory
+
+
+def shard_worker(connection, ground, dimensions, settings) -> None:
+    """
+    Process holding the agents of a shard, applying the commands of the coordinator until told to stop. Every
+    command gets a reply, ('ok', result) or ('error', traceback).
+    :param ground: where the ground truth is, ('shared', walls block name, interest block name) or ('world', path)
+    """
+    if ground[0] == 'world':
+        world = open_world(ground[1])
+        m, interest = world.maze(), world.interest
+    else:
+        walls, walls_memory = attach(ground[1], dimensions, np.uint8)
+        interest, interest_memory = attach(ground[2], dimensions, np.float64)
+        m = GridMaze(walls)
+    interest_map = GridView(interest)
+    agents = {}
+    kept = []  # messages of the last gossip between agents of this shard, delivered without leaving it
+    while True:
+        command, argument = connection.recv()
+        if command == 'stop':
+            break
+        try:
+            result = None
+            if command == 'add':
+                for id, pos, seed, options in argument:
+                    agents[id] = build_agent(id, pos, m, interest_map, settings['token_fcn'],
+                                             np.random.default_rng(seed), settings['communication_range'],
+                                             settings['interest_threshold'], settings['potential_interest_threshold'],
+                                             **options)
+            elif command == 'step':
+                result = {}
+                for id, action in argument:
+                    if action == Action.MOVE:
+                        agents[id].step()
+                        result[id] = tuple(agents[id].agent.position)
+                    else:
+                        agents[id].plan()
+            elif command == 'gossip':
+                kept = []
+                result = []
+                for sender, peer, local in argument:
+                    (kept if local else result).append(agents[sender].gossip(peer))
+            elif command == 'deliver':
+                for message in argument:
+                    if isinstance(message, int):
+                        message = kept[message]
+                    agents[message.recipient].deliver(message)
+                kept = []
+            elif command == 'collect':
+                result = {id: COLLECTORS[argument](agent) for id, agent in agents.items()}
+            else:
+                raise ValueError("Unknown command: " + str(command))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+        else:
+            connection.send(('ok', result))
+    connection.close()
+
+
+class ShardedSimulation:
+    def __init__(self, dimensions: tuple, token_fcn: TokenFunctions, loops: float = 1, map_mode='maze',
+                 communication_range: int = 5, seed=None, shards=None, start_method=None, world=None):
+        """
+        Simulation whose agents are partitioned across worker processes, one shard per process.
+
+        The maze walls and the interest field are published once in shared memory, where the workers map them as
+        read-only arrays; on a world (see libraries.world), the workers map its files instead. The coordinator
+        (this object) keeps the event queue and the positions of all agents: at every update it has the shards step
+        and plan their agents in parallel, then handles the broadcasts at the tick boundary, routing the gossip
+        messages between shards. Given the same seed and agents, runs match
+        those of a Simulation with tick_mode='synchronous'.
+
+        Parameters
+        ----------
+        dimensions, token_fcn, loops, map_mode, communication_range, seed, world
+            As in Simulation.
+        shards : int
+            Number of worker processes, by default one per CPU. Agents are dealt round robin.
+        start_method : str
+            multiprocessing start method of the workers, the platform's default if None.
+
+        """
+        self.seed, self.seeds, self.rngs = random_streams(seed)
+        if world is None:
+            m, interest = ground_truth(dimensions, map_mode, loops, self.rngs)
+            self.dimensions = tuple(dimensions)
+            self.memory = [publish(m.walls), publish(interest)]
+            ground = ('shared', self.memory[0].name, self.memory[1].name)
+        else:
+            world = open_world(world)
+            if dimensions is not None and tuple(dimensions) != world.dimensions:
+                raise ValueError("World of dimensions " + str(world.dimensions) + ", not " + str(dimensions))
+            self.dimensions = world.dimensions
+            self.memory = []
+            ground = ('world', world.path)
+        self.communication_range = communication_range
+        self.settings = {'token_fcn': token_fcn, 'communication_range': communication_range,
+                         'interest_threshold': INTEREST_THRESHOLD,
+                         'potential_interest_threshold': POTENTIAL_INTEREST_THRESHOLD}
+        self.time = 0
+        self.events = EventQueue()
+        self.spatial_index = SpatialIndex(communication_range)
+        self.shard_of = {}  # agent id -> shard
+        self.n_shards = shards if shards is not None else os.cpu_count()
+        context = multiprocessing.get_context(start_method)
+        self.connections = []
+        self.processes = []
+        for shard in range(self.n_shards):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=shard_worker, name='shard-%d' % shard, daemon=True,
+                                      args=(worker_connection, ground, self.dimensions, self.settings))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def __enter__(self) -> 'ShardedSimulation':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Stop the workers and release the shared memory """
+        for connection in self.connections:
+            try:
+                connection.send(('stop', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self.connections:
+            connection.close()
+        for memory in self.memory:
+            memory.close()
+            memory.unlink()
+        self.connections, self.processes, self.memory = [], [], []
+
+    def request(self, commands: dict) -> dict:
+        """ Send commands to shards ({shard: (command, argument)}) all at once, and wait for every reply """
+        for shard, command in commands.items():
+            self.connections[shard].send(command)
+        replies = {}
+        errors = []
+        for shard in commands:
+            status, result = self.connections[shard].recv()
+            if status == 'error':
+                errors.append("Shard %d failed:\n%s" % (shard, result))
+            replies[shard] = result
+        # every reply is read first, so that none is taken for the reply to the next request
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return replies
+
+    def add_agent(self, id, pos=None, search_depth=5, planner='equivalent', ledger_max_blocks=None, sensor=None,
+                  move_period=1, plan_period=1, broadcast_period=1) -> None:
+        """ Add an agent as Simulation.add_agent does, drawing the same position and sensor noise """
+        if id in self.shard_of:
+            return
+        if pos is None:
+            pos = spawn_position(self.rngs['spawn'], self.dimensions)
+        seed = self.seeds['noise'].spawn(1)[0]
+        shard = len(self.shard_of) % self.n_shards
+        options = {'search_depth': search_depth, 'planner': planner, 'ledger_max_blocks': ledger_max_blocks,
+                   'sensor': sensor}
+        self.request({shard: ('add', [(id, pos, seed, options)])})
+        self.shard_of[id] = shard
+        self.spatial_index.insert(id, pos)
+        self.events.add(id, (move_period, plan_period, broadcast_period), start=self.time)
+
+    def update(self) -> None:
+        """ Advance the simulated time to the next event and process every event due then, as Simulation.update """
+        if not len(self.events):
+            return
+        self.time = self.events.next_time()
+        work = {}
+        broadcasters = []
+        for _, id, action in self.events.pop_due(self.time):
+            if action == Action.BROADCAST:
+                broadcasters.append(id)
+            else:
+                work.setdefault(self.shard_of[id], []).append((id, action))
+        for moved in self.request({shard: ('step', steps) for shard, steps in work.items()}).values():
+            for id, position in moved.items():
+                self.spatial_index.move(id, position)
+        if broadcasters:
+            self.exchange(broadcasters)
+
+    def exchange(self, broadcasters) -> None:
+        """ Simulation.exchange across shards: messages between agents of a shard stay in it, the others are routed """
+        gossip = {}
+        routes = []  # (sender shard, recipient shard, local) of every message, in the order of delivery
+        for id in broadcasters:
+            shard = self.shard_of[id]
+            for peer in self.spatial_index.query(self.spatial_index.positions[id], self.communication_range):
+                if peer != id:
+                    local = self.shard_of[peer] == shard
+                    gossip.setdefault(shard, []).append((id, peer, local))
+                    routes.append((shard, self.shard_of[peer], local))
+        if not routes:
+            return
+        remote = {shard: iter(messages) for shard, messages in
+                  self.request({shard: ('gossip', pairs) for shard, pairs in gossip.items()}).items()}
+        kept = {shard: 0 for shard in gossip}
+        deliveries = {}
+        for sender_shard, recipient_shard, local in routes:
+            if local:
+                deliveries.setdefault(recipient_shard, []).append(kept[sender_shard])
+                kept[sender_shard] += 1
+            else:
+                deliveries.setdefault(recipient_shard, []).append(next(remote[sender_shard]))
+        self.request({shard: ('deliver', messages) for shard, messages in deliveries.items()})
+
+    def run_until(self, time) -> None:
+        """ Process every event due at or before a simulated time """
+        while len(self.events) and self.events.next_time() <= time:
+            self.update()
+
+    def positions(self) -> dict:
+        """ (col, row) position of every agent """
+        return {id: self.spatial_index.positions[id] for id in self.shard_of}
+
+    def collect(self, name) -> dict:
+        """ A property of every agent (see COLLECTORS), by agent id in the order they were added """
+        results = {}
+        for replies in self.request({shard: ('collect', name) for shard in range(self.n_shards)}).values():
+            results.update(replies)
+        return {id: results[id] for id in self.shard_of}
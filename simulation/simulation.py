@@ -1,76 +1,218 @@
-from pyamaze import maze, agent
 from libraries.token_functions import TokenFunctions
 import numpy as np
 from libraries.agent import Agent
-import random
+from libraries.spatial_index import SpatialIndex
+from libraries.grid import GridView
+from libraries.maze import MazeAgent, generate_maze, field, to_pyamaze_csv
+from libraries.profiler import NULL_PROFILER
+from libraries.scheduler import EventQueue, Action
+from libraries.world import open_world
+import os
+import tempfile
+
+# Independent random streams of a simulation, so that changing how one of them is used (e.g. more agents drawing
+# sensor noise) does not change the others (e.g. the maze)
+RNG_STREAMS = ('maze', 'interest', 'spawn', 'noise')
+# 'sequential': every agent broadcasts right after its own step, so later agents of the same update already know
+# about it. 'synchronous': agents broadcast at the end of the update, all from what they held before any of them
+# receives, which keeps the agents of an update independent (see sharded_simulation).
+TICK_MODES = ('sequential', 'synchronous')
+# Interest above which an agent reports a point of interest, and a potential one
+INTEREST_THRESHOLD = 9.2
+POTENTIAL_INTEREST_THRESHOLD = 8.2
+
+
+def random_streams(seed=None):
+    """
+    Seed sequences and generators of the random streams of a simulation
+    :param seed: seed of the simulation. If None, it is drawn from numpy's global generator.
+    :return:     (seed, {stream: SeedSequence}, {stream: Generator})
+    """
+    if seed is None:
+        seed = int(np.random.randint(0, 2**32, dtype=np.int64))
+    seeds = dict(zip(RNG_STREAMS, np.random.SeedSequence(seed).spawn(len(RNG_STREAMS))))
+    return seed, seeds, {name: np.random.default_rng(s) for name, s in seeds.items()}
+
+
+def ground_truth(dimensions, map_mode, loops, rngs):
+    """
+    Maze and interest array of a simulation, drawn from its random streams
+    :return: (GridMaze, float array of interest values between 0 and 10)
+    """
+    if map_mode == 'maze':
+        m = generate_maze(dimensions[0], dimensions[1], rngs['maze'], loop_percent=loops)
+    elif map_mode == 'field':
+        m = field(dimensions[0], dimensions[1])
+    else:
+        raise ValueError
+    return m, rngs['interest'].random(dimensions) * 10
+
+
+def spawn_position(rng, dimensions) -> list:
+    """ Random (col, row) position on a maze of the given dimensions """
+    return [int(rng.integers(1, dimensions[1] + 1)), int(rng.integers(1, dimensions[0] + 1))]
+
+
+def build_agent(id, pos, ground_truth, interest_map, token_fcn, rng, communication_range, interest_threshold,
+                potential_interest_threshold, search_depth=5, planner='equivalent', ledger_max_blocks=None, sensor=None,
+                profiler=NULL_PROFILER) -> Agent:
+    """ Agent of a simulation, at a (col, row) position and with the generator of its sensor noise """
+    agent = Agent(id, MazeAgent(), ground_truth, interest_map, lambda x, y: x,
+                  search_depth=search_depth, planner=planner,
+                  communication_range=communication_range,
+                  point_of_interest_threshold=interest_threshold,
+                  potential_point_of_interest_threshold=potential_interest_threshold,
+                  token_fcn=token_fcn, rng=rng, ledger_max_blocks=ledger_max_blocks,
+                  profiler=profiler, sensor=sensor)
+    agent.agent.position = pos
+    return agent
 
 
 class Simulation:
-    def __init__(self, dimensions: tuple, token_fcn: TokenFunctions, loops: float = 1, enable_keys: bool = True, map_mode='maze'):
+    def __init__(self, dimensions: tuple, token_fcn: TokenFunctions, loops: float = 1, enable_keys: bool = True, map_mode='maze',
+                 communication_range: int = 5, seed=None, profiler=None, tick_mode='sequential', world=None):
         """
         Create a 2D maze
         :param dimensions: tuple with two elements
-        :param loops     : complexity, between 0 and 1
+        :param loops     : complexity, the loopPercent of pyamaze's CreateMaze, between 0 and 100
+        :param communication_range : Chebyshev distance within which agents exchange their ledgers
+        :param seed      : seed of the simulation's random streams (see RNG_STREAMS). If None, it is drawn from
+                           numpy's global generator, so that seeding np.random still makes runs reproducible.
+        :param profiler  : libraries.profiler.Profiler measuring the phases of every update, per tick and per agent.
+                           If None, nothing is measured.
+        :param tick_mode : when agents broadcast during an update, see TICK_MODES
+        :param world     : libraries.world.World or its directory, ground truth used instead of generating one. Its
+                           arrays stay on disk, only the pages agents observe are read. dimensions may then be None.
+                           Agents still hold dense maps of the whole area (see AgentMap) and plan on them, so their
+                           memory and planning time grow with the area as without a world (see performance.py).
         """
-        self.m = maze(dimensions[0], dimensions[1])
-        self.m.CreateMaze(loopPercent=loops)
-        if map_mode == 'maze':
-            pass
-        elif map_mode == 'field':
-            for key in self.m.maze_map.keys():
-                boundaries = {'E': 1, 'W': 1, 'N': 1, 'S': 1}
-                if key[0] == 1:
-                    boundaries['N'] = 0
-                if key[0] == dimensions[0]:
-                    boundaries['S'] = 0
-                if key[1] == 1:
-                    boundaries['W'] = 0
-                if key[1] == dimensions[1]:
-                    boundaries['E'] = 0
-                self.m.maze_map[key] = boundaries
+        if tick_mode not in TICK_MODES:
+            raise ValueError("Unknown tick mode: " + str(tick_mode))
+        self.seed, self.seeds, self.rngs = random_streams(seed)
+        if world is None:
+            self.m, self.interest = ground_truth(dimensions, map_mode, loops, self.rngs)
         else:
-            raise ValueError
+            world = open_world(world)
+            if dimensions is not None and tuple(dimensions) != world.dimensions:
+                raise ValueError("World of dimensions " + str(world.dimensions) + ", not " + str(dimensions))
+            dimensions = world.dimensions
+            self.m, self.interest = world.maze(), world.interest
 
         self.agents = {}
         self.dimensions = dimensions
         self.enable_keys = enable_keys
-        self.time = 0
+        self.tick_mode = tick_mode
+        self.time = 0  # simulated time, that of the last events processed
+        self.events = EventQueue()
         self.token_fcn = token_fcn
+        self.profiler = NULL_PROFILER if profiler is None else profiler
 
-        self.communication_range = 5
+        self.communication_range = communication_range
+        self.spatial_index = SpatialIndex(self.communication_range)
 
-        self.interest_map = {}
-        for point in self.m.grid:
-            self.interest_map[point] = random.random()*10
+        self.interest_map = GridView(self.interest)
 
-        self.interest_threshold = 9.2
-        self.potential_interest_threshold = 8.2
+        self.interest_threshold = INTEREST_THRESHOLD
+        self.potential_interest_threshold = POTENTIAL_INTEREST_THRESHOLD
 
     def start_maze(self) -> None:
-        """ Obsolete, runs the simulation in tkinter """
-        self.m.run()
+        """ Obsolete, runs the simulation in tkinter. Requires pyamaze, which the simulation itself does not use. """
+        from pyamaze import maze, agent
+        m = maze(self.dimensions[0], self.dimensions[1])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'maze.csv')
+            to_pyamaze_csv(self.m, path)
+            m.CreateMaze(loadMaze=path)
+        for drone in self.agents.values():
+            position = drone.agent.position
+            drone.agent = agent(m)  # the pyamaze agent now holds the position
+            drone.agent.position = position
+            if self.enable_keys:
+                m.enableArrowKey(drone.agent)
+        m.run()
 
     def random_position(self):
         """ Returns a random position on the maze """
-        return [np.random.randint(1, self.dimensions[1] + 1),
-         np.random.randint(1, self.dimensions[0] + 1)]
+        return spawn_position(self.rngs['spawn'], self.dimensions)
+
+    def agent_rng(self, stream) -> np.random.Generator:
+        """ New generator for an agent, independent of the other agents' and derived from one of the streams """
+        return np.random.default_rng(self.seeds[stream].spawn(1)[0])
 
-    def add_agent(self, id, pos=None, search_depth=5) -> None:
+    def add_agent(self, id, pos=None, search_depth=5, planner='equivalent', ledger_max_blocks=None,
+                  sensor=None, move_period=1, plan_period=1, broadcast_period=1) -> None:
+        """
+        Add an agent, whose first events are due one period after the current time
+        :param move_period:      simulated time between two steps of the agent, e.g. 0.5 for an agent twice as fast
+        :param plan_period:      simulated time between two plans. In between the agent follows its last path, and
+                                 plans early only when it runs out of it.
+        :param broadcast_period: simulated time between two broadcasts, None for an agent that never broadcasts
+        """
         if id not in self.agents.keys():
             if pos is None:
                 pos = self.random_position()
-            self.agents[id] = Agent(id, agent(self.m), self.m, self.interest_map, lambda x, y: x,
-                                    search_depth=search_depth,
-                                    communication_range=self.communication_range,
-                                    point_of_interest_threshold=self.interest_threshold,
-                                    potential_point_of_interest_threshold=self.potential_interest_threshold,
-                                    token_fcn = self.token_fcn)
-            self.agents[id].agent.position = pos
-            if self.enable_keys:  # for start_maze visualization in tkinter
-                self.m.enableArrowKey(self.agents[id].agent)
+            self.agents[id] = build_agent(id, pos, self.m, self.interest_map, self.token_fcn, self.agent_rng('noise'),
+                                          self.communication_range, self.interest_threshold,
+                                          self.potential_interest_threshold, search_depth=search_depth,
+                                          planner=planner, ledger_max_blocks=ledger_max_blocks, sensor=sensor,
+                                          profiler=self.profiler)
+            self.spatial_index.insert(id, pos)
+            self.events.add(id, (move_period, plan_period, broadcast_period), start=self.time)
+
+    def agents_in_range(self, position, distance=None) -> list:
+        """ Ids of the agents within a Chebyshev distance (by default the communication range) of a position """
+        if distance is None:
+            distance = self.communication_range
+        return self.spatial_index.query(position, distance)
+
+    def pairs_in_range(self, distance=None) -> list:
+        """ All pairs of agent ids within a Chebyshev distance (by default the communication range) of each other """
+        if distance is None:
+            distance = self.communication_range
+        return self.spatial_index.pairs_in_range(distance)
 
     def update(self):
-        for agent in self.agents.keys():
-            self.agents[agent].update()
-            self.agents[agent].broadcast(self.agents)
-            self.time += 1
+        """
+        Advance the simulated time to the next event and process every event due then, agent by agent. Agents with
+        nothing due are not touched. With the default periods, every agent steps, plans and broadcasts once per
+        update and the time advances by 1.
+        """
+        if not len(self.events):
+            return
+        self.profiler.new_tick()
+        with self.profiler.phase('tick'):
+            self.time = self.events.next_time()
+            broadcasters = []
+            for _, id, action in self.events.pop_due(self.time):
+                agent = self.agents[id]
+                if action == Action.MOVE:
+                    agent.step()
+                    self.spatial_index.move(id, agent.agent.position)
+                elif action == Action.PLAN:
+                    agent.plan()
+                elif self.tick_mode == 'synchronous':
+                    broadcasters.append(id)
+                else:
+                    agent.broadcast(self.agents, self.spatial_index)
+            if broadcasters:
+                self.exchange(broadcasters)
+
+    def exchange(self, broadcasters) -> None:
+        """
+        Broadcasts of a synchronous update: every broadcaster gossips (see Agent.gossip) to the agents within
+        communication range, then the messages are delivered in the order of the broadcasters
+        """
+        messages = []
+        for id in broadcasters:
+            agent = self.agents[id]
+            with self.profiler.phase('broadcast', id):
+                for peer in self.spatial_index.query(agent.agent.position, agent.communication_range):
+                    if peer != id:
+                        messages.append(agent.gossip(peer))
+        for message in messages:
+            self.agents[message.recipient].deliver(message)
+
+    def run_until(self, time) -> None:
+        """ Process every event due at or before a simulated time """
+        while len(self.events) and self.events.next_time() <= time:
+            self.update()
@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    array = array.view()
+    array.flags.writeable = False
+    return array
+
+
+class Snapshot:
+    """
+    Immutable state of a Simulation after a tick, everything the visualization draws.
+
+    positions and paths hold every agent's (col, row) position and chosen path. agent is the agent whose view was
+    captured, None for the system overview; its map (agent_walls, agent_visits), the counters of its ledger
+    (points_of_interest) and its token map (tokens, only if requested) are copies, so the simulation can move on
+    while the snapshot is drawn. Arrays are read-only, and the dictionaries must not be modified either.
+    """
+    __slots__ = ('tick', 'time', 'positions', 'paths', 'walls', 'interest', 'interest_threshold',
+                 'potential_interest_threshold', 'agent', 'agent_walls', 'agent_visits', 'points_of_interest',
+                 'tokens')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    @staticmethod
+    def capture(s, tick, agent=None, tokens=False) -> 'Snapshot':
+        """
+        Snapshot of a simulation
+        :param tick:    number of updates done
+        :param agent:   id of the agent whose maps and counters are captured, None or 0 for none
+        :param tokens:  also compute the token map of the agent
+        """
+        fields = {'tick': tick, 'time': s.time,
+                  'positions': {id: tuple(a.agent.position) for id, a in s.agents.items()},
+                  'paths': {id: a.chosen_path for id, a in s.agents.items()},
+                  'walls': read_only(s.m.walls), 'interest': read_only(s.interest),
+                  'interest_threshold': s.interest_threshold,
+                  'potential_interest_threshold': s.potential_interest_threshold}
+        if agent in s.agents:
+            a = s.agents[agent]
+            fields.update(agent=agent, agent_walls=read_only(a.ledger.map.walls.copy()),
+                          agent_visits=read_only(a.ledger.map.visits.copy()),
+                          points_of_interest=a.ledger.points_of_interest())
+            if tokens:
+                token_map = a.ledger.map.token_map(a.points_of_interest, a.agent.position,
+                                                   poi_version=a.ledger.poi_version)  # usually the one just planned on
+                fields['tokens'] = read_only(token_map.array)
+        return Snapshot(**fields)
+
+
+class SimulationWorker:
+    def __init__(self, s, rate=None, agent=None, tokens=False):
+        """
+        Steps a Simulation on a background thread, publishing a Snapshot after every tick.
+
+        Only the worker thread touches the simulation once started; other threads may read it while holding
+        condition, if the worker is idle. The latest snapshot is published by replacing the snapshot attribute, so
+        readers take a complete snapshot without locking, while the next one is built aside. The worker starts
+        paused.
+
+        Parameters
+        ----------
+        s : Simulation
+            Simulation to step.
+        rate : float
+            Target number of ticks per second while playing. If None, as fast as possible.
+        agent, tokens
+            View captured in the snapshots, see Snapshot.capture and select.
+
+        """
+        self.s = s
+        self.rate = rate
+        self.condition = threading.Condition()
+        self.playing = False
+        self.pending_steps = 0
+        self.updating = False
+        self.stopping = False
+        self.view = (agent, tokens)
+        self.tick = 0
+        self.error = None
+        self.snapshot = Snapshot.capture(s, self.tick, agent, tokens)
+        self.thread = threading.Thread(target=self.run, name='simulation', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, timeout=None) -> None:
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def play(self) -> None:
+        with self.condition:
+            self.playing = True
+            self.pending_steps = 0
+            self.condition.notify()
+
+    def pause(self) -> None:
+        with self.condition:
+            self.playing = False
+            self.condition.notify()
+
+    def toggle(self) -> None:
+        if self.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def step(self) -> None:
+        """ Do one more tick, while paused; ignored while playing """
+        with self.condition:
+            if not self.playing:
+                self.pending_steps += 1
+                self.condition.notify()
+
+    def idle(self) -> bool:
+        """ Whether the simulation is left alone until the next command, to be called holding condition """
+        return not (self.playing or self.pending_steps or self.updating)
+
+    def select(self, agent, tokens=False) -> None:
+        """ Capture the maps of another agent, or none, from the next snapshot on; republished at once if paused """
+        with self.condition:
+            self.view = (agent, tokens)
+            self.condition.notify()
+
+    def run(self) -> None:
+        published_view = self.view
+        next_tick = time.perf_counter()
+        while True:
+            with self.condition:
+                while not (self.stopping or self.playing or self.pending_steps or self.view != published_view):
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                stepping = self.playing or self.pending_steps > 0
+                if self.playing and self.rate is not None:
+                    delay = next_tick - time.perf_counter()
+                    if delay > 0:
+                        self.condition.wait(delay)  # woken early by pause, stop or select
+                        continue
+                if not self.playing and self.pending_steps:
+                    self.pending_steps -= 1
+                view = self.view
+                self.updating = stepping
+            if stepping:
+                try:
+                    self.s.update()
+                except Exception as e:
+                    logging.exception(" > simulation update failed, pausing")
+                    self.error = e
+                    self.pause()
+                    continue
+                finally:
+                    with self.condition:
+                        self.updating = False
+                self.tick += 1
+                if self.rate is not None:
+                    next_tick = max(next_tick + 1 / self.rate, time.perf_counter() - 1 / self.rate)
+            self.snapshot = Snapshot.capture(self.s, self.tick, *view)
+            published_view = view
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from benchmark import run_scenario
+from libraries.profiler import Profiler
+
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+DEFAULT_WEIGHTS = [0.5, 0.8, 0.2, 0.2, 0.4, 1]
+RESULT_FIELDS = ('coverage_metric', 'poi_metric', 'setup_time', 'simulation_time', 'metric_time')
+
+
+def expand_grid(parameters: dict, seeds) -> list:
+    """
+    All combinations of a parameter grid, once per seed
+    :param parameters:  run_scenario argument -> list of values, e.g. {'grid_shape': [(15, 15), (30, 30)]}
+    :param seeds:       seeds every combination is run with
+    :return:            list of run_scenario keyword arguments
+    """
+    names = sorted(parameters.keys())
+    runs = []
+    for values in itertools.product(*[parameters[name] for name in names]):
+        for seed in seeds:
+            config = dict(zip(names, values))
+            config['seed'] = seed
+            runs.append(config)
+    return runs
+
+
+def run_key(config: dict) -> str:
+    """ Identifier of a run, the same for equal configurations across restarts """
+    return json.dumps(config, sort_keys=True)
+
+
+def run(config: dict, profile=False) -> dict:
+    """
+    Run one configuration of the sweep, in a worker process
+    :param profile:  add the wall time and calls of every phase of the updates under 'profile', see
+                     ProfileStats.by_phase
+    """
+    arguments = dict(config)
+    arguments.setdefault('weights', DEFAULT_WEIGHTS)
+    if 'grid_shape' in arguments:
+        arguments['grid_shape'] = tuple(arguments['grid_shape'])
+    profiler = Profiler() if profile else None
+    result = {name: float(value) for name, value in run_scenario(profiler=profiler, **arguments).items()}
+    if profile:
+        result['profile'] = profiler.stats().by_phase()
+    return result
+
+
+def completed_runs(path) -> set:
+    """ Keys of the runs already stored in a result file """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            return {row['run'] for row in csv.DictReader(f)}
+        return {json.loads(line)['run'] for line in f if line.strip()}
+
+
+class ResultWriter:
+    """
+    Appends results to a CSV file, or a JSON Lines file for any other extension, flushing every row. An existing CSV
+    file must have the columns of these parameters and profile setting, or ValueError is raised.
+    """
+    def __init__(self, path, parameters, profile=False):
+        self.path = path
+        self.fields = ['run'] + sorted(parameters) + ['seed'] + list(RESULT_FIELDS) + (['profile'] if profile else [])
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if path.endswith('.csv') and not new_file:
+            with open(path, newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != self.fields:
+                raise ValueError("Columns of " + path + " " + str(header) + " don't match the results " +
+                                 str(self.fields))
+        self.file = open(path, 'a', newline='')
+        self.csv = None
+        if path.endswith('.csv'):
+            self.csv = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction='ignore')
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, config, result) -> None:
+        row = {'run': run_key(config)}
+        row.update(config)
+        row.update(result)
+        if self.csv is not None:
+            self.csv.writerow({key: json.dumps(value) if isinstance(value, (list, tuple, dict)) else value
+                               for key, value in row.items()})
+        else:
+            self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def sweep(parameters: dict, seeds, output, n_workers=None, profile=False) -> int:
+    """
+    Run every combination of a parameter grid for every seed, streaming results to output as they finish.
+
+    Runs already present in output are skipped, so an interrupted sweep continues where it stopped. A failing run is
+    logged and left out of the output, so that it is tried again on the next start.
+    :param parameters:  run_scenario argument -> list of values
+    :param seeds:       seeds every combination is run with
+    :param output:      result file, CSV if it ends with .csv, JSON Lines otherwise
+    :param n_workers:   number of worker processes, all CPUs if None
+    :param profile:     store the time spent in every phase of the updates with each result, see run
+    :return:            number of runs completed by this call
+    """
+    done = completed_runs(output)
+    todo = [config for config in expand_grid(parameters, seeds) if run_key(config) not in done]
+    logging.info(" > %d runs to do, %d already done" % (len(todo), len(done)))
+    writer = ResultWriter(output, parameters, profile)
+    completed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(run, config, profile): config for config in todo}
+            for future in as_completed(futures):
+                config = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    logging.exception(" > run %s failed" % run_key(config))
+                    continue
+                writer.write(config, result)
+                completed += 1
+                logging.info(" > %d/%d %s" % (completed, len(todo), run_key(config)))
+    finally:
+        writer.close()
+    return completed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a grid of simulation scenarios over many seeds")
+    parser.add_argument('--grid', required=True,
+                        help='JSON object of run_scenario arguments to lists of values, '
+                             'e.g. \'{"grid_shape": [[15, 15], [30, 30]], "agents": [2, 4]}\'')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--output', default='sweep.jsonl', help='result file, .csv or .jsonl')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--profile', action='store_true', help='store the time spent in every phase of the updates')
+    args = parser.parse_args()
+    sweep(json.loads(args.grid), args.seeds, args.output, n_workers=args.workers, profile=args.profile)
@@ -1,6 +1,9 @@
 import unittest
 from libraries.agent_map import AgentMap
 from libraries.token_functions import TokenFunctions
+from libraries.profiler import Profiler
+from libraries.maze import generate_maze
+import numpy as np
 import pyamaze
 import random
 
@@ -17,5 +20,109 @@ class AgentMapTest(unittest.TestCase):
         except Exception:
             self.fail("ERROR: unable to initialize an Agent Map object")
 
+    def test_dictionary_views(self):
+        m = pyamaze.maze(5, 5)
+        m.CreateMaze()
+        interest_map = {point: random.random() * 10 for point in m.grid}
+        agent_map = AgentMap(0, m, interest_map, TokenFunctions())
+        self.assertEqual(sorted(agent_map.known_map.keys()), sorted(m.grid))
+        self.assertEqual(agent_map.maze_map[(1, 1)], {'E': 1, 'W': 1, 'N': 1, 'S': 1})
+        agent_map.observe(m, (1, 1))
+        agent_map.observe(m, (1, 1))
+        self.assertEqual(agent_map.maze_map[(1, 1)], m.maze_map[(1, 1)])
+        self.assertEqual(agent_map.known_map[(1, 1)], 2)
+        self.assertEqual(agent_map.visits[0, 0], 2)
+        self.assertAlmostEqual(agent_map.interest_map[(1, 1)], interest_map[(1, 1)], places=5)
+        self.assertNotIn((0, 1), agent_map.known_map)
+
+    def test_merge(self):
+        m = pyamaze.maze(5, 5)
+        m.CreateMaze()
+        interest_map = {point: random.random() * 10 for point in m.grid}
+        map1 = AgentMap(1, m, interest_map, TokenFunctions())
+        map2 = AgentMap(2, m, interest_map, TokenFunctions())
+        map1.observe(m, (2, 3))
+        map2.observe(m, (4, 4))
+        map2.merge(map1)
+        self.assertEqual(map2.known_map[(2, 3)], 1)
+        self.assertEqual(map2.maze_map[(2, 3)], m.maze_map[(2, 3)])
+        self.assertEqual(map2.known_map[(4, 4)], 1)
+        self.assertEqual(map1.known_map[(4, 4)], 0)
+
+    def test_share_only_sends_changes(self):
+        m = pyamaze.maze(6, 6)
+        m.CreateMaze()
+        interest_map = {point: random.random() * 10 for point in m.grid}
+        maps = [AgentMap(i, m, interest_map, TokenFunctions()) for i in range(3)]
+        reference = [AgentMap(i, m, interest_map, TokenFunctions()) for i in range(3)]
+        random.seed(0)
+        for step in range(200):
+            i = random.randrange(3)
+            if random.random() < 0.7:
+                location = random.choice(m.grid)
+                maps[i].observe(m, location)
+                reference[i].observe(m, location)
+            else:
+                j = random.choice([j for j in range(3) if j != i])
+                maps[i].share(maps[j])
+                reference[j].merge(reference[i])
+            for a, b in zip(maps, reference):
+                self.assertTrue((a.visits == b.visits).all())
+                self.assertTrue((a.walls == b.walls).all())
+        maps[0].share(maps[1])
+        cells, walls, visits = maps[0].export_changes(1)
+        self.assertEqual(len(cells), 0)
+
+    def test_change_log_matches_stamps(self):
+        m = generate_maze(8, 8, np.random.default_rng(1))
+        maps = [AgentMap(i, m, {point: 0 for point in m.grid}, TokenFunctions()) for i in range(3)]
+        rng = np.random.default_rng(2)
+        for step in range(300):
+            i = rng.integers(3)
+            if rng.random() < 0.7:
+                cells = rng.choice(64, size=rng.integers(1, 4), replace=False)
+                maps[i].observe_cells(m, cells // 8 + 1, cells % 8 + 1)
+            else:
+                maps[i].share(maps[(i + rng.integers(1, 3)) % 3])
+            for agent_map in maps:
+                for version in range(agent_map.log_base, agent_map.version + 1):
+                    self.assertEqual(agent_map.changes_since(version).tolist(),
+                                     np.flatnonzero(agent_map.changed > version).tolist())
+                self.assertLessEqual(agent_map.log_size, 16)
+
+    def test_token_map_cache(self):
+        m = generate_maze(6, 8, np.random.default_rng(0))
+        interest_map = {point: random.random() * 10 for point in m.grid}
+        profiler = Profiler()
+        token_fcn = TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 0.9])
+        agent_map = AgentMap(0, m, interest_map, token_fcn, profiler=profiler, token_cache_size=2)
+        agent_map.observe(m, (2, 3))
+        poi = {(2, 3): {'detected': 1, 'verified': 0, 'rejected': 0, 'potential': 0}}
+        calls = lambda name: profiler.stats().by_phase().get('token_map.' + name, {'calls': 0})['calls']
+
+        first = agent_map.token_map(lambda: poi, (3, 2), poi_version=1).array
+        np.testing.assert_array_equal(first, agent_map.token_map(poi, (3, 2)).array)
+        self.assertIs(agent_map.token_map(lambda: poi, (3, 2), poi_version=1).array, first)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual((calls('exploring_area'), calls('distance')), (2, 2))  # the uncached call included
+
+        moved = agent_map.token_map(lambda: self.fail("counters are cached"), (4, 2), poi_version=1).array
+        np.testing.assert_array_equal(moved, agent_map.token_map(poi, (4, 2)).array)
+        self.assertEqual((calls('exploring_area'), calls('distance')), (3, 4))  # only the decay ran again
+
+        agent_map.token_map(poi, (5, 2), poi_version=1)
+        self.assertEqual(len(agent_map.token_cache), 2)  # (3, 2) was evicted
+        agent_map.token_map(poi, (3, 2), poi_version=1)
+        self.assertEqual(calls('distance'), 6)
+
+        # a change of the map, of the counters or of the weights invalidates everything
+        agent_map.observe(m, (1, 1))
+        agent_map.token_map(poi, (3, 2), poi_version=1)
+        agent_map.token_map(poi, (3, 2), poi_version=2)
+        token_fcn.set_weights([1] * 6)
+        agent_map.token_map(poi, (3, 2), poi_version=2)
+        self.assertEqual(calls('exploring_area'), 6)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
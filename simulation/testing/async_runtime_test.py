@@ -0,0 +1,109 @@
+import unittest
+import numpy as np
+from simulation import Simulation
+from async_runtime import AsyncRuntime
+from libraries.message_bus import MessageBus
+from libraries.token_functions import TokenFunctions
+
+
+def simulation(agents=4, communication_range=20):
+    s = Simulation(dimensions=(10, 10), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                   map_mode='field', seed=5, communication_range=communication_range)
+    for j in range(agents):
+        s.add_agent(j + 1, search_depth=2)
+    return s
+
+
+class AsyncRuntimeTest(unittest.TestCase):
+    def assertConverged(self, s):
+        agents = list(s.agents.values())
+        for agent in agents[1:]:
+            self.assertEqual(agent.ledger.points_of_interest(), agents[0].ledger.points_of_interest())
+            self.assertEqual(agent.ledger.version_vector().keys(), agents[0].ledger.version_vector().keys())
+            self.assertTrue(np.array_equal(agent.ledger.map.visits, agents[0].ledger.map.visits))
+            self.assertTrue(np.array_equal(agent.ledger.map.walls, agents[0].ledger.map.walls))
+
+    def test_ideal_bus(self):
+        s = simulation()
+        runtime = AsyncRuntime(s)
+        runtime.run_until(5)
+        self.assertEqual(s.time, 5)
+        self.assertEqual([a.local_time for a in s.agents.values()], [5, 5, 5, 5])
+        self.assertEqual(runtime.bus.stats['sent'], 5 * 4 * 3)
+        self.assertEqual(runtime.bus.stats['delivered'], runtime.bus.stats['sent'])
+        self.assertConverged(s)
+        s.update()  # the simulation carries on synchronously
+        self.assertEqual(s.time, 6)
+
+    def test_schedules_keep_their_phase(self):
+        s = simulation(agents=2)
+        s.add_agent(3, search_depth=2, move_period=2)
+        s.add_agent(4, search_depth=2, move_period=1.5)
+        s.update()
+        AsyncRuntime(s).run_until(5)
+        self.assertEqual([s.agents[id].local_time for id in (3, 4)], [2, 3])
+        self.assertEqual(s.events.next_time(), 6)
+        s.run_until(6)
+        self.assertEqual([a.local_time for a in s.agents.values()], [6, 6, 3, 4])
+
+    def test_latency_and_bandwidth(self):
+        s = simulation()
+        bus = MessageBus(latency=0.002, bandwidth=5e6)
+        AsyncRuntime(s, bus, time_scale=0.001).run_until(4)
+        self.assertEqual(bus.stats['delivered'], bus.stats['sent'])
+        self.assertGreater(bus.stats['bytes'], 0)
+        self.assertConverged(s)
+
+    def test_runs_in_a_row(self):
+        s = simulation()
+        bus = MessageBus(latency=0.001, bandwidth=5e6)
+        runtime = AsyncRuntime(s, bus)
+        runtime.run_until(2)
+        runtime.run_until(4)  # on a new event loop
+        self.assertEqual(s.time, 4)
+        self.assertEqual(bus.stats['delivered'], bus.stats['sent'])
+        self.assertConverged(s)
+
+    def test_lossy_bus(self):
+        s = simulation()
+        bus = MessageBus(drop_rate=1)
+        AsyncRuntime(s, bus).run_until(3)
+        self.assertEqual(bus.stats['dropped'], bus.stats['sent'])
+        for agent in s.agents.values():
+            self.assertEqual(list(agent.ledger.version_vector().keys()), [agent.id])
+        s = simulation()
+        bus = MessageBus(drop_rate=0.5, rng=np.random.default_rng(0))
+        runtime = AsyncRuntime(s, bus)
+        runtime.run_until(12)
+        self.assertGreater(bus.stats['dropped'], 0)
+        self.assertEqual(bus.stats['dropped'] + bus.stats['delivered'], bus.stats['sent'])
+        bus.drop_rate = 0  # what was lost is sent again, until nothing is missing
+        runtime.run_until(14)
+        self.assertConverged(s)
+        with self.assertRaises(ValueError):
+            MessageBus(drop_rate=2)
+
+    def test_dropped_map_changes_are_sent_again(self):
+        s = simulation(agents=2)
+        sender, recipient = s.agents[1], s.agents[2]
+        for _ in range(3):
+            sender.step()
+        sender.gossip(2)  # dropped
+        for _ in range(3):
+            sender.step()
+        recipient.deliver(sender.gossip(2))
+        for _ in range(2):
+            sender.deliver(recipient.gossip(1))
+            recipient.deliver(sender.gossip(2))
+        self.assertTrue(np.all(recipient.ledger.map.visits[sender.ledger.map.visits > 0] > 0))
+
+    def test_many_agents(self):
+        s = simulation(agents=100, communication_range=1)
+        bus = MessageBus()
+        AsyncRuntime(s, bus).run_until(2)
+        self.assertEqual([a.local_time for a in s.agents.values()], [2] * 100)
+        self.assertEqual(bus.stats['delivered'], bus.stats['sent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from simulation import Simulation
+from batch_simulation import BatchSimulation
+from libraries.token_functions import TokenFunctions
+from benchmark import coverage_metric, poi_metric
+
+
+class BatchSimulationTest(unittest.TestCase):
+    def test_same_runs_as_simulation(self):
+        rng = np.random.default_rng(0)
+        seeds = [3, 4, 5]
+        weights = [rng.random(6).tolist() for _ in seeds]
+        for map_mode in ('field', 'maze'):
+            batch = BatchSimulation((9, 11), weights, seeds, agents=3, search_depth=2, map_mode=map_mode, loops=20)
+            batch.run(8)
+            coverage, poi = batch.coverage_metric(), batch.poi_metric()
+            for k, (seed, w) in enumerate(zip(seeds, weights)):
+                s = Simulation((9, 11), TokenFunctions(w), loops=20, enable_keys=False, map_mode=map_mode, seed=seed)
+                for j in range(3):
+                    s.add_agent(j + 1, search_depth=2, planner='optimal')
+                for _ in range(8):
+                    s.update()
+                self.assertEqual([tuple(a.agent.position) for a in s.agents.values()],
+                                 [tuple(p) for p in batch.positions[k].tolist()])
+                self.assertEqual(coverage_metric(s), coverage[k])
+                self.assertEqual(poi_metric(s), poi[k])
+
+
+if __name__ == '__main__':
+    unittest.main()
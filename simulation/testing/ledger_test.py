@@ -1,6 +1,7 @@
 import unittest
+import tempfile
 import numpy as np
-from libraries.ledger import Ledger
+from libraries.ledger import Ledger, EventType, agent_code, split_block_id, chain_digest
 
 
 class LedgerTest(unittest.TestCase):
@@ -22,6 +23,149 @@ class LedgerTest(unittest.TestCase):
         preceding_blocks = ledger2.ledger[ledger2.current_block][2]
         self.assertEqual(len(preceding_blocks), 2)
 
+    def test_points_of_interest_index(self):
+        ledger1 = Ledger('ledger1', None, lambda x, y: x)
+        ledger2 = Ledger('ledger2', None, lambda x, y: x)
+        ledger1.add_block(ledger1.current_block, "Detected point of interest at (1, 2)",
+                          {'point': (1, 2), 'observer': 'ledger1', 'time': 0, 'value': 9.5})
+        ledger2.add_block(ledger2.current_block, "Detected potential point of interest at (1, 2)",
+                          {'point': (1, 2), 'observer': 'ledger2', 'time': 0, 'value': 8.5})
+        ledger2.add_block(ledger2.current_block, "Didn't detect point of interest at (3, 3)",
+                          {'point': (3, 3), 'observer': 'ledger2', 'time': 0, 'value': 1.0})
+        ledger2.receive(ledger1, time=1)
+        ledger2.receive(ledger1, time=2)  # receiving known blocks again doesn't count them twice
+        self.assertEqual(ledger2.points_of_interest(),
+                         {(1, 2): {'detected': 1, 'verified': 0, 'rejected': 0, 'potential': 1},
+                          (3, 3): {'detected': 0, 'verified': 0, 'rejected': 1, 'potential': 0}})
+        self.assertEqual(ledger2.points_of_interest(observer_to_skip='ledger2'),
+                         {(1, 2): {'detected': 1, 'verified': 0, 'rejected': 0, 'potential': 0},
+                          (3, 3): {'detected': 0, 'verified': 0, 'rejected': 1, 'potential': 0}})
+        self.assertEqual(ledger2.points_of_interest(observer_to_skip='ledger1'),
+                         {(1, 2): {'detected': 0, 'verified': 0, 'rejected': 0, 'potential': 1},
+                          (3, 3): {'detected': 0, 'verified': 0, 'rejected': 1, 'potential': 0}})
+        self.assertTrue(ledger2.is_detected_by_others((1, 2), 'ledger2'))
+        self.assertFalse(ledger1.is_detected_by_others((1, 2), 'ledger1'))
+
+    def test_delta_synchronization(self):
+        ledger1 = Ledger('ledger1', None, lambda x, y: x)
+        ledger2 = Ledger('ledger2', None, lambda x, y: x)
+        ledger3 = Ledger('ledger3', None, lambda x, y: x, sync_mode='full')
+        ledger1.add_block(ledger1.current_block, "Detected point of interest at (1, 2)",
+                          {'point': (1, 2), 'observer': 'ledger1', 'time': 0, 'value': 9.5})
+        ledger2.receive(ledger1, time=1)
+        self.assertEqual(ledger2.last_exchange['blocks'], 2)
+        self.assertGreater(ledger2.last_exchange['bytes'], 0)
+        ledger2.receive(ledger1, time=2)
+        self.assertEqual(ledger2.last_exchange, {'blocks': 0, 'bytes': 0})
+        self.assertEqual(ledger2.version_vector(), {'ledger2': 3, 'ledger1': 2})
+        ledger3.receive(ledger2, time=3)  # ledger1's blocks are passed on by ledger2
+        own_blocks = set(ledger3.block_ids('ledger3'))
+        self.assertEqual(set(ledger3.ledger.keys()) - set(ledger2.ledger.keys()), own_blocks)
+        ledger3.receive(ledger2, time=4)  # the full mode sends everything again
+        self.assertEqual(ledger3.last_exchange['blocks'], 5)
+        self.assertEqual(ledger3.sync_stats['contacts'], 2)
+        self.assertEqual(ledger3.points_of_interest()[(1, 2)]['detected'], 1)
+
+    def test_typed_blocks(self):
+        ledger1 = Ledger(1, None, lambda x, y: x)
+        ledger2 = Ledger('ledger2', None, lambda x, y: x)
+        first = ledger1.record(EventType.DETECTED, (1, 2), time=3, value=9.5)
+        ledger1.record(EventType.POTENTIAL, (2, 2), time=4, value=8.5)
+        ledger2.record(EventType.REJECTED, (1, 2), time=1, value=1.0)
+        ledger2.receive(ledger1, time=5)
+        self.assertEqual(split_block_id(first), (1, 1))  # second block of agent 1
+        self.assertEqual(split_block_id(ledger2.current_block), (agent_code('ledger2'), 2))
+        detected = ledger2.blocks(EventType.DETECTED)
+        self.assertEqual(len(detected), 1)
+        self.assertEqual((detected['row'][0], detected['col'][0], detected['time'][0]), (1, 2, 3))
+        self.assertEqual(len(ledger2.blocks()), 6)
+        self.assertEqual(len(ledger2.ledger), 6)
+        self.assertEqual(ledger2.ledger[first], ("Detected point of interest at (1, 2)",
+                                                 {'point': (1, 2), 'observer': 1, 'time': 3, 'value': 9.5}, [1 << 32]))
+        self.assertEqual(ledger2.ledger[ledger2.current_block][1], {'broadcaster': 1, 'time': 5})
+        self.assertEqual(ledger2.points_of_interest(observer_to_skip=1),
+                         {(1, 2): {'detected': 0, 'verified': 0, 'rejected': 1, 'potential': 0}})
+        with self.assertRaises(ValueError):
+            ledger1.add_block(ledger1.current_block, "Free text")
+
+    def test_record_many(self):
+        ledger1 = Ledger(1, None, lambda x, y: x)
+        ledger2 = Ledger(1, None, lambda x, y: x)
+        events = np.array([EventType.DETECTED, EventType.POTENTIAL, EventType.DETECTED, EventType.REJECTED])
+        rows, cols, values = np.array([1, 2, 1, 4]), np.array([2, 2, 2, 1]), np.array([9.5, 8.5, 9.0, 1.0])
+        ids = ledger1.record_many(events, rows, cols, time=3, values=values)
+        for event, row, col, value in zip(events.tolist(), rows.tolist(), cols.tolist(), values.tolist()):
+            ledger2.record(EventType(event), (row, col), time=3, value=value)
+        self.assertEqual([split_block_id(id) for id in ids.tolist()], [(1, 1), (1, 2), (1, 3), (1, 4)])
+        self.assertEqual(str(ledger1.blocks()), str(ledger2.blocks()))  # the mission start value is NaN
+        self.assertEqual(ledger1.points_of_interest(), ledger2.points_of_interest())
+        self.assertEqual(len(ledger1.record_many(events[:0], rows[:0], cols[:0])), 0)
+        self.assertEqual(ledger2.detected_by_others(rows, cols, 2).tolist(), [True, True, True, False])
+        self.assertEqual(ledger2.detected_by_others(rows, cols, 1).tolist(), [False] * 4)
+
+    def test_compaction(self):
+        random = np.random.default_rng(3)
+        names = ['ledger1', 'ledger2', 'ledger3']
+        full = [Ledger(name, None, lambda x, y: x) for name in names]
+        compacted = [Ledger(name, None, lambda x, y: x, max_blocks=8) for name in names]
+        compacted[2].sync_mode = full[2].sync_mode = 'full'
+        rows, cols = (axis.ravel() + 1 for axis in np.indices((4, 4)))
+        for time in range(200):
+            i, j = random.choice(3, size=2, replace=False)
+            if random.random() < 0.3:
+                full[i].receive(full[j], time)
+                compacted[i].receive(compacted[j], time)
+            else:
+                event = EventType(random.integers(EventType.DETECTED, EventType.REJECTED + 1))
+                point = tuple(random.integers(1, 4, size=2).tolist())
+                full[i].record(event, point, time=time)
+                compacted[i].record(event, point, time=time)
+            for a, b, name in zip(full, compacted, names):
+                self.assertEqual(a.points_of_interest(observer_to_skip=name),
+                                 b.points_of_interest(observer_to_skip=name))
+                self.assertEqual(a.version_vector(), b.version_vector())
+                self.assertLessEqual(len(b), 8)
+                self.assertEqual(b.detected_by_others(rows, cols, name).tolist(),
+                                 [b.is_detected_by_others(point, name) for point in zip(rows.tolist(), cols.tolist())])
+                self.assertIn(b.current_block, b.ledger)
+                self.assertEqual(str(b.block(b.current_block)), str(a.block(a.current_block)))
+        self.assertGreater(len(full[0]), 100)
+        # folded histories agree block for block
+        store = compacted[0].stores[agent_code('ledger1')]
+        self.assertEqual(store.checkpoint.digest,
+                         chain_digest(b'', full[0].stores[agent_code('ledger1')].records[:store.checkpoint.count]))
+
+    def test_spill_and_divergent_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ledger1 = Ledger('ledger1', None, lambda x, y: x, max_blocks=4, spill_directory=directory)
+            for time in range(10):
+                ledger1.record(EventType.DETECTED, (1, time), time=time)
+            # the mission start block and 8 detections were folded, in two compactions down to 2 blocks
+            self.assertEqual(len(ledger1), 2)
+            spilled = ledger1.spilled_blocks('ledger1')
+            self.assertEqual(spilled[spilled['type'] == EventType.DETECTED]['col'].tolist(), list(range(8)))
+            self.assertEqual(ledger1.points_of_interest()[(1, 0)]['detected'], 1)
+            # the current block is folded, but still readable
+            self.assertEqual(ledger1.ledger[ledger1.current_block][0], 'Mission start')
+        ledger2 = Ledger('ledger2', None, lambda x, y: x)
+        ledger2.apply_delta(ledger1.delta({}))
+        self.assertEqual(ledger2.points_of_interest(), ledger1.points_of_interest())
+        # another history of the same length
+        impostor = Ledger('ledger1', None, lambda x, y: x, max_blocks=4)
+        for time in range(10):
+            impostor.record(EventType.REJECTED, (1, time), time=time)
+        with self.assertRaises(ValueError):
+            ledger2.apply_delta(impostor.delta({}))
+
+    def test_isolated_ledger_is_bounded(self):
+        ledger = Ledger('ledger1', None, lambda x, y: x, max_blocks=8)
+        for time in range(1000):
+            ledger.record(EventType.DETECTED, (time % 7, time % 5), time=time)
+            self.assertLessEqual(len(ledger), 8)
+        self.assertEqual(sum(counters['detected'] for counters in ledger.points_of_interest().values()), 1000)
+        self.assertIn(ledger.current_block, ledger.ledger)
+        ledger.receive(Ledger('ledger2', None, lambda x, y: x), 1000)
+        self.assertEqual(ledger.ledger[ledger.current_block][0], 'Broadcast received')
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from collections import deque
+import numpy as np
+from libraries.maze import generate_maze, field, Cells
+from libraries.grid import DIRECTIONS
+
+STEPS = {'E': (0, 1), 'W': (0, -1), 'N': (-1, 0), 'S': (1, 0)}
+
+
+def reachable(maze) -> set:
+    seen = {(1, 1)}
+    frontier = deque([(1, 1)])
+    while frontier:
+        row, col = frontier.popleft()
+        cell = maze.maze_map[(row, col)]
+        for d in DIRECTIONS:
+            neighbour = (row + STEPS[d][0], col + STEPS[d][1])
+            if cell[d] and neighbour not in seen:
+                seen.add(neighbour)
+                frontier.append(neighbour)
+    return seen
+
+
+def passages(walls) -> int:
+    return int(np.count_nonzero((walls[:, :-1] & 1) == 0) + np.count_nonzero((walls[:-1, :] & 8) == 0))
+
+
+class MazeTest(unittest.TestCase):
+    def test_perfect_maze(self):
+        m = generate_maze(12, 17, np.random.default_rng(0))
+        self.assertEqual((m.rows, m.cols), (12, 17))
+        self.assertEqual(len(reachable(m)), 12 * 17)
+        self.assertEqual(passages(m.walls), 12 * 17 - 1)  # a spanning tree of the cells
+
+    def test_walls_are_consistent(self):
+        m = generate_maze(10, 9, np.random.default_rng(1), loop_percent=50)
+        for row, col in m.grid:
+            cell = m.maze_map[(row, col)]
+            for d in DIRECTIONS:
+                neighbour = (row + STEPS[d][0], col + STEPS[d][1])
+                if neighbour in m.grid:
+                    opposite = {'E': 'W', 'W': 'E', 'N': 'S', 'S': 'N'}[d]
+                    self.assertEqual(cell[d], m.maze_map[neighbour][opposite])
+                else:
+                    self.assertEqual(cell[d], 0)  # closed along the border
+        self.assertGreater(passages(m.walls), 10 * 9 - 1)
+
+    def test_seed(self):
+        a = generate_maze(8, 8, np.random.default_rng(3), loop_percent=10)
+        b = generate_maze(8, 8, np.random.default_rng(3), loop_percent=10)
+        self.assertTrue((a.walls == b.walls).all())
+
+    def test_field(self):
+        m = field(3, 4)
+        self.assertEqual(m.maze_map[(2, 2)], {'E': 1, 'W': 1, 'N': 1, 'S': 1})
+        self.assertEqual(m.maze_map[(1, 4)], {'E': 0, 'W': 1, 'N': 0, 'S': 1})
+
+    def test_cells_order(self):
+        cells = Cells(2, 3)
+        self.assertEqual(list(cells), [(1, 1), (2, 1), (1, 2), (2, 2), (1, 3), (2, 3)])
+        self.assertEqual([cells[i] for i in range(len(cells))], list(cells))
+        self.assertIn((2, 3), cells)
+        self.assertNotIn((3, 1), cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
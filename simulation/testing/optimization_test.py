@@ -0,0 +1,150 @@
+import unittest
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from optimization import genetic_algorithm, decode, evaluate_population
+from fitness_cache import FitnessCache, cache_key
+
+
+def noisy_objective(metric, weights):
+    """ Objective depending on the random generators, to check the seeding of evaluations """
+    return sum((w - 0.3)**2 for w in weights) + random.random() * 0.01 + np.random.rand() * 0.01
+
+
+CALLS = []
+
+
+def interrupted_objective(metric, weights, calls, limit):
+    """ noisy_objective, interrupted as if by the user at the call number limit """
+    calls[0] += 1
+    if calls[0] > limit:
+        raise KeyboardInterrupt
+    return noisy_objective(metric, weights)
+
+
+def counting_objective(metric, weights, offset=0):
+    CALLS.append(weights)
+    return sum(weights) + offset
+
+
+BATCHES = []
+
+
+def batch_objective(metric, population):
+    BATCHES.append(len(population))
+    return [sum(weights) for weights in population]
+
+
+def failing_objective(metric, weights):
+    if weights[0] > 0.5:
+        raise RuntimeError("simulation failed")
+    return sum(weights)
+
+
+def crashing_objective(metric, weights):
+    """ Objective killing the worker evaluating it, as a segmentation fault in a simulation would """
+    if weights[0] > 0.5:
+        os._exit(1)
+    time.sleep(0.1)  # still running when the other worker dies
+    return sum(weights)
+
+
+class OptimizationTest(unittest.TestCase):
+    def test_decode(self):
+        self.assertEqual(decode([[0, 1], [0, 2]], 2, [0, 1, 1, 0]), [0.25, 1.0])
+
+    def test_parallel_evaluation_is_reproducible(self):
+        results = []
+        for n_workers in (1, 3):
+            np.random.seed(0)
+            results.append(genetic_algorithm(noisy_objective, None, [[0, 1]] * 3, 6, 3, 6, 0.8, 0.1, 3,
+                                             n_workers=n_workers, seed=5))
+        self.assertEqual(results[0], results[1])
+
+    def test_failures_are_isolated(self):
+        np.random.seed(0)
+        best, score = genetic_algorithm(failing_objective, None, [[0, 1]] * 2, 4, 2, 6, 0.8, 0.1, 3, n_workers=2,
+                                        seed=1)
+        self.assertLess(score, float('inf'))
+
+    def test_crashes_are_isolated(self):
+        candidates = [[0.1, 0.2], [0.3, 0.1], [0.9, 0.1], [0.2, 0.2], [0.4, 0.4]]
+        pool = {'workers': 2, 'executor': ProcessPoolExecutor(max_workers=2)}
+        try:
+            scores = evaluate_population([(crashing_objective, None, c, 0) for c in candidates], pool)
+            self.assertEqual(scores[2], float('inf'))
+            for candidate, score in zip(candidates, scores):
+                if candidate[0] <= 0.5:
+                    self.assertEqual(score, sum(candidate))
+            # the pool was replaced by a working one
+            self.assertEqual(pool['executor'].submit(sum, [1, 2]).result(), 3)
+        finally:
+            pool['executor'].shutdown()
+
+    def test_batch_objective(self):
+        BATCHES.clear()
+        np.random.seed(0)
+        best, score = genetic_algorithm(batch_objective, None, [[0, 1]] * 2, 4, 3, 6, 0.8, 0.1, 3, batch=True)
+        self.assertEqual(len(BATCHES), 3)  # one call per generation, with the distinct candidates of the population
+        self.assertEqual(BATCHES[0], 6)
+        self.assertEqual(score, sum(decode([[0, 1]] * 2, 4, best)))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            calls = CALLS
+            calls.clear()
+            objective = partial(counting_objective, offset=1)
+            cache = FitnessCache(path)
+            np.random.seed(0)
+            first = genetic_algorithm(objective, None, [[0, 1]] * 2, 2, 4, 8, 0.8, 0.1, 3, seed=1, cache=cache)
+            cache.close()
+            distinct = {tuple(weights) for weights in calls}
+            self.assertEqual(len(calls), len(distinct))  # every candidate is evaluated once
+            calls.clear()
+            cache = FitnessCache(path, max_entries=2)
+            np.random.seed(0)
+            second = genetic_algorithm(objective, None, [[0, 1]] * 2, 2, 4, 8, 0.8, 0.1, 3, seed=1, cache=cache)
+            cache.close()
+            self.assertEqual(calls, [])  # the second run is answered from disk
+            self.assertEqual(first, second)
+        self.assertNotEqual(cache_key(partial(counting_objective, offset=1), None, [0.5]),
+                            cache_key(partial(counting_objective, offset=2), None, [0.5]))
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            np.random.seed(0)
+            expected = genetic_algorithm(noisy_objective, None, [[0, 1]] * 3, 6, 4, 6, 0.8, 0.1, 3, seed=5)
+            checkpoint = os.path.join(directory, 'ga.checkpoint')
+            np.random.seed(0)
+            with self.assertRaises(KeyboardInterrupt):  # interrupted in the third generation
+                genetic_algorithm(partial(interrupted_objective, calls=[0], limit=15), None, [[0, 1]] * 3, 6, 4, 6,
+                                  0.8, 0.1, 3, seed=5, checkpoint=checkpoint)
+            self.assertTrue(os.path.exists(checkpoint))
+            np.random.seed(123)
+            resumed = genetic_algorithm(partial(interrupted_objective, calls=[0], limit=15), None, [[0, 1]] * 3, 6,
+                                        4, 6, 0.8, 0.1, 3, checkpoint=checkpoint)
+            self.assertEqual(resumed, expected)
+            self.assertFalse(os.path.exists(checkpoint))  # a completed run leaves nothing to resume
+
+    def test_stale_checkpoint_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'ga.checkpoint')
+            np.random.seed(0)
+            with self.assertRaises(KeyboardInterrupt):  # leaves a checkpoint of a run on 2 variables
+                genetic_algorithm(partial(interrupted_objective, calls=[0], limit=8), None, [[0, 1]] * 2, 6, 4, 6,
+                                  0.8, 0.1, 3, seed=5, checkpoint=checkpoint)
+            np.random.seed(1)
+            expected = genetic_algorithm(noisy_objective, None, [[0, 1]] * 3, 6, 3, 6, 0.8, 0.1, 3, seed=5)
+            np.random.seed(1)
+            result = genetic_algorithm(noisy_objective, None, [[0, 1]] * 3, 6, 3, 6, 0.8, 0.1, 3, seed=5,
+                                       checkpoint=checkpoint)
+            self.assertEqual(result, expected)
+            self.assertFalse(os.path.exists(checkpoint))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from performance import measure, compare, CASES
+
+
+class PerformanceTest(unittest.TestCase):
+    def test_measure(self):
+        results = measure('points_of_interest', [10, 100], min_time=0)
+        self.assertEqual(set(results.keys()), {'10', '100'})
+        self.assertGreaterEqual(results['100']['runs'], 3)
+        self.assertLessEqual(results['100']['seconds'], results['100']['median'])
+
+    def test_updates_are_timed_from_the_same_state(self):
+        setup = CASES['update_agents'][0](4)
+        first, second = setup(), setup()
+        first()
+        second()
+        self.assertEqual(first.__self__.time, second.__self__.time)
+        self.assertEqual({id: a.agent.position for id, a in first.__self__.agents.items()},
+                         {id: a.agent.position for id, a in second.__self__.agents.items()})
+
+    def test_compare(self):
+        baseline = {'results': {'receive': {'10': {'seconds': 1.0}, '100': {'seconds': 1.0}, '1000': {'seconds': 1.0}}}}
+        current = {'results': {'receive': {'10': {'seconds': 1.1}, '100': {'seconds': 1.5}, '1000': {'seconds': 0.5}},
+                               'broadcast': {'4': {'seconds': 1.0}}}}
+        rows = compare(current, baseline, tolerance=0.25)
+        self.assertEqual([(row[1], row[-1]) for row in rows],
+                         [('10', 'ok'), ('100', 'regression'), ('1000', 'improvement')])
+
+
+if __name__ == '__main__':
+    unittest.main()
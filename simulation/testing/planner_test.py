@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+import pyamaze
+from libraries.agent import Agent
+from libraries.grid import GridView
+from libraries.planner import RecursivePlanner, DynamicProgrammingPlanner, score_path, best_first_moves, MOVES
+from libraries.token_functions import TokenFunctions
+
+
+class PlannerTest(unittest.TestCase):
+    def make_agent(self, rng, rows, cols):
+        m = pyamaze.maze(rows, cols)
+        m.CreateMaze()
+        interest_map = {point: 0 for point in m.grid}
+        agent = Agent(1, pyamaze.agent(m), m, interest_map, lambda x, y: x, TokenFunctions())
+        agent.agent.position = (int(rng.integers(1, cols + 1)), int(rng.integers(1, rows + 1)))
+        # random known walls, so that blocked moves and border moves both occur
+        known = rng.random((rows, cols)) < 0.5
+        agent.ledger.map.walls[known] = rng.integers(0, 16, known.sum())
+        return agent
+
+    def test_equivalence_with_recursion(self):
+        rng = np.random.default_rng(1)
+        for trial in range(40):
+            agent = self.make_agent(rng, 6, 8)
+            tokens = rng.random((6, 8)) - 0.3
+            if trial % 2:
+                tokens = np.round(tokens, 1)  # many equally good paths
+            n, m = int(rng.integers(1, 4)), int(rng.integers(1, 4))
+            expected = RecursivePlanner(n=n, m=m).plan(agent, GridView(tokens))
+            self.assertEqual(DynamicProgrammingPlanner(n=n, m=m, mode='equivalent').plan(agent, GridView(tokens)),
+                             expected)
+
+    def test_optimal_path(self):
+        rng = np.random.default_rng(2)
+        for trial in range(40):
+            agent = self.make_agent(rng, 6, 8)
+            tokens = rng.random((6, 8)) - 0.3
+            walls = agent.ledger.map.walls
+            start = (agent.agent.position[1], agent.agent.position[0])
+            n, m = int(rng.integers(1, 4)), int(rng.integers(1, 3))
+            recursive = RecursivePlanner(n=n, m=m).plan(agent, GridView(tokens))
+            optimal = DynamicProgrammingPlanner(n=n, m=m, mode='optimal').plan(agent, GridView(tokens))
+            if recursive != '':
+                self.assertEqual(len(optimal), n * m)
+                self.assertGreaterEqual(score_path(walls, tokens, start, optimal),
+                                        score_path(walls, tokens, start, recursive) - 1e-9)
+
+    def test_batch_first_moves(self):
+        rng = np.random.default_rng(3)
+        for trial in range(20):
+            agents = [self.make_agent(rng, 5, 7) for _ in range(4)]
+            walls = np.stack([agent.ledger.map.walls for agent in agents])
+            tokens = np.round(rng.random((4, 5, 7)), 1)
+            starts = np.array([(agent.agent.position[1], agent.agent.position[0]) for agent in agents])
+            horizon = int(rng.integers(1, 7))
+            moves = best_first_moves(walls, tokens, starts, horizon)
+            for k in range(4):
+                path = DynamicProgrammingPlanner.optimal_path(walls[k], tokens[k], tuple(starts[k]), horizon)
+                self.assertEqual(MOVES[moves[k]][0] if moves[k] >= 0 else '', path[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import json
+import os
+import tempfile
+from simulation import Simulation
+from libraries.profiler import Profiler, NULL_PROFILER
+from libraries.token_functions import TokenFunctions
+
+
+def simulate(profiler=None):
+    s = Simulation(dimensions=(10, 10), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                   map_mode='field', seed=3, profiler=profiler)
+    for j in range(2):
+        s.add_agent(j + 1, search_depth=2)
+    for k in range(4):
+        s.update()
+    return s
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_phases(self):
+        profiler = Profiler()
+        profiled = simulate(profiler)
+        self.assertEqual([a.agent.position for a in profiled.agents.values()],
+                         [a.agent.position for a in simulate().agents.values()])
+        stats = profiler.stats()
+        phases = stats.by_phase()
+        self.assertEqual(phases['tick']['calls'], 4)
+        self.assertEqual(phases['update']['calls'], 8)
+        self.assertEqual(phases['observe']['calls'], 8)
+        self.assertGreaterEqual(phases['planner']['calls'], 8)
+        self.assertEqual(phases['planner']['calls'], phases['token_map.exploring_area']['calls'])
+        self.assertEqual(phases['broadcast']['calls'], 8)
+        self.assertEqual(phases['receive']['calls'], phases['map_merge']['calls'])
+        self.assertGreater(phases['tick']['seconds'], phases['planner']['seconds'])
+        self.assertEqual(set(stats.by_agent().keys()), {None, 1, 2})
+        self.assertEqual(stats.by_agent()[1]['update']['calls'], 4)
+        self.assertEqual(set(stats.by_tick().keys()), {0, 1, 2, 3})
+        self.assertEqual(stats.by_tick()[2]['update']['calls'], 2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            stats.to_json(path)
+            with open(path) as f:
+                exported = json.load(f)
+        self.assertEqual(exported['agents']['1']['update']['calls'], 4)
+        self.assertEqual(exported['phases']['tick'], phases['tick'])
+
+    def test_disabled(self):
+        s = simulate()
+        self.assertIs(s.profiler, NULL_PROFILER)
+        self.assertEqual(len(s.profiler.stats()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
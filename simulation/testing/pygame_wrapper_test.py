@@ -1,5 +1,10 @@
 import unittest
-from libraries.pygame_wrapper import calculate_GUI_scale
+import numpy as np
+from libraries.pygame_wrapper import calculate_GUI_scale, draw_cell_walls, wall_pixels, heatmap_colors, Renderer
+from libraries.maze import generate_maze
+from libraries.token_functions import TokenFunctions
+from simulation import Simulation
+from simulation_worker import Snapshot
 import pygame
 
 
@@ -11,6 +16,44 @@ class PygameWrapperTest(unittest.TestCase):
         self.assertEqual(55, g_size)
         self.assertEqual((32, 25), offset)
 
+    def test_wall_pixels(self):
+        m = generate_maze(6, 9, np.random.default_rng(0), loop_percent=30)
+        settings = {'color': (255, 255, 255), 'offset': (0, 0), 'g_size': 7}
+        surface = pygame.Surface((9 * 7 + 1, 6 * 7 + 1))
+        for cell in m.grid:
+            draw_cell_walls(surface, cell, m.maze_map[cell], settings)
+        drawn = pygame.surfarray.array3d(surface)[..., 0].T > 0
+        np.testing.assert_array_equal(wall_pixels(m.walls, 7), drawn)
+
+    def test_heatmap_colors(self):
+        tokens = np.random.default_rng(1).random((4, 5)) * 3 - 1
+        colors = heatmap_colors(tokens)
+        for (row, col), t in np.ndenumerate(tokens):
+            v = (t - tokens.min()) / (tokens.max() - tokens.min() + 0.01)
+            self.assertEqual(tuple(colors[row, col]), (int(255 * v), 0, int(255 * (1 - v))))
+
+    def test_renderer_redraws_changes_only(self):
+        pygame.init()
+        screen = pygame.display.set_mode((400, 300))
+        s = Simulation(dimensions=(8, 12), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                       seed=2)
+        s.add_agent(1, search_depth=2)
+        settings = {'margin': 20, 'color': pygame.Color(255, 255, 255), 'color_active': pygame.Color(50, 255, 255),
+                    'unknown_color': pygame.Color(30, 30, 30), 'grid_shape': (8, 12), 'GUI_bar': 100}
+        renderer = Renderer(settings)
+        snapshot = Snapshot.capture(s, 0)
+        self.assertEqual(renderer.draw(screen, snapshot, 0, False), [screen.get_rect()])
+        self.assertEqual(renderer.draw(screen, snapshot, 0, False), [])
+        walls = renderer.layers['walls'][2]
+        s.update()
+        self.assertEqual(renderer.draw(screen, Snapshot.capture(s, 1), 0, False), [renderer.maze_rect()])
+        self.assertIs(renderer.layers['walls'][2], walls)  # the ground truth didn't change
+        self.assertEqual(renderer.draw(screen, Snapshot.capture(s, 1), 0, False, playing=True),
+                         [renderer.maze_rect(), renderer.gui_rect(screen)])  # a new snapshot, and the play state
+        self.assertEqual(len(renderer.draw(screen, Snapshot.capture(s, 1, 1, tokens=True), 1, True)), 2)
+        self.assertIn('tokens', renderer.layers)
+        self.assertIsNot(renderer.layers['walls'][2], walls)
+
 
 if __name__ == '__main__':
     unittest.main()
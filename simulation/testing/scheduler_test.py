@@ -0,0 +1,72 @@
+import unittest
+from simulation import Simulation
+from libraries.profiler import Profiler
+from libraries.scheduler import EventQueue, Action
+from libraries.token_functions import TokenFunctions
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_event_order(self):
+        events = EventQueue()
+        events.add('slow', (2, 4, None))
+        events.add('fast', (0.5, 1, 1))
+        popped = list(events.pop_due(2))
+        self.assertEqual(popped[:4], [(0.5, 'fast', Action.MOVE), (1, 'fast', Action.MOVE), (1, 'fast', Action.PLAN),
+                                      (1, 'fast', Action.BROADCAST)])
+        self.assertEqual(popped[-4:], [(2, 'slow', Action.MOVE), (2, 'fast', Action.MOVE), (2, 'fast', Action.PLAN),
+                                       (2, 'fast', Action.BROADCAST)])
+        self.assertEqual(len(popped), 9)
+        self.assertEqual(events.next_time(), 2.5)
+        self.assertEqual(len(events), 5)  # the slow agent never broadcasts
+        with self.assertRaises(ValueError):
+            events.add('fast', (1, 1, 1))
+        with self.assertRaises(ValueError):
+            events.add('stuck', (0, 1, 1))
+        self.assertIsNone(EventQueue().next_time())
+
+    def test_split_and_join(self):
+        events = EventQueue()
+        events.add('slow', (2, 4, None))
+        events.add('fast', (0.5, 1, 1))
+        list(events.pop_due(1))
+        queues = events.split()
+        self.assertEqual(list(queues['slow'].pop_due(4)), [(2, 'slow', Action.MOVE), (4, 'slow', Action.MOVE),
+                                                           (4, 'slow', Action.PLAN)])
+        joined = EventQueue.join(queues.values())
+        self.assertEqual(list(joined.pop_due(2)), [(1.5, 'fast', Action.MOVE), (2, 'fast', Action.MOVE),
+                                                   (2, 'fast', Action.PLAN), (2, 'fast', Action.BROADCAST)])
+        self.assertEqual(joined.next_time(), 2.5)
+        self.assertEqual(sorted(entry[0] for entry in joined.heap if entry[3] == 'slow'), [6, 8])
+
+    def test_mixed_fleet(self):
+        profiler = Profiler()
+        s = Simulation(dimensions=(12, 12), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                       map_mode='field', seed=4, profiler=profiler)
+        s.add_agent(1, search_depth=2)
+        s.add_agent(2, search_depth=2, move_period=0.5, plan_period=4)
+        s.add_agent(3, search_depth=2, move_period=2, broadcast_period=None)
+        s.run_until(8)
+        self.assertEqual(s.time, 8)
+        self.assertEqual([s.agents[id].local_time for id in (1, 2, 3)], [8, 16, 4])
+        by_agent = profiler.stats().by_agent()
+        self.assertEqual(by_agent[1]['broadcast']['calls'], 8)
+        self.assertEqual(by_agent[2]['broadcast']['calls'], 8)
+        self.assertNotIn('broadcast', by_agent[3])
+        self.assertLess(by_agent[2]['planner']['calls'], by_agent[1]['planner']['calls'])
+        self.assertEqual(len(profiler.stats().by_tick()), 16)  # only the times with events due
+
+    def test_default_schedule(self):
+        s = Simulation(dimensions=(8, 8), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                       map_mode='field', seed=1)
+        s.update()  # nothing to do without agents
+        self.assertEqual(s.time, 0)
+        for j in range(3):
+            s.add_agent(j + 1, search_depth=2)
+        for k in range(3):
+            s.update()
+        self.assertEqual(s.time, 3)
+        self.assertEqual([a.local_time for a in s.agents.values()], [3, 3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import random
+import numpy as np
+from simulation import Simulation
+from libraries.agent import uniform_draws
+from libraries.sensor import Sensor, stencil
+from libraries.token_functions import TokenFunctions
+
+
+class SensorTest(unittest.TestCase):
+    def test_stencils(self):
+        self.assertEqual(stencil('square', 1).tolist(), [[i, j] for i in (-1, 0, 1) for j in (-1, 0, 1)])
+        self.assertEqual(stencil('square', 0).tolist(), [[0, 0]])
+        self.assertEqual(len(stencil('square', 2)), 25)
+        self.assertEqual(len(stencil('diamond', 2)), 13)
+        self.assertEqual(len(stencil('disc', 2)), 13)
+        self.assertEqual(len(stencil('disc', 3)), 29)
+        self.assertFalse(stencil('disc', 3).flags.writeable)
+        with self.assertRaises(ValueError):
+            stencil('hexagon', 1)
+        with self.assertRaises(ValueError):
+            stencil('square', -1)
+
+    def test_cells_are_clipped(self):
+        sensor = Sensor('diamond', 2)
+        rows, cols = sensor.cells((3, 3), (5, 6))  # agent position is (col, row)
+        self.assertEqual(len(rows), 13)
+        rows, cols = sensor.cells((1, 1), (5, 6))
+        self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())), [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (3, 1)])
+        rows, cols = sensor.cells((6, 2), (5, 6))
+        self.assertTrue(np.all((rows >= 1) & (rows <= 5) & (cols >= 1) & (cols <= 6)))
+        self.assertEqual(len(rows), 8)
+
+    def test_wider_sensor(self):
+        def simulate(sensor):
+            s = Simulation(dimensions=(12, 12), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]),
+                           enable_keys=False, map_mode='field', seed=2)
+            s.add_agent(1, search_depth=2, sensor=sensor)
+            for k in range(5):
+                s.update()
+            return s.agents[1].ledger.map
+
+        narrow = simulate(None)
+        wide = simulate(Sensor('disc', 3))
+        self.assertGreater(np.count_nonzero(wide.visits), np.count_nonzero(narrow.visits))
+        self.assertGreater(np.count_nonzero(wide.visits), 29)
+
+    def test_noise_draws(self):
+        # drawn at once, as many calls of random() would
+        for rng, reference in ((random.Random(4), random.Random(4)),
+                               (np.random.default_rng(4), np.random.default_rng(4))):
+            self.assertEqual(uniform_draws(rng, 25).tolist(), [reference.random() for _ in range(25)])
+            self.assertEqual(rng.random(), reference.random())
+
+
+if __name__ == '__main__':
+    unittest.main()
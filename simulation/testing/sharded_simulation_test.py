@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from simulation import Simulation
+from sharded_simulation import ShardedSimulation
+from libraries.token_functions import TokenFunctions
+
+WEIGHTS = [0.5, 0.8, 0.2, 0.2, 0.4, 1]
+
+
+def add_agents(s, agents=6):
+    for j in range(agents):
+        s.add_agent(j + 1, search_depth=2, plan_period=2 if j % 3 == 0 else 1)
+
+
+class ShardedSimulationTest(unittest.TestCase):
+    def test_matches_single_process(self):
+        s = Simulation((10, 10), TokenFunctions(WEIGHTS), enable_keys=False, map_mode='maze', seed=3,
+                       communication_range=3, tick_mode='synchronous')
+        add_agents(s)
+        with ShardedSimulation((10, 10), TokenFunctions(WEIGHTS), map_mode='maze', seed=3, communication_range=3,
+                               shards=2) as sharded:
+            add_agents(sharded)
+            for k in range(6):
+                s.update()
+                sharded.update()
+                self.assertEqual(sharded.positions(), {id: tuple(a.agent.position) for id, a in s.agents.items()})
+            self.assertEqual(sharded.time, s.time)
+            self.assertEqual(sharded.collect('points_of_interest'),
+                             {id: a.ledger.points_of_interest() for id, a in s.agents.items()})
+            self.assertEqual(sharded.collect('version_vector'),
+                             {id: a.ledger.version_vector() for id, a in s.agents.items()})
+            visits = sharded.collect('visits')
+            for id, a in s.agents.items():
+                self.assertTrue(np.array_equal(visits[id], a.ledger.map.visits))
+            with self.assertRaises(RuntimeError):
+                sharded.collect('unknown')
+            # a shard failing doesn't leave the replies of the others behind
+            with self.assertRaises(RuntimeError):
+                sharded.request({0: ('unknown', None), 1: ('collect', 'position')})
+            self.assertEqual(sharded.collect('local_time'), {id: a.local_time for id, a in s.agents.items()})
+        self.assertEqual(sharded.memory, [])
+
+    def test_tick_modes(self):
+        with self.assertRaises(ValueError):
+            Simulation((5, 5), TokenFunctions(WEIGHTS), enable_keys=False, map_mode='field', tick_mode='parallel')
+        s = Simulation((8, 8), TokenFunctions(WEIGHTS), enable_keys=False, map_mode='field', seed=2,
+                       tick_mode='synchronous')
+        add_agents(s, 3)
+        s.update()
+        # everyone heard from everyone else, at the end of the update
+        for a in s.agents.values():
+            self.assertEqual(a.ledger.sync_stats['contacts'], 2)
+            self.assertEqual(set(a.ledger.version_vector()), {1, 2, 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
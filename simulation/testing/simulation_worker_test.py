@@ -0,0 +1,87 @@
+import unittest
+import time
+from simulation import Simulation
+from simulation_worker import Snapshot, SimulationWorker
+from libraries.token_functions import TokenFunctions
+
+
+def simulation():
+    s = Simulation(dimensions=(10, 10), token_fcn=TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1]), enable_keys=False,
+                   map_mode='field', seed=5)
+    for j in range(3):
+        s.add_agent(j + 1, search_depth=2)
+    return s
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+class SimulationWorkerTest(unittest.TestCase):
+    def test_snapshot_is_immutable(self):
+        snapshot = Snapshot.capture(simulation(), 0, agent=2, tokens=True)
+        with self.assertRaises(AttributeError):
+            snapshot.tick = 1
+        with self.assertRaises(ValueError):
+            snapshot.agent_visits[0, 0] = 1
+        self.assertEqual(snapshot.tokens.shape, (10, 10))
+
+    def test_steps_match_synchronous_updates(self):
+        reference = simulation()
+        worker = SimulationWorker(simulation(), agent=1)
+        worker.start()
+        try:
+            for tick in range(1, 4):
+                worker.step()
+                self.assertTrue(wait_for(lambda: worker.snapshot.tick == tick))
+                reference.update()
+                self.assertEqual(worker.snapshot.positions, {id: tuple(a.agent.position)
+                                                             for id, a in reference.agents.items()})
+                self.assertEqual(worker.snapshot.agent_visits.tolist(),
+                                 reference.agents[1].ledger.map.visits.tolist())
+            worker.select(2, tokens=True)  # republished while paused, without stepping
+            self.assertTrue(wait_for(lambda: worker.snapshot.agent == 2))
+            self.assertEqual(worker.snapshot.tick, 3)
+            self.assertIsNotNone(worker.snapshot.tokens)
+        finally:
+            worker.stop()
+
+    def test_play_and_pause(self):
+        worker = SimulationWorker(simulation(), rate=100)
+        worker.start()
+        try:
+            worker.play()
+            self.assertTrue(wait_for(lambda: worker.snapshot.tick >= 5))
+            worker.pause()
+            time.sleep(0.05)
+            tick = worker.snapshot.tick
+            time.sleep(0.1)
+            self.assertEqual(worker.snapshot.tick, tick)
+            self.assertEqual(worker.tick, tick)
+        finally:
+            worker.stop()
+        self.assertFalse(worker.thread.is_alive())
+
+    def test_steps_while_playing_are_ignored(self):
+        worker = SimulationWorker(simulation(), rate=100)
+        worker.start()
+        try:
+            worker.play()
+            for _ in range(5):
+                worker.step()
+            worker.pause()
+            self.assertTrue(wait_for(lambda: worker.idle()))
+            tick = worker.tick
+            time.sleep(0.1)
+            with worker.condition:
+                self.assertTrue(worker.idle())
+                self.assertEqual(worker.tick, tick)
+        finally:
+            worker.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
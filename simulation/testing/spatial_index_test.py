@@ -0,0 +1,39 @@
+import unittest
+import random
+from libraries.spatial_index import SpatialIndex
+
+
+class SpatialIndexTest(unittest.TestCase):
+    def test_queries_match_brute_force(self):
+        random.seed(0)
+        index = SpatialIndex(3)
+        positions = {}
+        for id in range(60):
+            positions[id] = (random.randint(1, 40), random.randint(1, 30))
+            index.insert(id, positions[id])
+        for id in range(0, 60, 3):  # move some of the agents around
+            positions[id] = (random.randint(1, 40), random.randint(1, 30))
+            index.move(id, positions[id])
+
+        def in_range(p, q, distance):
+            return abs(p[0] - q[0]) <= distance and abs(p[1] - q[1]) <= distance
+
+        for distance in (1, 3, 7):
+            for position in [(1, 1), (20, 15), (40, 30)]:
+                expected = [id for id in range(60) if in_range(positions[id], position, distance)]
+                self.assertEqual(index.query(position, distance), expected)
+            expected = [(i, j) for i in range(60) for j in range(i + 1, 60)
+                        if in_range(positions[i], positions[j], distance)]
+            self.assertEqual(index.pairs_in_range(distance), expected)
+
+    def test_remove(self):
+        index = SpatialIndex(5)
+        index.insert('a', (1, 1))
+        index.insert('b', (2, 2))
+        index.remove('a')
+        self.assertEqual(index.query((1, 1), 5), ['b'])
+        self.assertEqual(index.pairs_in_range(5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import csv
+import json
+import os
+import tempfile
+from sweep import expand_grid, run_key, completed_runs, sweep, ResultWriter
+
+
+class SweepTest(unittest.TestCase):
+    def test_expand_grid(self):
+        runs = expand_grid({'agents': [1, 2], 'grid_shape': [(6, 6)]}, seeds=[0, 1])
+        self.assertEqual(len(runs), 4)
+        self.assertEqual(runs[0], {'agents': 1, 'grid_shape': (6, 6), 'seed': 0})
+        self.assertEqual(len({run_key(run) for run in runs}), 4)
+
+    def test_restart_skips_completed_runs(self):
+        parameters = {'agents': [1], 'grid_shape': [(6, 6)], 'runtime': [3]}
+        for name in ('results.csv', 'results.jsonl'):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, name)
+                self.assertEqual(sweep(parameters, [0, 1], path, n_workers=2), 2)
+                self.assertEqual(sweep(parameters, [0, 1, 2], path, n_workers=2), 1)
+                self.assertEqual(completed_runs(path), {run_key(run) for run in expand_grid(parameters, [0, 1, 2])})
+                with open(path, newline='') as f:
+                    rows = list(csv.DictReader(f)) if name.endswith('.csv') else [json.loads(line) for line in f]
+                self.assertEqual(len(rows), 3)
+                self.assertIn('coverage_metric', rows[0])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.csv')
+            sweep({'agents': [1], 'grid_shape': [(6, 6)], 'runtime': [3]}, [0], path, n_workers=1, profile=True)
+            with open(path, newline='') as f:
+                profile = json.loads(next(csv.DictReader(f))['profile'])
+        self.assertEqual(profile['tick']['calls'], 3)
+
+    def test_mismatched_header(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.csv')
+            ResultWriter(path, {'agents': [1]}).close()
+            ResultWriter(path, {'agents': [2]}).close()  # same columns
+            with self.assertRaises(ValueError):
+                ResultWriter(path, {'agents': [1], 'runtime': [3]})
+            with self.assertRaises(ValueError):
+                ResultWriter(path, {'agents': [1]}, profile=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,20 @@ class SystemTest(unittest.TestCase):
             explored_cells = sum([known_map[key] for key in known_map.keys()])
             self.assertTrue(explored_cells > 10)
 
+    def test_seeded_simulation_is_reproducible(self):
+        runs = []
+        for i in range(2):
+            token_fcn = TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 1])
+            s = Simulation(dimensions=(12, 12), token_fcn=token_fcn, enable_keys=False, seed=7)
+            for j in range(3):
+                s.add_agent(j + 1, search_depth=2)
+            for k in range(5):
+                s.update()
+            runs.append((s.interest.tolist(), dict(s.m.maze_map),
+                         [a.agent.position for a in s.agents.values()],
+                         [sorted(a.ledger.ledger.keys()) for a in s.agents.values()]))
+        self.assertEqual(runs[0], runs[1])
+
 
 if __name__ == '__main__':
     unittest.main()
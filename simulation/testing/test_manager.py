@@ -3,6 +3,21 @@ from testing.ledger_test import LedgerTest
 from testing.system_test import SystemTest
 from testing.pygame_wrapper_test import PygameWrapperTest
 from testing.agent_map_test import AgentMapTest
+from testing.token_functions_test import TokenFunctionsTest
+from testing.planner_test import PlannerTest
+from testing.spatial_index_test import SpatialIndexTest
+from testing.optimization_test import OptimizationTest
+from testing.sweep_test import SweepTest
+from testing.maze_test import MazeTest
+from testing.batch_simulation_test import BatchSimulationTest
+from testing.profiler_test import ProfilerTest
+from testing.performance_test import PerformanceTest
+from testing.simulation_worker_test import SimulationWorkerTest
+from testing.sensor_test import SensorTest
+from testing.scheduler_test import SchedulerTest
+from testing.async_runtime_test import AsyncRuntimeTest
+from testing.sharded_simulation_test import ShardedSimulationTest
+from testing.world_test import WorldTest
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from libraries.token_functions import TokenFunctions, poi_counts
+
+
+class TokenFunctionsTest(unittest.TestCase):
+    def test_poi_counts(self):
+        interest_dictionary = {(1, 2): {'detected': 1, 'verified': 0, 'rejected': 2, 'potential': 0},
+                               (3, 1): {'detected': 0, 'verified': 1, 'rejected': 0, 'potential': 4}}
+        counts = poi_counts(interest_dictionary, (3, 2))
+        self.assertEqual(counts.shape, (4, 3, 2))
+        self.assertEqual(counts[:, 0, 1].tolist(), [1, 0, 2, 0])
+        self.assertEqual(counts[:, 2, 0].tolist(), [0, 1, 0, 4])
+        self.assertEqual(counts.sum(), 8)
+
+    def test_pipeline(self):
+        token_fcn = TokenFunctions([0.5, 0.8, 0.2, 0.2, 0.4, 0.9])
+        known_map = np.zeros((4, 6), dtype=np.int32)
+        known_map[1, 2] = 3
+        poi = poi_counts({(2, 2): {'detected': 2, 'verified': 0, 'rejected': 0, 'potential': 0}}, (4, 6))
+        tokens = None
+        for f in token_fcn.get_functions()[:2]:
+            tokens = f(tokens, known_map, poi, (1, 1))
+        self.assertAlmostEqual(tokens[0, 0], 0.5 * 0.9)
+        self.assertAlmostEqual(tokens[1, 2], 0.5 * (1 / 4 - 0.1))
+        self.assertAlmostEqual(tokens[1, 1], 0.5 * 0.9 + 0.8 / 2)
+
+    def test_decay_field(self):
+        token_fcn = TokenFunctions()
+        position = (5, 2)
+        field = token_fcn.decay_field((4, 6), position, 0.9)
+        for row in range(1, 5):
+            for col in range(1, 7):
+                distance = ((row - position[0])**2 + (col - position[1])**2)**0.5
+                self.assertEqual(field[row - 1, col - 1], 0.9**distance)
+
+
+if __name__ == '__main__':
+    unittest.main()
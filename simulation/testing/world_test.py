@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from simulation import Simulation
+from sharded_simulation import ShardedSimulation
+from make_world import make_world, convert
+from libraries.world import World, create_world, HEADER_FILE
+from libraries.token_functions import TokenFunctions
+
+WEIGHTS = [0.5, 0.8, 0.2, 0.2, 0.4, 1]
+
+
+def run(s, agents=3, updates=6) -> list:
+    for j in range(agents):
+        s.add_agent(j + 1, search_depth=2)
+    for k in range(updates):
+        s.update()
+    if isinstance(s, ShardedSimulation):
+        return list(s.positions().values())
+    return [tuple(a.agent.position) for a in s.agents.values()]
+
+
+class WorldTest(unittest.TestCase):
+    def test_generated_world_matches_simulation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'world')
+            make_world(path, (13, 11), map_mode='maze', loops=20, seed=4, chunk_rows=5)
+            world = World(path)
+            self.assertEqual(world.dimensions, (13, 11))
+            self.assertEqual(world.header['seed'], 4)
+            self.assertIsInstance(world.walls, np.memmap)
+            self.assertFalse(world.walls.flags.writeable)
+            generated = Simulation((13, 11), TokenFunctions(WEIGHTS), loops=20, enable_keys=False, seed=4)
+            self.assertTrue(np.array_equal(world.walls, generated.m.walls))
+            self.assertTrue(np.array_equal(world.interest, generated.interest))
+            loaded = Simulation(None, TokenFunctions(WEIGHTS), enable_keys=False, seed=4, world=path)
+            self.assertEqual(run(loaded), run(generated))
+            with self.assertRaises(ValueError):
+                Simulation((5, 5), TokenFunctions(WEIGHTS), enable_keys=False, world=world)
+            del world, loaded
+
+    def test_convert_and_sharded_world(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = Simulation((9, 9), TokenFunctions(WEIGHTS), enable_keys=False, map_mode='field', seed=1,
+                                tick_mode='synchronous')
+            path = os.path.join(directory, 'field')
+            world = convert(source, path, interest_dtype=np.float32)
+            self.assertEqual(World(path).interest.dtype, np.float32)
+            self.assertTrue(np.array_equal(world.walls, source.m.walls))
+            path = os.path.join(directory, 'field64')
+            convert(source, path)
+            with ShardedSimulation(None, TokenFunctions(WEIGHTS), seed=1, shards=2, world=path) as sharded:
+                self.assertEqual(sharded.memory, [])
+                self.assertEqual(run(sharded), run(source))
+            del world
+
+    def test_header(self):
+        with tempfile.TemporaryDirectory() as directory:
+            world = create_world(directory, (4, 6), note='empty')
+            self.assertEqual(world.header['note'], 'empty')
+            self.assertEqual(int(world.interest.sum()), 0)
+            del world
+            with open(os.path.join(directory, HEADER_FILE), 'w') as f:
+                f.write('{"format": 99}')
+            with self.assertRaises(ValueError):
+                World(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()